@@ -4,11 +4,26 @@
 # Dane pobierane z Supabase
 # =============================================================================
 
-from flask import Flask, request, jsonify, send_from_directory
+import atexit
+import hmac
+import os
+import re
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+from flask import Flask, g, request, jsonify, send_from_directory
 from flask_cors import CORS
 from nlp_engine import ChatbotBrain
-from db_handler import DatabaseHandler
-from entities import KW_RESTAURANTS, KW_CUISINE, COMMON_WORDS
+from nlp_pool import NLPPool
+from model_reloader import ModelReloader
+from response_selectors import create_selector
+from db_handler import DatabaseHandler, create_database_handler
+from change_feed import create_change_feed
+from context_store import create_context_store
+from availability_writer import AvailabilityWriter
+from circuit_breaker import BREAKER_CLOSED
+from health import RateLimitedCheck, RequestCounters
 
 # =============================================================================
 # INICJALIZACJA APLIKACJI
@@ -17,18 +32,222 @@ from entities import KW_RESTAURANTS, KW_CUISINE, COMMON_WORDS
 app = Flask(__name__)
 CORS(app)
 
-print("⏳ Uruchamianie systemu Hotable...")
-bot = ChatbotBrain()
-db = DatabaseHandler()
-print("🚀 System gotowy! Serwer działa na porcie 5000")
+# Zmienne z pliku .env tylko przy uruchomieniu serwera deweloperskiego
+# (python app.py) - import modułu (gunicorn, uvicorn, testy) nie zmienia
+# środowiska procesu; dla uvicorn: --env-file .env
+if __name__ == '__main__':
+    load_dotenv()
 
-# Kontekst konwersacji (prosty system pamięci)
-CONTEXT = {
-    "last_restaurant": None,
-    "last_cuisine": None,
-    "conversation_count": 0
+NLP_OPTIONS = {
+    "search_mode": os.getenv('NLP_SEARCH_MODE', 'exhaustive'),
+    "top_k": int(os.getenv('NLP_TOP_K', '50')),
+    "cache_size": int(os.getenv('NLP_CACHE_SIZE', '1024')),
+    "cache_ttl": float(os.getenv('NLP_CACHE_TTL', '300')),
+    "engine": os.getenv('NLP_ENGINE', 'legacy'),
+    "model_file": os.getenv('NLP_MODEL_FILE', 'hotable_model.pkl'),
 }
 
+# Opcjonalna pula procesów do oceny wiadomości (NLP_WORKERS > 0)
+NLP_WORKERS = int(os.getenv('NLP_WORKERS', '0'))
+
+# Przeładowanie intents.json / entities.py bez restartu: wątek obserwujący pliki
+# (NLP_RELOAD_INTERVAL > 0, w sekundach) i endpoint /admin/reload (ADMIN_TOKEN)
+NLP_RELOAD_INTERVAL = float(os.getenv('NLP_RELOAD_INTERVAL', '0'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Kanał zmian restauracji (CATALOG_CHANGE_FEED=supabase): katalog w pamięci
+# aktualizowany na bieżąco, bez okresowego odpytywania o wolne stoliki
+CATALOG_CHANGE_FEED = os.getenv('CATALOG_CHANGE_FEED', '')
+
+# Zmiany liczby wolnych stolików z /admin/availability: od razu w cache, do bazy
+# zbiorczo co AVAILABILITY_FLUSH_INTERVAL sekund (pozostałe zapisywane przy wyjściu)
+AVAILABILITY_FLUSH_INTERVAL = float(os.getenv('AVAILABILITY_FLUSH_INTERVAL', '1.0'))
+
+# Model NLP, pula procesów i obsługa bazy powstają leniwie - przy pierwszym
+# użyciu albo w wątku rozgrzewającym (APP_WARM_UP=1, domyślnie), który
+# uruchamia serwer: pierwsze zapytanie, sonda /health/ready lub start ASGI.
+# Import modułu nie tworzy wątków ani połączeń (bezpieczny dla gunicorn
+# --preload); gotowość zgłasza /health/ready, a /health/live - działanie procesu.
+APP_WARM_UP = os.getenv('APP_WARM_UP', '1') != '0'
+
+reloader = None
+nlp_pool = None
+db = None
+availability = None
+change_feed = None
+
+_bot_lock = threading.Lock()
+_pool_lock = threading.Lock()
+_db_lock = threading.Lock()
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+# Stan startu instancji (dla /health/ready)
+startup = {"warm_up": "pending", "database": None, "error": None, "seconds": None}
+
+
+def get_bot():
+    """Bieżący model NLP - pobierany raz na zapytanie (przeładowanie go podmienia)"""
+    global reloader
+    if reloader is None:
+        with _bot_lock:
+            if reloader is None:
+                brain = ChatbotBrain(
+                    **NLP_OPTIONS,
+                    response_selector=create_selector(
+                        os.getenv('RESPONSE_SELECTOR', 'random'),
+                        int(os.environ['RESPONSE_SEED']) if os.getenv('RESPONSE_SEED') else None
+                    )
+                )
+                model = ModelReloader(brain, interval=NLP_RELOAD_INTERVAL or 2.0, on_reload=on_model_reload)
+                if NLP_RELOAD_INTERVAL > 0:
+                    model.start()
+                reloader = model
+    return reloader.brain
+
+
+def get_nlp_pool():
+    """Pula procesów NLP (None, gdy NLP_WORKERS = 0)"""
+    global nlp_pool
+    if NLP_WORKERS > 0 and nlp_pool is None:
+        with _pool_lock:
+            if nlp_pool is None:
+                pool = NLPPool(NLP_WORKERS, batch_size=int(os.getenv('NLP_BATCH_SIZE', '16')), **NLP_OPTIONS)
+                print(f"✅ Pula NLP gotowa (procesy robocze: {pool.workers})")
+                nlp_pool = pool
+    return nlp_pool
+
+
+def get_db():
+    """Obsługa bazy (DB_BACKEND: supabase - domyślnie, lub sqlite) wraz z zapisem dostępności"""
+    global db, availability, change_feed
+    if db is None:
+        with _db_lock:
+            if db is None:
+                handler = create_database_handler()
+                if reloader is not None:
+                    handler.set_aliases(reloader.brain.kw_restaurants)
+                
+                if CATALOG_CHANGE_FEED and isinstance(handler, DatabaseHandler):
+                    change_feed = create_change_feed(CATALOG_CHANGE_FEED, supabase_url=handler.supabase_url,
+                                                     supabase_key=handler.supabase_key)
+                    handler.subscribe(change_feed)
+                    change_feed.start()
+                
+                availability = AvailabilityWriter(handler, interval=AVAILABILITY_FLUSH_INTERVAL)
+                availability.start()
+                db = handler
+    return db
+
+
+def on_model_reload(brain):
+    """Po podmianie modelu: nowe aliasy restauracji w bazie i nowe procesy NLP"""
+    if db is not None:
+        db.set_aliases(brain.kw_restaurants)
+    if nlp_pool:
+        nlp_pool.reload()
+
+
+def is_ready():
+    """Czy model NLP, pula procesów (jeśli włączona) i obsługa bazy są gotowe"""
+    return reloader is not None and db is not None and (NLP_WORKERS == 0 or nlp_pool is not None)
+
+
+def warm_up():
+    """Utworzenie modelu, puli NLP i obsługi bazy z wyprzedzeniem oraz test połączenia z bazą"""
+    started = time.monotonic()
+    startup.update(warm_up="running", error=None)
+    try:
+        get_bot()
+        get_nlp_pool()
+        handler = get_db()
+        startup["database"] = "ok" if handler.check_connection() else "unreachable"
+        if startup["database"] == "ok":
+            # Kolumny projekcji zgodne ze schematem od pierwszego zapytania
+            handler.check_schema({column for columns in INTENT_FIELDS.values() for column in columns})
+        startup["warm_up"] = "done"
+        print(f"🚀 System gotowy! ({time.monotonic() - started:.2f} s)")
+    except Exception as e:
+        startup.update(warm_up="failed", error=str(e))
+        print(f"❌ Błąd uruchamiania systemu: {e}")
+    finally:
+        startup["seconds"] = round(time.monotonic() - started, 3)
+
+
+def start_warm_up():
+    """Rozgrzewanie w tle (jeden wątek naraz; nic nie robi, gdy wszystko jest gotowe)"""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if is_ready() or (_warm_up_thread is not None and _warm_up_thread.is_alive()):
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, daemon=True)
+        _warm_up_thread.start()
+
+
+def _reset_after_fork():
+    """
+    Proces potomny (np. worker gunicorn --preload) nie dziedziczy wątków:
+    model (z obserwatorem plików), pula NLP, obsługa bazy, zapis dostępności
+    i kanał zmian utworzone w procesie nadrzędnym nie działają - każdy
+    proces tworzy własne. Niezapisane zmiany dostępności zapisuje rodzic.
+    """
+    global reloader, nlp_pool, db, availability, change_feed
+    global _bot_lock, _pool_lock, _db_lock, _warm_up_lock, _warm_up_thread
+    reloader = nlp_pool = db = availability = change_feed = None
+    _bot_lock, _pool_lock, _db_lock = threading.Lock(), threading.Lock(), threading.Lock()
+    _warm_up_lock, _warm_up_thread = threading.Lock(), None
+    startup.update(warm_up="pending", database=None, error=None, seconds=None)
+
+
+def _shutdown():
+    """Przy wyjściu: zapis pozostałych zmian dostępności i zamknięcie kanału zmian (tego procesu)"""
+    if availability is not None:
+        availability.stop()
+    if change_feed is not None:
+        change_feed.stop()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(_shutdown)
+
+# Kontekst konwersacji - osobny dla każdej sesji (id z widżetu lub z ciasteczka)
+CONTEXT_TTL = float(os.getenv('CONTEXT_TTL', '1800'))
+contexts = create_context_store(
+    os.getenv('CONTEXT_BACKEND', 'memory'),
+    max_sessions=int(os.getenv('CONTEXT_MAX_SESSIONS', '10000')),
+    ttl=CONTEXT_TTL,
+    path=os.getenv('CONTEXT_DB_PATH', 'hotable_sessions.db')
+)
+SESSION_COOKIE = "hotable_sid"
+
+# /health raportuje stan z pamięci (bez zapytań do bazy); sprawdzenie
+# z zapytaniem do bazy (/health?deep=1) - najwyżej raz na HEALTH_DEEP_INTERVAL s
+HEALTH_DEEP_INTERVAL = float(os.getenv('HEALTH_DEEP_INTERVAL', '30'))
+# 503 z /health/ready w trakcie rozgrzewania to odpowiedź sondy, nie błąd
+request_counters = RequestCounters(expected_statuses={"/health/ready": (503,)})
+
+# Limit wiadomości w jednym zapytaniu /chat/batch
+BATCH_MAX_MESSAGES = int(os.getenv('BATCH_MAX_MESSAGES', '10000'))
+SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+# Kolumny bazy potrzebne poszczególnym intencjom (projekcja zapytań -
+# np. godziny otwarcia nie wymagają pobierania opisu lokalu)
+INTENT_FIELDS = {
+    "book_table": ("phone",),
+    "restaurant_info": ("cuisine_type", "description", "address", "hours"),
+    "check_seats": ("available_tables",),
+    "check_contact": ("address", "phone", "hours"),
+    "check_hours": ("hours",),
+    "check_capacity": ("max_tables", "features"),
+    "search_cuisine": ("available_tables",),
+}
+
+# Intencje, które bez nazwy lokalu korzystają z ostatniej restauracji z rozmowy
+CONTEXT_INTENTS = ("restaurant_info", "check_seats", "check_contact", "check_hours", "check_capacity")
+
+# Intencje, których odpowiedź opiera się na całym katalogu lokali
+CATALOG_INTENTS = ("list_restaurants", "list_cuisines", "ask_recommendation", "search_cuisine")
+
 
 # =============================================================================
 # FUNKCJE POMOCNICZE
@@ -36,17 +255,67 @@ CONTEXT = {
 
 def get_active_venues():
     """Pobieranie listy aktywnych lokali z bazy"""
-    restaurants = db.get_all_restaurants()
+    restaurants = get_db().get_all_restaurants()
     return [r.get('name') for r in restaurants if r.get('name')]
 
 
-def reset_context():
-    """Resetowanie kontekstu konwersacji"""
-    CONTEXT["last_restaurant"] = None
-    CONTEXT["last_cuisine"] = None
+def health_status(deep=False):
+    """
+    Stan instancji z danych w pamięci: start, model NLP, metadane katalogu,
+    bezpiecznik bazy, liczniki zapytań. Nie tworzy modelu ani obsługi bazy
+    i nie wysyła zapytań - poza sprawdzeniem `deep` (ograniczonym czasowo).
+    """
+    breaker = getattr(db, "breaker", None)
+    catalog = getattr(db, "catalog", None)
+    if not is_ready():
+        status = "starting"
+    elif breaker is not None and breaker.state != BREAKER_CLOSED:
+        status = "degraded"
+    else:
+        status = "healthy"
+    
+    payload = {
+        "status": status,
+        "startup": startup,
+        "model": reloader.stats() if reloader else None,
+        "catalog": catalog.stats() if catalog else None,
+        "database": {
+            "breaker": breaker.stats(),
+            "missing_columns": sorted(db.missing_columns),
+            "projection_fallbacks": db.projection_fallbacks,
+        } if breaker else None,
+        "availability": availability.stats() if availability else None,
+        "change_feed": change_feed.stats() if change_feed else None,
+        "requests": request_counters.stats(),
+    }
+    if deep:
+        payload["deep"] = deep_health.run()
+    return payload
+
+
+def deep_check():
+    """Sprawdzenie z zapytaniami: połączenie z bazą, lista lokali, magazyn sesji"""
+    handler = get_db()
+    connected = handler.check_connection()
+    return {
+        "ok": connected,
+        "active_venues": get_active_venues() if connected else [],
+        "sessions": contexts.stats(),
+    }
+
+
+deep_health = RateLimitedCheck(deep_check, HEALTH_DEEP_INTERVAL)
+
+
+def get_session_id(data, cookies):
+    """Id sesji z JSON-a ('session_id') lub z ciasteczka; w razie braku - nowe"""
+    session_id = data.get('session_id') or cookies.get(SESSION_COOKIE)
+    if isinstance(session_id, str) and SESSION_ID_RE.fullmatch(session_id):
+        return session_id
+    return uuid.uuid4().hex
 
 
-def detect_unknown_entity(message, restaurant_name):
+def detect_unknown_entity(message, restaurant_name, brain=None):
     """
     Wykrywanie potencjalnych nieznanych nazw w wiadomości.
     Zwraca True jeśli wykryto słowo, które może być nieznaną nazwą restauracji.
@@ -54,8 +323,9 @@ def detect_unknown_entity(message, restaurant_name):
     if restaurant_name:
         return False
     
+    brain = brain or get_bot()
     words = message.lower().split()
-    known_keywords = set(KW_RESTAURANTS.keys()) | set(KW_CUISINE.keys()) | COMMON_WORDS
+    known_keywords = set(brain.kw_restaurants.keys()) | set(brain.kw_cuisine.keys()) | brain.common_words
     
     for word in words:
         clean_word = word.strip('.,?!:;\"\'-')
@@ -122,14 +392,15 @@ def format_restaurant_details(restaurant_data):
     }
 
 
-def get_seats_response(restaurant_name=None):
+def get_seats_response(ctx, restaurant_name=None):
     """Generowanie odpowiedzi o dostępnych miejscach"""
+    db = get_db()
     if restaurant_name:
-        target = db.check_availability(restaurant_name)
+        target = db.check_availability(restaurant_name, columns=INTENT_FIELDS["check_seats"])
         if target:
             count = target.get('available_tables', 0)
             status = "🟢" if count > 0 else "🔴"
-            CONTEXT["last_restaurant"] = target.get('name', restaurant_name)
+            ctx.last_restaurant = target.get('name', restaurant_name)
             return f"{status} W restauracji **{target.get('name')}** mamy obecnie **{count}** wolnych stolików."
         else:
             return f"❌ Nie znalazłem restauracji o nazwie {restaurant_name}."
@@ -149,6 +420,42 @@ def get_seats_response(restaurant_name=None):
         return "\n".join(lines)
 
 
+def get_restaurants_overview(ctx, restaurant_names, intent):
+    """
+    Odpowiedź dla kilku restauracji wspomnianych w jednej wiadomości
+    (np. "porównaj Neon i Zielnik") - jedno zapytanie do bazy dla wszystkich.
+    """
+    resolved = get_db().resolve_restaurants(restaurant_names, columns=INTENT_FIELDS.get(intent))
+    rows = list({r.get('name'): r for r in resolved.values() if r is not None}.values())
+    if not rows:
+        return f"❌ Nie znalazłem restauracji: {', '.join(restaurant_names)}."
+    
+    if intent == "check_seats":
+        lines = ["📊 **Wolne stoliki:**\n"]
+        for r in rows:
+            seats = r.get('available_tables', 0)
+            icon = "🟢" if seats > 0 else "🔴"
+            lines.append(f"{icon} **{r.get('name')}**: {seats} wolnych")
+    elif intent == "check_hours":
+        lines = ["🕒 **Godziny otwarcia:**\n"]
+        for r in rows:
+            lines.append(f"• {r.get('name')}: {r.get('hours', 'Brak danych')}")
+    elif intent == "check_contact":
+        lines = ["📍 **Dane kontaktowe:**\n"]
+        for r in rows:
+            details = format_restaurant_details(r)
+            lines.append(f"• **{details['name']}** - {details['address']}, 📞 {details['phone']}")
+    else:
+        lines = ["\n\n".join(format_restaurant_description(r) for r in rows)]
+    
+    missing = [name for name, row in resolved.items() if row is None]
+    if missing:
+        lines.append(f"\n❌ Nie znalazłem: {', '.join(missing)}")
+    
+    ctx.last_restaurant = rows[-1].get('name')
+    return "\n".join(lines)
+
+
 # =============================================================================
 # ENDPOINTY API
 # =============================================================================
@@ -159,14 +466,51 @@ def index():
     return send_from_directory('.', 'test_widget.html')
 
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    # Pierwsze zapytanie do procesu (np. workera gunicorn) rozpoczyna rozgrzewanie
+    if APP_WARM_UP and not is_ready():
+        start_warm_up()
+
+
+@app.after_request
+def count_request(response):
+    """Liczniki zapytań (według reguły URL, np. /chat) dla /health"""
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "other"
+        request_counters.record(endpoint, response.status_code, time.perf_counter() - started)
+    return response
+
+
 @app.route('/health')
 def health_check():
-    """Endpoint do sprawdzania stanu aplikacji"""
-    return jsonify({
-        "status": "healthy",
-        "active_venues": get_active_venues(),
-        "context": CONTEXT
-    })
+    """
+    Stan aplikacji z danych w pamięci (bez zapytań do bazy).
+    /health?deep=1 - dodatkowo sprawdzenie bazy, najwyżej raz na HEALTH_DEEP_INTERVAL s.
+    """
+    return jsonify(health_status(deep=request.args.get('deep') in ('1', 'true')))
+
+
+@app.route('/health/live')
+def health_live():
+    """Liveness - proces działa i obsługuje zapytania (bez sprawdzania zależności)"""
+    return jsonify({"status": "alive"})
+
+
+@app.route('/health/ready')
+def health_ready():
+    """
+    Readiness - czy instancja może przyjmować ruch: model NLP i obsługa bazy
+    są utworzone (503, dopóki trwa rozgrzewanie - zapytanie je uruchamia,
+    jeśli jeszcze nie działa). Wynik testu połączenia z bazą jest tylko
+    raportowany: niedostępna baza nie wyłącza instancji z ruchu.
+    """
+    if not is_ready():
+        start_warm_up()
+        return jsonify({"status": "starting", **startup}), 503
+    return jsonify({"status": "ready", **startup})
 
 
 @app.route('/chat', methods=['POST'])
@@ -174,11 +518,153 @@ def chat():
     """
     Główny endpoint obsługujący konwersację.
     
-    Przyjmuje JSON z polem 'message'.
+    Przyjmuje JSON z polem 'message' (opcjonalnie 'session_id').
     Zwraca JSON z polem 'response'.
     """
     data = request.json
-    user_message = data.get('message', '').strip()
+    session_id = get_session_id(data, request.cookies)
+    ctx = contexts.load(session_id)
+    
+    response = jsonify({"response": respond(data.get('message', '').strip(), ctx)})
+    
+    contexts.save(ctx)
+    response.set_cookie(SESSION_COOKIE, session_id, max_age=int(CONTEXT_TTL),
+                        httponly=True, samesite='Lax')
+    return response
+
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Klasyfikacja wielu wiadomości naraz (bez odpowiedzi i kontekstu rozmowy),
+    np. do analizy logów lub sprawdzenia nowej wersji intents.json.
+    
+    Przyjmuje JSON z polem 'messages' (lista tekstów).
+    Zwraca JSON z polem 'results' (intencja, etap, pewność dla każdej wiadomości).
+    """
+    data = request.json
+    messages = data.get('messages')
+    
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return jsonify({"error": "Pole 'messages' musi być listą tekstów."}), 400
+    if len(messages) > BATCH_MAX_MESSAGES:
+        return jsonify({"error": f"Maksymalnie {BATCH_MAX_MESSAGES} wiadomości w jednym zapytaniu."}), 400
+    
+    results = get_bot().score_intents(messages, pool=get_nlp_pool())
+    return jsonify({"results": [
+        {
+            "message": message,
+            "intent": result.intent,
+            "stage": result.stage,
+            "score": round(result.score, 4),
+            "runner_up": result.runner_up
+        }
+        for message, result in zip(messages, results)
+    ]})
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Przeładowanie modelu NLP (intents.json, entities.py) bez restartu serwera.
+    Wymaga nagłówka X-Admin-Token równego ADMIN_TOKEN (bez niego endpoint jest wyłączony).
+    """
+    denied = check_admin_token()
+    if denied:
+        return denied
+    
+    get_bot()
+    if reloader.reload() is None:
+        return jsonify({"status": "error", "model": reloader.stats()}), 500
+    return jsonify({"status": "reloaded", "model": reloader.stats()})
+
+
+@app.route('/admin/availability', methods=['POST'])
+def admin_availability():
+    """
+    Zmiana liczby wolnych stolików przez obsługę lokalu (nagłówek X-Admin-Token).
+    
+    Przyjmuje JSON z polem 'restaurant' oraz:
+    - 'reserve': liczba miejsc - rezerwacja potwierdzana od razu w bazie
+    - 'delta': zmiana (np. +2 po zwolnieniu stolików) - w cache od razu,
+      w bazie przy najbliższym zapisie zbiorczym
+    """
+    denied = check_admin_token()
+    if denied:
+        return denied
+    
+    data = request.json or {}
+    restaurant = data.get('restaurant')
+    reserve, delta = data.get('reserve'), data.get('delta')
+    if not isinstance(restaurant, str) or not restaurant.strip():
+        return jsonify({"error": "Pole 'restaurant' musi być nazwą restauracji."}), 400
+    if (reserve is None) == (delta is None):
+        return jsonify({"error": "Podaj dokładnie jedno z pól: 'reserve' albo 'delta'."}), 400
+    value = reserve if delta is None else delta
+    if isinstance(value, bool) or not isinstance(value, int) or (delta is None and value <= 0):
+        return jsonify({"error": "Liczba stolików musi być liczbą całkowitą (reserve > 0)."}), 400
+    
+    handler = get_db()
+    if delta is None:
+        applied = availability.reserve(restaurant, value)
+    else:
+        applied = availability.adjust(restaurant, value)
+    row = handler.check_availability(restaurant, columns=("available_tables",))
+    return jsonify({
+        "status": "applied" if applied else "rejected",
+        "confirmed": applied and delta is None,
+        "restaurant": row.get('name') if row else None,
+        "available_tables": row.get('available_tables') if row else None,
+    }), 200 if applied else 409
+
+
+def check_admin_token():
+    """Odpowiedź z błędem, gdy brak ADMIN_TOKEN (404) lub nagłówek się nie zgadza (403); None - dostęp"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Nie znaleziono."}), 404
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({"error": "Brak uprawnień."}), 403
+    return None
+
+
+def analyze_message(user_message, brain=None):
+    """Predykcja intencji (jedno przejście oceny) i ekstrakcja encji"""
+    pool = get_nlp_pool()
+    if pool:
+        return pool.analyze(user_message)
+    return (brain or get_bot()).analyze(user_message)
+
+
+def data_needs(user_message, analysis, ctx):
+    """
+    Dane z bazy potrzebne do odpowiedzi: (nazwy restauracji, kolumny,
+    czy potrzebny cały katalog). Pozwala pobrać je z wyprzedzeniem
+    i równolegle (tryb asynchroniczny, asgi_app.py).
+    """
+    intent_result, entities = analysis
+    intent = intent_result.intent
+    names = list(entities.get('restaurants', []))
+    
+    if not names and ctx.last_restaurant and intent in CONTEXT_INTENTS:
+        names = [ctx.last_restaurant]
+    if intent not in INTENT_FIELDS or intent == "search_cuisine":
+        names = []
+    
+    needs_catalog = (
+        intent in CATALOG_INTENTS
+        or (intent in CONTEXT_INTENTS and not names)
+        or detect_unknown_entity(user_message, entities.get('restaurant'))
+    )
+    return names, INTENT_FIELDS.get(intent), needs_catalog
+
+
+def respond(user_message, ctx, analysis=None):
+    """
+    Odpowiedź (tekst) na jedną wiadomość w kontekście rozmowy `ctx`.
+    analysis - wynik analyze_message, jeśli został już policzony.
+    """
+    db = get_db()
 
     # --- SONDA DIAGNOSTYCZNA v2: INSPEKTOR KOLUMN ---
     if user_message.strip().upper() == "DIAGNOZA":
@@ -205,28 +691,34 @@ def chat():
             print(f"❌ BŁĄD KRYTYCZNY: {e}")
         
         print("="*50 + "\n")
-        return jsonify({"response": "Sprawdź terminal - wypisałem dostępne kolumny."})
+        return "Sprawdź terminal - wypisałem dostępne kolumny."
     
     if not user_message:
-        return jsonify({"response": "Nie otrzymałem wiadomości. Spróbuj ponownie."})
+        return "Nie otrzymałem wiadomości. Spróbuj ponownie."
     
     # Inkrementacja licznika konwersacji
-    CONTEXT["conversation_count"] += 1
+    ctx.conversation_count += 1
+    
+    # Model NLP tego zapytania (przeładowanie w trakcie go nie zmienia)
+    brain = get_bot()
     
-    # Predykcja intencji i ekstrakcja encji
-    intent = bot.predict_intent(user_message)
-    entities = bot.extract_entities(user_message)
+    # Predykcja intencji (jedno przejście oceny) i ekstrakcja encji
+    intent_result, entities = analysis or analyze_message(user_message, brain)
+    intent = intent_result.intent
     
     # Logowanie dla debugowania
-    print(f"📩 [{CONTEXT['conversation_count']}] Msg: '{user_message}'")
-    print(f"   ➤ Intent: {intent} | Entities: {entities}")
+    print(f"📩 [{ctx.session_id[:8]} #{ctx.conversation_count}] Msg: '{user_message}'")
+    print(f"   ➤ Intent: {intent} ({intent_result.stage}, pewność: {intent_result.score:.2f}, "
+          f"drugi: {intent_result.runner_up}) | Entities: {entities}")
     
     # Pobieranie encji
     restaurant_name = entities.get("restaurant")
     cuisine = entities.get('cuisine')
+    restaurant_names = entities.get('restaurants', [])
+    cuisines = entities.get('cuisines', [])
     
     # Wykrywanie nieznanych nazw
-    potential_unknown = detect_unknown_entity(user_message, restaurant_name)
+    potential_unknown = detect_unknown_entity(user_message, restaurant_name, brain)
     
     # ==========================================================================
     # OBSŁUGA INTENCJI
@@ -234,7 +726,7 @@ def chat():
     
     # --- OUT OF SCOPE ---
     if intent == "out_of_scope":
-        return jsonify({"response": bot.get_response(intent)})
+        return brain.get_response(intent, session_id=ctx.session_id)
     
     # --- FALLBACK ---
     if intent == "fallback":
@@ -246,42 +738,42 @@ def chat():
             "• \"Pokaż listę lokali\"\n"
             "• \"Opowiedz o Neonie\""
         )
-        return jsonify({"response": response})
+        return response
     
     # --- GREET (Powitanie) ---
     if intent == "greet":
-        reset_context()
-        return jsonify({"response": bot.get_response(intent)})
+        ctx.reset()
+        return brain.get_response(intent, session_id=ctx.session_id)
     
     # --- BOT_PURPOSE (Kim jesteś) ---
     if intent == "bot_purpose":
-        return jsonify({"response": bot.get_response(intent)})
+        return brain.get_response(intent, session_id=ctx.session_id)
     
     # --- THANKS (Podziękowanie) ---
     if intent == "thanks":
-        return jsonify({"response": bot.get_response(intent)})
+        return brain.get_response(intent, session_id=ctx.session_id)
     
     # --- GOODBYE (Pożegnanie) ---
     if intent == "goodbye":
-        reset_context()
-        return jsonify({"response": bot.get_response(intent)})
+        ctx.reset()
+        return brain.get_response(intent, session_id=ctx.session_id)
     
     # --- BOOK_TABLE (Rezerwacja - informacja o braku funkcji) ---
     if intent == "book_table":
-        response = bot.get_response(intent)
+        response = brain.get_response(intent, session_id=ctx.session_id)
         if restaurant_name:
-            details = db.get_restaurant_details(restaurant_name)
+            details = db.get_restaurant_details(restaurant_name, columns=INTENT_FIELDS[intent])
             if details and details.get('phone'):
                 response += f"\n\n📞 Telefon do {details.get('name')}: {details.get('phone')}"
-        return jsonify({"response": response})
+        return response
     
     # --- UNAVAILABLE_CUISINE (Niedostępna kuchnia) ---
     if intent == "unavailable_cuisine":
-        return jsonify({"response": bot.get_response(intent)})
+        return brain.get_response(intent, session_id=ctx.session_id)
     
     # --- LIST_RESTAURANTS (Lista lokali) ---
     if intent == "list_restaurants":
-        reset_context()
+        ctx.reset()
         
         restaurants = db.get_all_restaurants()
         
@@ -321,7 +813,7 @@ def chat():
         else:
             response = "Nie udało się pobrać listy restauracji. Spróbuj ponownie później."
         
-        return jsonify({"response": response})
+        return response
     
     # --- LIST_CUISINES (Rodzaje kuchni) ---
     if intent == "list_cuisines":
@@ -361,9 +853,9 @@ def chat():
             lines.append("\nKtóra Cię interesuje?")
             response = "\n".join(lines)
         else:
-            response = bot.get_response(intent)
+            response = brain.get_response(intent, session_id=ctx.session_id)
         
-        return jsonify({"response": response})
+        return response
     
     # --- ASK_RECOMMENDATION (Rekomendacja) ---
     if intent == "ask_recommendation":
@@ -396,14 +888,28 @@ def chat():
             lines.append("\nNa co się skusisz?")
             response = "\n".join(lines)
         else:
-            response = bot.get_response(intent)
+            response = brain.get_response(intent, session_id=ctx.session_id)
         
-        return jsonify({"response": response})
+        return response
     
     # --- SEARCH_CUISINE (Szukanie po typie kuchni) ---
     if intent == "search_cuisine":
+        if len(cuisines) > 1:
+            # Kilka kuchni w jednej wiadomości (np. "włoska albo polska")
+            lines = []
+            for cuisine_name in cuisines:
+                results = db.get_restaurants_by_cuisine(cuisine_name, columns=INTENT_FIELDS[intent])
+                if results:
+                    lines.append(f"🔎 **{cuisine_name}**:")
+                    for r in results:
+                        icon = "🟢" if r.get('available_tables', 0) > 0 else "🔴"
+                        lines.append(f"{icon} **{r['name']}**")
+                else:
+                    lines.append(f"😔 Brak aktywnych restauracji typu **{cuisine_name}**.")
+            return "\n".join(lines)
+        
         if cuisine:
-            results = db.get_restaurants_by_cuisine(cuisine)
+            results = db.get_restaurants_by_cuisine(cuisine, columns=INTENT_FIELDS[intent])
             
             if results:
                 lines = [f"🔎 Oto lokale z kategorią **{cuisine}**:",]
@@ -412,26 +918,30 @@ def chat():
                     lines.append(f"{icon} **{r['name']}**")
                 
                 if results:
-                    CONTEXT["last_restaurant"] = results[0]['name']
+                    ctx.last_restaurant = results[0]['name']
                     
-                return jsonify({"response": "\n".join(lines)})
+                return "\n".join(lines)
             else:
-                return jsonify({"response": f"😔 Przepraszam, nie znalazłem aktywnych restauracji typu **{cuisine}** w naszej bazie."})
+                return f"😔 Przepraszam, nie znalazłem aktywnych restauracji typu **{cuisine}** w naszej bazie."
         else:
             # Fallback - odsyłamy do intencji `list_cuisines`
             return list_cuisines()
 
     
+    # --- KILKA RESTAURACJI W JEDNEJ WIADOMOŚCI ---
+    if len(restaurant_names) > 1 and intent in ("restaurant_info", "check_seats", "check_contact", "check_hours"):
+        return get_restaurants_overview(ctx, restaurant_names, intent)
+    
     # --- RESTAURANT_INFO (Informacje o restauracji) ---
     if intent == "restaurant_info":
-        if not restaurant_name and CONTEXT.get("last_restaurant"):
-            restaurant_name = CONTEXT["last_restaurant"]
+        if not restaurant_name and ctx.last_restaurant:
+            restaurant_name = ctx.last_restaurant
         
         if restaurant_name:
-            restaurant_data = db.get_restaurant_details(restaurant_name)
+            restaurant_data = db.get_restaurant_details(restaurant_name, columns=INTENT_FIELDS[intent])
             
             if restaurant_data:
-                CONTEXT["last_restaurant"] = restaurant_data.get('name')
+                ctx.last_restaurant = restaurant_data.get('name')
                 
                 description = format_restaurant_description(restaurant_data)
                 details = format_restaurant_details(restaurant_data)
@@ -441,9 +951,9 @@ def chat():
                     response += f"\n\n📍 **Adres:** {details['address']}"
                     response += f"\n🕒 **Godziny:** {details['hours']}"
                 
-                return jsonify({"response": response})
+                return response
             else:
-                return jsonify({"response": f"❌ Nie znalazłem restauracji o nazwie {restaurant_name}."})
+                return f"❌ Nie znalazłem restauracji o nazwie {restaurant_name}."
         else:
             restaurants = db.get_all_restaurants()
             names = [r.get('name') for r in restaurants if r.get('name')]
@@ -453,7 +963,7 @@ def chat():
                 "Dostępne lokale:\n" +
                 "\n".join([f"• {name}" for name in names])
             )
-            return jsonify({"response": response})
+            return response
     
     # --- CHECK_SEATS (Sprawdzanie wolnych miejsc) ---
     if intent == "check_seats":
@@ -466,33 +976,33 @@ def chat():
                 "Obsługuję tylko:\n" +
                 "\n".join([f"• {name}" for name in names])
             )
-            return jsonify({"response": response})
+            return response
         
-        if not restaurant_name and CONTEXT.get("last_restaurant"):
-            restaurant_name = CONTEXT["last_restaurant"]
+        if not restaurant_name and ctx.last_restaurant:
+            restaurant_name = ctx.last_restaurant
         
-        response = get_seats_response(restaurant_name)
-        return jsonify({"response": response})
+        response = get_seats_response(ctx, restaurant_name)
+        return response
     
     # --- CHECK_CONTACT (Dane kontaktowe) ---
     if intent == "check_contact":
-        if not restaurant_name and CONTEXT.get("last_restaurant"):
-            restaurant_name = CONTEXT["last_restaurant"]
+        if not restaurant_name and ctx.last_restaurant:
+            restaurant_name = ctx.last_restaurant
         
         if restaurant_name:
-            details_data = db.get_restaurant_details(restaurant_name)
+            details_data = db.get_restaurant_details(restaurant_name, columns=INTENT_FIELDS[intent])
             if details_data:
                 details = format_restaurant_details(details_data)
-                CONTEXT["last_restaurant"] = details['name']
+                ctx.last_restaurant = details['name']
                 response = (
                     f"📍 **{details['name']} - Dane kontaktowe:**\n\n"
                     f"🏠 **Adres:** {details['address']}\n"
                     f"📞 **Telefon:** {details['phone']}\n"
                     f"🕒 **Godziny otwarcia:** {details['hours']}"
                 )
-                return jsonify({"response": response})
+                return response
             else:
-                return jsonify({"response": f"❌ Nie mam danych kontaktowych dla {restaurant_name}."})
+                return f"❌ Nie mam danych kontaktowych dla {restaurant_name}."
         else:
             restaurants = db.get_all_restaurants()
             
@@ -503,21 +1013,21 @@ def chat():
                 "📞 Podaj nazwę restauracji, a podam Ci dane kontaktowe.\n\n"
                 "Dostępne lokale: " + ", ".join(names)
             )
-            return jsonify({"response": response})
+            return response
     
     # --- CHECK_HOURS (Godziny otwarcia) ---
     if intent == "check_hours":
-        if not restaurant_name and CONTEXT.get("last_restaurant"):
-            restaurant_name = CONTEXT["last_restaurant"]
+        if not restaurant_name and ctx.last_restaurant:
+            restaurant_name = ctx.last_restaurant
         
         if restaurant_name:
-            details_data = db.get_restaurant_details(restaurant_name)
+            details_data = db.get_restaurant_details(restaurant_name, columns=INTENT_FIELDS[intent])
             if details_data:
-                CONTEXT["last_restaurant"] = details_data.get('name')
+                ctx.last_restaurant = details_data.get('name')
                 response = f"🕒 **{details_data.get('name')}** jest otwarte: **{details_data.get('hours', 'Brak danych')}**"
-                return jsonify({"response": response})
+                return response
             else:
-                return jsonify({"response": f"❌ Nie mam informacji o godzinach dla {restaurant_name}."})
+                return f"❌ Nie mam informacji o godzinach dla {restaurant_name}."
         else:
             restaurants = db.get_all_restaurants()
             
@@ -529,17 +1039,17 @@ def chat():
             
             lines.append("\nO który lokal pytasz konkretnie?")
             response = "\n".join(lines)
-            return jsonify({"response": response})
+            return response
     
     # --- CHECK_CAPACITY (Pojemność lokalu) ---
     if intent == "check_capacity":
-        if not restaurant_name and CONTEXT.get("last_restaurant"):
-            restaurant_name = CONTEXT["last_restaurant"]
+        if not restaurant_name and ctx.last_restaurant:
+            restaurant_name = ctx.last_restaurant
         
         if restaurant_name:
-            details_data = db.get_restaurant_details(restaurant_name)
+            details_data = db.get_restaurant_details(restaurant_name, columns=INTENT_FIELDS[intent])
             if details_data:
-                CONTEXT["last_restaurant"] = details_data.get('name')
+                ctx.last_restaurant = details_data.get('name')
                 max_tables = details_data.get('max_tables', 'N/A')
                 features = details_data.get('features', [])
                 
@@ -548,9 +1058,9 @@ def chat():
                 if features and isinstance(features, list):
                     response += f"\n\nCechy lokalu: {', '.join(features)}"
                 
-                return jsonify({"response": response})
+                return response
             else:
-                return jsonify({"response": f"❌ Nie mam danych o pojemności dla {restaurant_name}."})
+                return f"❌ Nie mam danych o pojemności dla {restaurant_name}."
         else:
             restaurants = db.get_all_restaurants()
             
@@ -562,7 +1072,7 @@ def chat():
             
             lines.append("\nO który lokal pytasz?")
             response = "\n".join(lines)
-            return jsonify({"response": response})
+            return response
     
     # --- DOMYŚLNA OBSŁUGA NIEZNANEJ ENCJI ---
     if potential_unknown and not restaurant_name:
@@ -575,10 +1085,10 @@ def chat():
             "\n".join([f"• {name}" for name in names]) +
             "\n\nCzy chodziło Ci o jeden z nich?"
         )
-        return jsonify({"response": response})
+        return response
     
     # --- FALLBACK DLA NIEOBSŁUŻONYCH PRZYPADKÓW ---
-    response = bot.get_response(intent)
+    response = brain.get_response(intent, session_id=ctx.session_id)
     if not response or response.strip() == "":
         response = (
             "Przepraszam, nie jestem pewien jak odpowiedzieć. 🤔\n\n"
@@ -588,7 +1098,7 @@ def chat():
             "• Podaniu informacji o lokalach"
         )
     
-    return jsonify({"response": response})
+    return response
 
 
 # =============================================================================
@@ -596,5 +1106,7 @@ def chat():
 # =============================================================================
 
 if __name__ == '__main__':
+    if APP_WARM_UP:
+        start_warm_up()
     app.run(debug=True, port=5000, host='0.0.0.0')
 
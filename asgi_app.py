@@ -0,0 +1,193 @@
+# =============================================================================
+# ASGI_APP.PY - Asynchroniczny tryb serwowania chatbota Hotable
+# Uruchomienie: uvicorn asgi_app:app --port 5000   (lub: python asgi_app.py)
+#
+# Ta sama logika odpowiedzi co w app.py (respond), ale dane z bazy są
+# pobierane z wyprzedzeniem, równolegle i bez blokowania wątku na czas
+# zapytań do Supabase.
+# =============================================================================
+
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+
+from app import (
+    CONTEXT_TTL, SESSION_COOKIE, analyze_message, contexts, data_needs, get_db, get_nlp_pool,
+    get_session_id, health_status, is_ready, request_counters, respond, start_warm_up, startup
+)
+from async_db_handler import AsyncDatabaseHandler
+from db_handler import DatabaseHandler
+
+# Ścieżki liczone osobno w licznikach zapytań (pozostałe jako "other")
+ROUTES = ("/chat", "/health", "/health/live", "/health/ready")
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type"),
+]
+
+# Tworzony przy pierwszym zapytaniu (w pętli zdarzeń); None dla lokalnej bazy
+# SQLite - jej odczyty są na tyle szybkie, że nie wymagają pobierania z wyprzedzeniem
+adb = None
+_adb_ready = False
+_adb_lock = asyncio.Lock()
+
+
+async def get_adb():
+    """Asynchroniczna obsługa bazy (obsługa synchroniczna tworzona poza pętlą zdarzeń)"""
+    global adb, _adb_ready
+    if _adb_ready:
+        return adb
+    async with _adb_lock:
+        if not _adb_ready:
+            db = await asyncio.to_thread(get_db)
+            if isinstance(db, DatabaseHandler):
+                adb = AsyncDatabaseHandler(db)
+            _adb_ready = True
+    return adb
+
+
+# =============================================================================
+# OBSŁUGA ENDPOINTÓW
+# =============================================================================
+
+async def chat(data, cookies):
+    """POST /chat - odpowiedź na wiadomość; zwraca (payload, id sesji)"""
+    session_id = get_session_id(data, cookies)
+    ctx = await asyncio.to_thread(contexts.load, session_id)
+    user_message = data.get('message', '').strip()
+
+    analysis = None
+    if user_message and user_message.upper() != "DIAGNOZA":
+        # Ocena intencji (CPU) poza pętlą zdarzeń, potem równoległe pobranie danych
+        nlp_pool = await asyncio.to_thread(get_nlp_pool)
+        if nlp_pool:
+            analysis = await asyncio.wrap_future(nlp_pool.submit(user_message))
+        else:
+            analysis = await asyncio.to_thread(analyze_message, user_message)
+        adb = await get_adb()
+        if adb:
+            # data_needs korzysta z modelu NLP, który może się jeszcze ładować
+            restaurant_names, columns, needs_catalog = await asyncio.to_thread(data_needs, user_message, analysis, ctx)
+            await adb.prefetch(restaurant_names, columns, catalog=needs_catalog)
+
+    response = await asyncio.to_thread(respond, user_message, ctx, analysis)
+    await asyncio.to_thread(contexts.save, ctx)
+    return {"response": response}, session_id
+
+
+async def health(deep=False):
+    """GET /health - stan aplikacji z pamięci; deep - sprawdzenie bazy (poza pętlą zdarzeń)"""
+    if deep:
+        return await asyncio.to_thread(health_status, True)
+    return health_status()
+
+
+# =============================================================================
+# APLIKACJA ASGI
+# =============================================================================
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+            *CORS_HEADERS,
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Bez czekania na model i bazę - gotowość zgłasza /health/ready
+            start_warm_up()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if adb:
+                await adb.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """Minimalna aplikacja ASGI: POST /chat, GET /health, /health/live, /health/ready"""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    started = time.perf_counter()
+    status = 500
+
+    async def send_counted(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    try:
+        await _dispatch(scope, receive, send_counted)
+    finally:
+        endpoint = scope["path"] if scope["path"] in ROUTES else "other"
+        request_counters.record(endpoint, status, time.perf_counter() - started)
+
+
+async def _dispatch(scope, receive, send):
+    method, path = scope["method"], scope["path"]
+
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    if path == "/health" and method == "GET":
+        query = scope.get("query_string", b"").decode("latin-1")
+        deep = any(part in ("deep=1", "deep=true") for part in query.split("&"))
+        return await _send_json(send, 200, await health(deep))
+    if path == "/health/live" and method == "GET":
+        return await _send_json(send, 200, {"status": "alive"})
+    if path == "/health/ready" and method == "GET":
+        if not is_ready():
+            start_warm_up()
+            return await _send_json(send, 503, {"status": "starting", **startup})
+        return await _send_json(send, 200, {"status": "ready", **startup})
+
+    if path == "/chat" and method == "POST":
+        try:
+            data = json.loads(await _read_body(receive) or b"{}")
+        except ValueError:
+            return await _send_json(send, 400, {"response": "Niepoprawny JSON w zapytaniu."})
+        if not isinstance(data, dict):
+            data = {}
+
+        cookie_header = dict(scope["headers"]).get(b"cookie", b"").decode("latin-1")
+        cookies = {key: morsel.value for key, morsel in SimpleCookie(cookie_header).items()}
+
+        payload, session_id = await chat(data, cookies)
+        cookie = f"{SESSION_COOKIE}={session_id}; Max-Age={int(CONTEXT_TTL)}; Path=/; HttpOnly; SameSite=Lax"
+        return await _send_json(send, 200, payload, [(b"set-cookie", cookie.encode("latin-1"))])
+
+    await _send_json(send, 404, {"response": "Nie znaleziono."})
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5000)
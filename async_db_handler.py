@@ -0,0 +1,131 @@
+# =============================================================================
+# ASYNC_DB_HANDLER.PY - Asynchroniczny dostęp do Supabase dla Hotable
+# Odpowiednik DatabaseHandler dla trybu asyncio (asgi_app.py): niezależne
+# zapytania wykonywane równolegle, wyniki trafiają do wspólnego cache katalogu
+# =============================================================================
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import httpx
+except ImportError:  # tryb asynchroniczny jest opcjonalny
+    httpx = None
+
+from db_handler import CATALOG_PARAMS, FAILURE_STATUSES, DatabaseHandler
+
+
+class AsyncDatabaseHandler:
+    """
+    Asynchroniczny klient Supabase (httpx.AsyncClient) współdzielący
+    konfigurację, aliasy i cache katalogu z synchronicznym `DatabaseHandler`.
+
+    Służy do pobrania z wyprzedzeniem danych potrzebnych do odpowiedzi -
+    właściwa logika odpowiedzi korzysta potem z cache bez czekania na sieć.
+    """
+
+    def __init__(self, db: DatabaseHandler):
+        if httpx is None:
+            raise ImportError("❌ Tryb asynchroniczny wymaga pakietu httpx (pip install httpx)")
+
+        self.db = db
+        self.catalog = db.catalog
+        connect_timeout, read_timeout = db.timeout
+        self.client = httpx.AsyncClient(
+            base_url=f"{db.rest_url}/",
+            headers=db.headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=db.pool_size, max_keepalive_connections=db.pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=db.max_retries)
+        )
+        # Jedno pobranie katalogu naraz (pozostałe korutyny czekają na wynik)
+        self._catalog_lock = asyncio.Lock()
+
+    async def _make_request(self, endpoint: str, params: dict = None) -> Optional[List[Dict]]:
+        """
+        Zapytanie GET do Supabase REST API (bezpiecznik wspólny z DatabaseHandler).
+        Odpowiedzi 429/5xx są ponawiane jak w sesji synchronicznej (Retry):
+        do db.max_retries razy z wykładniczym opóźnieniem; błędy połączenia
+        ponawia transport httpx.
+        """
+        breaker = self.db.breaker
+        if not breaker.allow():
+            return None
+        try:
+            response = await self.client.get(endpoint, params=params)
+            for attempt in range(1, self.db.max_retries + 1):
+                if response.status_code not in FAILURE_STATUSES:
+                    break
+                await asyncio.sleep(self._retry_delay(response, attempt))
+                response = await self.client.get(endpoint, params=params)
+            if response.status_code in FAILURE_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code == 400:
+                retry_params = self.db._projection_fallback(params, response.text)
+                if retry_params is not None:
+                    return await self._make_request(endpoint, retry_params)
+            if response.status_code == 200:
+                return response.json()
+            print(f"⚠️ API Error: {response.status_code} - {response.text}")
+            return None
+        except httpx.TimeoutException:
+            breaker.record_failure()
+            print("❌ Timeout połączenia z Supabase")
+            return None
+        except httpx.HTTPError as e:
+            breaker.record_failure()
+            print(f"❌ Błąd zapytania: {e}")
+            return None
+
+    def _retry_delay(self, response: "httpx.Response", attempt: int) -> float:
+        """
+        Opóźnienie przed ponowieniem `attempt` (1, 2, ...) - jak urllib3 Retry:
+        nagłówek Retry-After dla 429/503, w przeciwnym razie pierwsze ponowienie
+        od razu, kolejne po backoff_factor * 2^(attempt - 1) s.
+        """
+        retry_after = response.headers.get("Retry-After", "")
+        if response.status_code in (429, 503) and retry_after.isdigit():
+            return float(retry_after)
+        if attempt <= 1:
+            return 0.0
+        return self.db.backoff_factor * (2 ** (attempt - 1))
+
+    async def load_catalog(self) -> None:
+        """Pobranie katalogu, jeśli odczyt z cache musiałby na niego czekać"""
+        if not self.catalog.needs_load():
+            return
+        async with self._catalog_lock:
+            if not self.catalog.needs_load():
+                return
+            started = time.monotonic()
+            generation = self.catalog.generation()
+            rows = await self._make_request("restaurants", params=CATALOG_PARAMS)
+            if rows is not None:
+                self.catalog.prime(rows, started, generation)
+
+    async def resolve_restaurants(self, restaurant_names: List[str],
+                                  columns: Optional[Sequence[str]] = None) -> Dict[str, Optional[Dict]]:
+        """Asynchroniczny odpowiednik DatabaseHandler.resolve_restaurants"""
+        resolved, remaining = self.db._resolve_cached(restaurant_names, columns)
+        if remaining:
+            result = await self._make_request("restaurants", params=self.db._candidates_params(remaining, columns))
+            self.db._resolve_fetched(resolved, remaining, result if result else [])
+        return resolved
+
+    async def prefetch(self, restaurant_names: Sequence[str] = (), columns: Optional[Sequence[str]] = None,
+                       catalog: bool = False) -> None:
+        """Równoległe pobranie danych restauracji i (opcjonalnie) całego katalogu"""
+        tasks = []
+        if catalog:
+            tasks.append(self.load_catalog())
+        if restaurant_names:
+            tasks.append(self.resolve_restaurants(list(restaurant_names), columns))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def aclose(self) -> None:
+        """Zamknięcie klienta HTTP"""
+        await self.client.aclose()
@@ -0,0 +1,336 @@
+# =============================================================================
+# AVAILABILITY_WRITER.PY - Zapis zmian liczby wolnych stolików dla Hotable
+# Zmiany (np. -1 przy rezerwacji) trafiają od razu do cache katalogu,
+# a do bazy - zbiorczo, co `interval` sekund, z kontrolą współbieżności
+# =============================================================================
+
+import threading
+from typing import Any, Dict, Optional
+
+
+class AvailabilityWriter:
+    """
+    Kolejka zmian dostępności z zapisem opóźnionym (write-behind).
+
+    - adjust(nazwa, delta): zmiana liczby wolnych stolików; zmiany jednej
+      restauracji są sumowane, a czytelnicy cache widzą nową wartość od razu
+    - flush(): zapis zebranych zmian - jeden odczyt bieżących wartości dla
+      wszystkich restauracji, potem warunkowy zapis każdej z nich
+      (compare-and-swap: tylko jeśli w bazie jest nadal odczytana wartość);
+      przy konflikcie z innym procesem odczyt i zapis są ponawiane
+    - liczba wolnych stolików nigdy nie spada poniżej zera: zmiana, która
+      przy zapisie nie ma już pokrycia w bazie (miejsca zajął inny proces),
+      jest odrzucana w całości i liczona w `dropped`
+    - reserve(nazwa, miejsca): rezerwacja potwierdzana od razu w bazie (bez
+      kolejki) - gdy kilka procesów sprzedaje te same miejsca, tylko ta
+      ścieżka gwarantuje, że potwierdzone rezerwacje mają pokrycie; adjust
+      potwierdza jedynie przyjęcie zmiany do kolejki
+
+    Backend bazy musi mieć metody get_availability i compare_and_set_availability.
+    Niezapisane zmiany są nakładane przez katalog na każdą wartość z bazy
+    (odświeżenie, kanał zmian). Backend bez cache katalogu (SQLite) zapisuje
+    zmiany od razu.
+    """
+
+    def __init__(self, db, interval: float = 1.0, max_retries: int = 5):
+        self.db = db
+        self.interval = interval
+        self.max_retries = max_retries
+        self.catalog = getattr(db, "catalog", None)
+
+        # id restauracji -> [nazwa, suma zmian]
+        self._pending: Dict[Any, list] = {}
+        self._lock = threading.Lock()
+        # Jeden zapis do bazy naraz
+        self._flush_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Liczniki
+        self.adjustments = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def adjust(self, restaurant_name: str, delta: int) -> bool:
+        """
+        Zmiana liczby wolnych stolików o `delta`. Zwraca False, gdy
+        restauracja nie istnieje albo według bieżącego stanu zabrakłoby miejsc.
+        """
+        if self.catalog is None:
+            # Bez cache odczyt, sprawdzenie i zapis to jedna operacja
+            with self._flush_lock:
+                queued = self._queue(restaurant_name, delta)
+                if queued:
+                    self.flush()
+                return queued
+        return self._queue(restaurant_name, delta)
+
+    def _queue(self, restaurant_name: str, delta: int) -> bool:
+        # Odczyt (może wymagać zapytania do bazy) bez blokady kolejki
+        row = self.db.check_availability(restaurant_name, columns=("available_tables",))
+        if row is None or row.get('available_tables') is None:
+            return False
+
+        # Sprawdzenie i zmiana pod blokadą, na wartości z pamięci (z wcześniejszymi
+        # zmianami) - dwa wątki nie zajmą tego samego miejsca
+        with self._lock:
+            current = self.catalog.availability(row['id']) if self.catalog is not None else None
+            if current is None:
+                current = row['available_tables']
+            if current + delta < 0:
+                self.rejected += 1
+                return False
+            pending = self._pending.setdefault(row['id'], [row['name'], 0])
+            pending[1] += delta
+            self.adjustments += 1
+            if self.catalog is not None:
+                self.catalog.shift_availability(row['id'], delta)
+        return True
+
+    def reserve(self, restaurant_name: str, seats: int = 1) -> bool:
+        """
+        Zajęcie `seats` miejsc z potwierdzeniem w bazie (compare-and-swap
+        z ponawianiem). Zmiany czekające w kolejce też są brane pod uwagę.
+        Zwraca False, gdy miejsc brakuje lub zapis się nie powiódł.
+        """
+        row = self.db.check_availability(restaurant_name, columns=("available_tables",))
+        if row is None:
+            return False
+        restaurant_id = row['id']
+
+        for _ in range(self.max_retries + 1):
+            current = self.db.get_availability([restaurant_id])
+            if not current or current.get(restaurant_id) is None:
+                self.errors += 1
+                return False
+            expected = current[restaurant_id]
+            with self._lock:
+                waiting = self._pending.get(restaurant_id, [None, 0])[1]
+            if expected + waiting - seats < 0:
+                self.rejected += 1
+                return False
+
+            result = self.db.compare_and_set_availability(restaurant_id, expected, expected - seats)
+            if result is None:
+                self.errors += 1
+                return False
+            if result:
+                self.writes += 1
+                if self.catalog is not None:
+                    # Wartość z bazy - katalog nakłada na nią zmiany z kolejki
+                    self.catalog.apply_rows(result)
+                return True
+            self.conflicts += 1
+        return False
+
+    def flush(self) -> int:
+        """Zapis zebranych zmian do bazy; zwraca liczbę zapisanych restauracji"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            pending = {key: change for key, change in pending.items() if change[1]}
+            if not pending:
+                return 0
+            self.flushes += 1
+
+            current = self.db.get_availability(list(pending))
+            if current is None:
+                self._requeue(pending)
+                return 0
+
+            written = 0
+            for restaurant_id, (name, delta) in pending.items():
+                if self._write(restaurant_id, name, delta, current):
+                    written += 1
+            return written
+
+    def _write(self, restaurant_id: Any, name: str, delta: int, current: Dict[Any, int]) -> bool:
+        """Warunkowy zapis jednej restauracji z ponawianiem przy konflikcie"""
+        for _ in range(self.max_retries + 1):
+            expected = current.get(restaurant_id)
+            if expected is None:
+                print(f"⚠️ Restauracja {name} nie istnieje już w bazie - pominięto zmianę {delta:+d}")
+                self._settle(restaurant_id, delta, None)
+                return False
+
+            value = expected + delta
+            if value < 0:
+                # Inny proces sprzedał w międzyczasie ostatnie miejsca - zmiana
+                # bez pokrycia nie jest zapisywana (ani przycinana do zera)
+                self.dropped += 1
+                print(f"⚠️ {name}: brak {-value} wolnych stolików - zmiana {delta:+d} odrzucona")
+                self._settle(restaurant_id, delta, expected)
+                return False
+
+            result = self.db.compare_and_set_availability(restaurant_id, expected, value)
+            if result is None:
+                self.errors += 1
+                self._requeue({restaurant_id: [name, delta]})
+                return False
+            if result:
+                self.writes += 1
+                self._settle(restaurant_id, delta, value)
+                return True
+
+            # Konflikt - wartość w bazie zmienił inny proces
+            self.conflicts += 1
+            latest = self.db.get_availability([restaurant_id])
+            if latest is None:
+                self.errors += 1
+                self._requeue({restaurant_id: [name, delta]})
+                return False
+            current.update(latest)
+
+        print(f"⚠️ {name}: zmiana {delta:+d} odłożona po {self.max_retries + 1} konfliktach zapisu")
+        self._requeue({restaurant_id: [name, delta]})
+        return False
+
+    def _settle(self, restaurant_id: Any, delta: int, value: Optional[int]) -> None:
+        """Zmiana nie czeka już na zapis - w cache wartość z bazy i zmiany nadal w kolejce"""
+        if self.catalog is not None:
+            self.catalog.settle_availability(restaurant_id, delta, value)
+
+    def _requeue(self, changes: Dict[Any, list]) -> None:
+        """Zwrócenie niezapisanych zmian do kolejki (następny flush)"""
+        with self._lock:
+            for restaurant_id, (name, delta) in changes.items():
+                pending = self._pending.setdefault(restaurant_id, [name, 0])
+                pending[1] += delta
+
+    def start(self) -> None:
+        """Uruchomienie wątku zapisującego zmiany co `interval` sekund"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Zatrzymanie wątku i zapis pozostałych zmian"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Błąd zapisu dostępności: {e}")
+
+    def pending(self) -> Dict[str, int]:
+        """Niezapisane zmiany: {nazwa restauracji: suma zmian}"""
+        with self._lock:
+            return {name: delta for name, delta in self._pending.values() if delta}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.pending()),
+            "adjustments": self.adjustments,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+# =============================================================================
+# TEST ZAPISU DOSTĘPNOŚCI
+# =============================================================================
+
+if __name__ == "__main__":
+    import os
+    import shutil
+    import sys
+    import tempfile
+
+    from catalog_cache import RestaurantCatalog
+    from sqlite_db_handler import SQLiteDatabaseHandler
+
+    print("=" * 60)
+    print("TESTY ZAPISU DOSTĘPNOŚCI")
+    print("=" * 60)
+
+    # Dwie instancje aplikacji (każda z własnym cache katalogu) na kopii hotable.db
+    path = os.path.join(tempfile.mkdtemp(), "hotable.db")
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "hotable.db"), path)
+    first, second = SQLiteDatabaseHandler(path), SQLiteDatabaseHandler(path)
+    for handler in (first, second):
+        handler.catalog = RestaurantCatalog(handler.get_all_restaurants)
+    writers = [AvailabilityWriter(first, interval=0.02), AvailabilityWriter(second, interval=0.02)]
+    ids = {row['name']: row['id'] for row in first.get_all_restaurants()}
+
+    def stored(name):
+        return first.get_availability([ids[name]])[ids[name]]
+
+    def cached(handler, name):
+        return handler.catalog.availability(ids[name])
+
+    results = []
+
+    def check(description, condition):
+        results.append(condition)
+        print(f"{'✅' if condition else '❌'} {description}")
+
+    # 1. Równoległe zmiany z dwóch instancji - bez sprzedaży ponad stan
+    first.update_availability("Zielnik", 10)
+    for handler in (first, second):
+        handler.catalog.get_all()
+    accepted = [0, 0]
+
+    def take(index):
+        for _ in range(10):
+            accepted[index] += writers[index].adjust("Zielnik", -1)
+
+    for writer in writers:
+        writer.start()
+    threads = [threading.Thread(target=take, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for writer in writers:
+        writer.stop()
+    written = 10 - stored("Zielnik")
+    check(f"Zielnik: przyjęto {sum(accepted)}, zapisano {written}, odrzucono przy zapisie "
+          f"{sum(w.dropped for w in writers)} - w bazie {stored('Zielnik')}", stored("Zielnik") >= 0)
+    check("Cache obu instancji zgodny z bazą po zapisie",
+          cached(first, "Zielnik") == cached(second, "Zielnik") == stored("Zielnik"))
+
+    # 2. Niezapisana zmiana przetrwa pełne odświeżenie katalogu
+    writer = writers[0]
+    before = stored("Neon")
+    writer.adjust("Neon", -2)
+    first.catalog.invalidate()
+    first.catalog.get_all()
+    check(f"Neon po odświeżeniu: cache {cached(first, 'Neon')}, baza {stored('Neon')} (+ kolejka -2)",
+          cached(first, "Neon") == before - 2 and stored("Neon") == before)
+
+    # 3. Rezerwacja potwierdzona w bazie - cache to baza + kolejka
+    check("Rezerwacja 1 miejsca w Neon", writer.reserve("Neon", 1))
+    check(f"Neon po rezerwacji: cache {cached(first, 'Neon')}, baza {stored('Neon')}",
+          stored("Neon") == before - 1 and cached(first, "Neon") == before - 3)
+    writer.flush()
+    check(f"Neon po zapisie: cache {cached(first, 'Neon')} = baza {stored('Neon')}",
+          cached(first, "Neon") == stored("Neon") == before - 3)
+
+    # 4. Zmiana bez pokrycia w bazie jest odrzucana, a nie przycinana do zera
+    first.catalog.get_all()
+    second.update_availability("Porto Azzurro", 1)
+    dropped = writer.dropped
+    writer.adjust("Porto Azzurro", -2)
+    writer.flush()
+    check(f"Porto Azzurro: zmiana -2 przy 1 wolnym odrzucona (baza {stored('Porto Azzurro')}, "
+          f"cache {cached(first, 'Porto Azzurro')})",
+          writer.dropped == dropped + 1 and stored("Porto Azzurro") == cached(first, "Porto Azzurro") == 1)
+
+    shutil.rmtree(os.path.dirname(path))
+    print(f"\nWYNIKI: {sum(results)}/{len(results)} testów przeszło pomyślnie")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,41 @@
+# =============================================================================
+# BUILD_MODEL.PY - Kompilacja modelu NLP Hotable do artefaktu
+# Użycie: python build_model.py [--engine legacy|tfidf] [--output hotable_model.pkl]
+#
+# ChatbotBrain(model_file=...) wczytuje artefakt zamiast kompilować
+# intents.json i entities.py przy starcie każdego procesu. Artefakt zawiera
+# skrót plików źródłowych - po ich zmianie jest ignorowany do czasu
+# ponownego zbudowania.
+# =============================================================================
+
+import argparse
+import os
+import time
+
+from nlp_engine import ENGINE_LEGACY, ENGINE_TFIDF, ChatbotBrain
+
+DEFAULT_MODEL_FILE = "hotable_model.pkl"
+
+
+def build_model(intents_file: str = "intents.json", output: str = DEFAULT_MODEL_FILE,
+                engine: str = ENGINE_LEGACY) -> str:
+    """Kompilacja modelu z plików źródłowych i zapis artefaktu; zwraca jego ścieżkę"""
+    started = time.perf_counter()
+    brain = ChatbotBrain(intents_file=intents_file, cache_size=0, engine=engine)
+    brain.save_model(output)
+    elapsed = time.perf_counter() - started
+    print(f"📦 Zapisano artefakt modelu {output} "
+          f"({len(brain.compiled_patterns)} wzorców, {os.path.getsize(output) / 1024:.0f} KB, {elapsed:.2f} s)")
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kompilacja modelu NLP Hotable do artefaktu")
+    parser.add_argument("--intents", default="intents.json", help="plik intencji (domyślnie intents.json)")
+    parser.add_argument("--output", default=os.getenv("NLP_MODEL_FILE", DEFAULT_MODEL_FILE),
+                        help="ścieżka artefaktu (domyślnie NLP_MODEL_FILE lub hotable_model.pkl)")
+    parser.add_argument("--engine", default=os.getenv("NLP_ENGINE", ENGINE_LEGACY),
+                        choices=(ENGINE_LEGACY, ENGINE_TFIDF), help="silnik oceny wzorców")
+    args = parser.parse_args()
+
+    build_model(args.intents, args.output, args.engine)
@@ -0,0 +1,581 @@
+# =============================================================================
+# CATALOG_CACHE.PY - Cache katalogu restauracji (read-through) dla Hotable
+# =============================================================================
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# Rodzaje zmian wierszy z kanału zmian (change_feed.py)
+EVENT_INSERT = "INSERT"
+EVENT_UPDATE = "UPDATE"
+EVENT_DELETE = "DELETE"
+
+# Rodzaje odświeżania
+REFRESH_FULL = "full"                  # cały katalog (select=*)
+REFRESH_AVAILABILITY = "availability"  # tylko id, name, available_tables
+
+RowLoader = Callable[[], Optional[List[Dict]]]
+IndexBuilder = Callable[[List[Dict]], Any]
+
+
+def row_key(row: Dict) -> Any:
+    """Klucz wiersza w katalogu (id, a gdy go brak - nazwa)"""
+    key = row.get('id')
+    return key if key is not None else row.get('name')
+
+
+def cuisine_key(value: Any) -> str:
+    """
+    Klucz dopasowania kuchni, wspólny dla wszystkich backendów: nazwa kuchni
+    bez rozróżniania wielkości liter (także polskich znaków) i bez spacji na
+    brzegach. Kuchnia pasuje, gdy jej klucz jest równy kluczowi zapytania.
+    """
+    return str(value).strip().lower()
+
+
+class RestaurantCatalog:
+    """
+    Katalog restauracji trzymany w pamięci procesu.
+
+    - ttl: po tym czasie katalog jest odświeżany w tle, a do końca
+      odświeżania zwracane są dotychczasowe dane (stale-while-revalidate)
+    - stale_ttl: jak długo po upływie `ttl` wolno jeszcze zwracać stare
+      dane; później odczyt czeka na nowe dane (domyślnie = ttl)
+    - availability_ttl: krótszy czas życia samej liczby wolnych stolików,
+      odświeżanej lekkim zapytaniem `availability_loader`
+
+    Równoległe chybienia są łączone - pobranie wykonuje tylko pierwszy wątek,
+    pozostałe czekają na jego wynik. Loader zwraca listę wierszy albo None
+    przy błędzie (wtedy zostają poprzednie dane).
+
+    Zanim katalog zostanie pobrany w całości, cache przechowuje też wiersze
+    częściowe (pobrane z projekcją kolumn) - kolejne projekcje tego samego
+    wiersza są scalane, a wpis żyje `availability_ttl` od najstarszej części.
+
+    Zwracane wiersze są współdzielone i traktowane jako tylko do odczytu -
+    zmiany zawsze podmieniają cały słownik wiersza.
+
+    W trybie na żywo (set_live) zmiany wierszy przychodzą z kanału zmian
+    (apply_change) i okresowe odświeżanie dostępności jest wyłączone.
+
+    Zmiany liczby wolnych stolików czekające na zapis w bazie
+    (shift_availability) są nakładane na każdą wartość z bazy - z pobrania,
+    odświeżenia, zdarzenia kanału zmian i apply_rows - aż do settle_availability.
+    """
+
+    def __init__(self, loader: RowLoader, availability_loader: Optional[RowLoader] = None,
+                 ttl: float = 300.0, availability_ttl: float = 30.0,
+                 stale_ttl: Optional[float] = None, wait_timeout: float = 30.0,
+                 max_partial_rows: int = 1024):
+        self._loader = loader
+        self._availability_loader = availability_loader
+        self.ttl = ttl
+        self.availability_ttl = availability_ttl
+        self.stale_ttl = ttl if stale_ttl is None else stale_ttl
+        self.wait_timeout = wait_timeout
+
+        self._rows: Optional[List[Dict]] = None
+        self._loaded_at = 0.0
+        self._availability_at = 0.0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        # Zmiany zapisane w trakcie pobierania - nakładane na jego wynik
+        self._pending_rows: List[Dict] = []
+        self._generation = 0
+        # Zdarzenia kanału zmian z czasu pobierania - nakładane na jego wynik
+        self._pending_events: List[Any] = []
+        # Indeksy pochodne: nazwa -> (wersja katalogu, układ wierszy, indeks)
+        self._indexes: Dict[str, tuple] = {}
+        # Układ wierszy (zbiór i kolejność) - zmienia pozycje w indeksach
+        self._layout = 0
+        # Pole -> wersja katalogu z ostatnią zmianą tego pola
+        self._field_changes: Dict[str, int] = {}
+        self.live = False
+        # Czas (time.time) ostatniego udanego pobrania katalogu lub dostępności
+        self.refreshed_at: Optional[float] = None
+        # Wiersze częściowe: nazwa (małe litery) -> (wiersz, czas najstarszej części)
+        self._partial = OrderedDict()
+        # Niezapisane zmiany liczby wolnych stolików: klucz wiersza -> suma zmian
+        self._availability_deltas: Dict[Any, int] = {}
+        self.max_partial_rows = max_partial_rows
+
+        # Rośnie przy każdej zmianie zawartości (np. dla indeksów pochodnych)
+        self.version = 0
+
+        # Liczniki
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.availability_loads = 0
+        self.errors = 0
+        self.partial_hits = 0
+        self.events = 0
+        self.index_builds = 0
+
+    # -------------------------------------------------------------------------
+    # ODCZYT
+    # -------------------------------------------------------------------------
+
+    def get_all(self) -> List[Dict]:
+        """Wszystkie restauracje (z cache, w razie potrzeby pobrane/odświeżone)"""
+        return list(self._current())
+
+    def index(self, name: str, builder: IndexBuilder, fields: Optional[Sequence[str]] = None) -> tuple:
+        """
+        Indeks pochodny katalogu (np. kuchnia -> pozycje restauracji),
+        budowany funkcją `builder(wiersze)`. Zwraca (wiersze, indeks) -
+        indeks zawsze odpowiada zwróconej liście wierszy.
+
+        fields - pola wierszy, od których indeks zależy. Indeks jest wtedy
+        przebudowywany tylko po zmianie tych pól albo układu wierszy
+        (dodanie, usunięcie, pełne pobranie), więc może zawierać pozycje
+        wierszy, ale nie same wiersze. Bez `fields` - po każdej zmianie.
+        """
+        self._current()
+        with self._lock:
+            rows = self._rows if self._rows is not None else []
+            cached = self._indexes.get(name)
+            if cached is not None and self._index_valid(cached, fields):
+                return rows, cached[2]
+            version, layout = self.version, self._layout
+        value = builder(rows)
+        with self._lock:
+            self.index_builds += 1
+            if self.version == version:
+                self._indexes[name] = (version, layout, value)
+        return rows, value
+
+    def _index_valid(self, cached: tuple, fields: Optional[Sequence[str]]) -> bool:
+        """Czy zapamiętany indeks pasuje do bieżących wierszy (pod blokadą)"""
+        version, layout, _ = cached
+        if fields is None:
+            return version == self.version
+        return layout == self._layout and all(self._field_changes.get(field, -1) <= version for field in fields)
+
+    def _current(self) -> List[Dict]:
+        """Aktualna lista wierszy (bez kopiowania - nie wolno jej zmieniać)"""
+        now = time.monotonic()
+        with self._lock:
+            if self._rows is not None:
+                age = now - self._loaded_at
+                if age < self.ttl + self.stale_ttl:
+                    if age >= self.ttl:
+                        self.stale_hits += 1
+                        self._start_background(REFRESH_FULL)
+                    elif (self._availability_loader is not None and not self.live
+                          and now - self._availability_at >= self.availability_ttl):
+                        self.stale_hits += 1
+                        self._start_background(REFRESH_AVAILABILITY)
+                    else:
+                        self.hits += 1
+                    return self._rows
+
+            # Brak danych (albo zbyt stare) - czekamy na pobranie
+            self.misses += 1
+            event = self._inflight.get(REFRESH_FULL)
+            leader = event is None
+            if leader:
+                event = self._inflight[REFRESH_FULL] = threading.Event()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._run_refresh(REFRESH_FULL)
+        else:
+            event.wait(self.wait_timeout)
+
+        with self._lock:
+            return self._rows if self._rows is not None else []
+
+    def needs_load(self) -> bool:
+        """Czy odczyt musiałby czekać na pobranie katalogu (brak danych lub zbyt stare)"""
+        with self._lock:
+            return self._rows is None or time.monotonic() - self._loaded_at >= self.ttl + self.stale_ttl
+
+    def generation(self) -> int:
+        """Znacznik unieważnień - do przekazania do prime()"""
+        with self._lock:
+            return self._generation
+
+    def prime(self, rows: List[Dict], started: float, generation: int) -> None:
+        """
+        Wstawienie pełnego katalogu pobranego poza cache (np. asynchronicznie).
+        started / generation - czas (time.monotonic) i generation() sprzed pobrania.
+        """
+        with self._lock:
+            self.loads += 1
+            self._install(rows, started, generation)
+
+    def clear_indexes(self, *names: str) -> None:
+        """Usunięcie indeksów pochodnych - wskazanych albo wszystkich (np. po zmianie aliasów)"""
+        with self._lock:
+            if not names:
+                self._indexes.clear()
+            for name in names:
+                self._indexes.pop(name, None)
+
+    def get_partial(self, name: str, columns: Iterable[str]) -> Optional[Dict]:
+        """
+        Wiersz częściowy o danej nazwie, o ile zawiera wszystkie `columns`
+        i nie wygasł (None w przeciwnym razie).
+        """
+        key = name.strip().lower()
+        with self._lock:
+            entry = self._partial.get(key)
+            if entry is None:
+                return None
+            row, fetched_at = entry
+            if time.monotonic() - fetched_at >= self.availability_ttl:
+                del self._partial[key]
+                return None
+            if not all(column in row for column in columns):
+                return None
+            self._partial.move_to_end(key)
+            self.partial_hits += 1
+            return row
+
+    def merge_partial(self, rows: List[Dict]) -> None:
+        """
+        Zapamiętanie wierszy pobranych z projekcją kolumn: scalenie
+        z wcześniej pobranymi częściami i nałożenie na katalog, jeśli jest.
+        """
+        if not rows:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._apply_rows(rows)
+            rows = self._with_deltas(rows)
+            for row in rows:
+                key = str(row.get('name', '')).strip().lower()
+                if not key:
+                    continue
+                previous = self._partial.pop(key, None)
+                if previous is not None and now - previous[1] < self.availability_ttl:
+                    self._partial[key] = ({**previous[0], **row}, previous[1])
+                else:
+                    self._partial[key] = (dict(row), now)
+            while len(self._partial) > self.max_partial_rows:
+                self._partial.popitem(last=False)
+
+    def availability(self, key: Any) -> Optional[int]:
+        """Liczba wolnych stolików wiersza z pamięci (bez pobierania); None, gdy nieznana"""
+        with self._lock:
+            for row in self._rows or ():
+                if row_key(row) == key:
+                    return row.get('available_tables')
+            for row, _ in self._partial.values():
+                if row_key(row) == key and 'available_tables' in row:
+                    return row['available_tables']
+        return None
+
+    def is_loaded(self) -> bool:
+        """Czy katalog ma jakiekolwiek dane (także przeterminowane)"""
+        return self._rows is not None
+
+    def set_live(self, live: bool = True) -> None:
+        """Tryb na żywo: zmiany z kanału zmian, bez okresowego odświeżania dostępności"""
+        with self._lock:
+            self.live = live
+
+    # -------------------------------------------------------------------------
+    # ZMIANY
+    # -------------------------------------------------------------------------
+
+    def apply_rows(self, rows: List[Dict]) -> None:
+        """
+        Nałożenie zmienionych wierszy (np. odpowiedzi na PATCH) bez ponownego
+        pobierania katalogu. Pola wiersza nadpisują pola z cache.
+        """
+        if not rows:
+            return
+        with self._lock:
+            self._apply_rows(rows)
+
+    def _apply_rows(self, rows: List[Dict]) -> None:
+        """apply_rows pod blokadą (wiersze z bazy - bez niezapisanych zmian)"""
+        if self._inflight:
+            self._pending_rows.extend(rows)
+        rows = self._with_deltas(rows)
+        if self._rows is not None:
+            self._rows, changed = self._merge_changes(self._rows, rows)
+            self._bump(changed)
+        for row in rows:
+            key = str(row.get('name', '')).strip().lower()
+            if key in self._partial:
+                partial, fetched_at = self._partial[key]
+                self._partial[key] = ({**partial, **row}, fetched_at)
+
+    def shift_availability(self, key: Any, delta: int) -> None:
+        """
+        Zmiana liczby wolnych stolików o `delta`, jeszcze niezapisana w bazie:
+        widoczna od razu i nakładana na każdą kolejną wartość z bazy.
+        """
+        with self._lock:
+            self._add_delta(key, delta)
+            self._shift_rows(key, delta)
+
+    def settle_availability(self, key: Any, delta: int, value: Optional[int]) -> None:
+        """
+        Koniec oczekiwania zmiany `delta` (zapisanej albo odrzuconej); `value` -
+        liczba wolnych stolików w bazie po zapisie (None, gdy nieznana - wtedy
+        zmiana jest tylko cofana w cache).
+        """
+        with self._lock:
+            self._add_delta(key, -delta)
+            if value is None:
+                self._shift_rows(key, -delta)
+                return
+            self._apply_rows([{'id': key, 'available_tables': value}])
+            value += self._availability_deltas.get(key, 0)
+            for name, (row, fetched_at) in list(self._partial.items()):
+                if row_key(row) == key and 'available_tables' in row:
+                    self._partial[name] = ({**row, 'available_tables': value}, fetched_at)
+
+    def _add_delta(self, key: Any, delta: int) -> None:
+        """Suma niezapisanych zmian wiersza (pod blokadą)"""
+        total = self._availability_deltas.get(key, 0) + delta
+        if total:
+            self._availability_deltas[key] = total
+        else:
+            self._availability_deltas.pop(key, None)
+
+    def _shift_rows(self, key: Any, delta: int) -> None:
+        """Przesunięcie liczby wolnych stolików wiersza w katalogu i wierszach częściowych (pod blokadą)"""
+        if self._rows is not None:
+            rows = [{**row, 'available_tables': row['available_tables'] + delta}
+                    if row_key(row) == key and row.get('available_tables') is not None else row
+                    for row in self._rows]
+            if any(before is not after for before, after in zip(self._rows, rows)):
+                self._rows = rows
+                self._bump(('available_tables',))
+        for name, (row, fetched_at) in list(self._partial.items()):
+            if row_key(row) == key and row.get('available_tables') is not None:
+                self._partial[name] = ({**row, 'available_tables': row['available_tables'] + delta}, fetched_at)
+
+    def _with_deltas(self, rows: List[Dict]) -> List[Dict]:
+        """Wiersze z bazy z nałożonymi niezapisanymi zmianami dostępności (pod blokadą)"""
+        if not self._availability_deltas:
+            return rows
+        return [{**row, 'available_tables': row['available_tables'] + self._availability_deltas[row_key(row)]}
+                if row.get('available_tables') is not None and row_key(row) in self._availability_deltas else row
+                for row in rows]
+
+    def apply_change(self, event: Any) -> None:
+        """
+        Zmiana jednego wiersza z kanału zmian (change_feed.ChangeEvent:
+        type INSERT / UPDATE / DELETE, record, old_record) - nakładana na
+        katalog bez ponownego pobierania. Przebudowane zostaną tylko indeksy
+        zależne od zmienionych pól.
+        """
+        with self._lock:
+            self.events += 1
+            if self._inflight:
+                self._pending_events.append(event)
+            else:
+                # Katalog pobierany poza cache (prime) nie uwzględni tej zmiany
+                self._generation += 1
+            self._apply_event(event)
+
+    def _apply_event(self, event: Any) -> None:
+        """Nałożenie zdarzenia na katalog (wywoływane pod blokadą)"""
+        record = self._with_deltas([event.record])[0] if event.record else {}
+        key = row_key(event.old_record or record) if event.type == EVENT_DELETE else row_key(record)
+        if key is None:
+            return
+
+        # Wiersze częściowe tej restauracji zostaną pobrane ponownie
+        for name in [name for name, (row, _) in self._partial.items() if row_key(row) == key]:
+            del self._partial[name]
+        if self._rows is None:
+            return
+
+        position = next((i for i, row in enumerate(self._rows) if row_key(row) == key), None)
+        if event.type == EVENT_DELETE:
+            if position is not None:
+                self._rows = self._rows[:position] + self._rows[position + 1:]
+                self._bump()
+            return
+
+        if position is None:
+            self._rows = sorted([*self._rows, dict(record)], key=lambda row: str(row.get('name', '')))
+            self._bump()
+            return
+
+        current = self._rows[position]
+        changed = {field for field, value in record.items() if field not in current or current[field] != value}
+        if not changed:
+            return
+        rows = list(self._rows)
+        rows[position] = {**current, **record}
+        if 'name' in changed:
+            rows.sort(key=lambda row: str(row.get('name', '')))
+            self._rows = rows
+            self._bump()
+        else:
+            self._rows = rows
+            self._bump(changed)
+
+    def invalidate(self) -> None:
+        """Unieważnienie katalogu - następny odczyt pobierze dane od nowa"""
+        with self._lock:
+            self._rows = None
+            self._partial.clear()
+            self._loaded_at = 0.0
+            self._availability_at = 0.0
+            self._generation += 1
+            self._bump()
+
+    def expire(self) -> None:
+        """
+        Dane zostają, ale następny odczyt odświeży cały katalog w tle
+        (np. po przerwie w kanale zmian, gdy zdarzenia mogły przepaść).
+        """
+        with self._lock:
+            self._partial.clear()
+            self._generation += 1
+            self._loaded_at = min(self._loaded_at, time.monotonic() - self.ttl)
+
+    def _bump(self, fields: Optional[Iterable[str]] = None) -> None:
+        """
+        Nowa wersja katalogu (pod blokadą). fields - zmienione pola;
+        None oznacza zmianę układu wierszy (wszystkie indeksy do przebudowy).
+        """
+        self.version += 1
+        if fields is None:
+            self._layout += 1
+            return
+        for field in fields:
+            self._field_changes[field] = self.version
+
+    # -------------------------------------------------------------------------
+    # ODŚWIEŻANIE
+    # -------------------------------------------------------------------------
+
+    def _start_background(self, kind: str) -> None:
+        """Odświeżenie w wątku w tle (wywoływane pod blokadą)"""
+        if kind in self._inflight:
+            return
+        self._inflight[kind] = threading.Event()
+        threading.Thread(target=self._run_refresh, args=(kind,), daemon=True).start()
+
+    def _run_refresh(self, kind: str) -> None:
+        try:
+            if kind == REFRESH_AVAILABILITY:
+                self._refresh_availability()
+            else:
+                self._refresh_full()
+        except Exception as e:
+            print(f"❌ Błąd odświeżania katalogu ({kind}): {e}")
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                event = self._inflight.pop(kind)
+                if not self._inflight:
+                    self._pending_rows = []
+                    self._pending_events = []
+            event.set()
+
+    def _refresh_full(self) -> None:
+        started = time.monotonic()
+        with self._lock:
+            generation = self._generation
+        rows = self._loader()
+
+        with self._lock:
+            self.loads += 1
+            if rows is None:
+                self.errors += 1
+                return
+            self._install(rows, started, generation)
+
+    def _install(self, rows: List[Dict], started: float, generation: int) -> None:
+        """Podmiana całego katalogu (wywoływane pod blokadą)"""
+        self._rows = self._with_deltas(self._merge(list(rows), self._pending_rows))
+        for event in self._pending_events:
+            self._apply_event(event)
+        self._partial.clear()
+        # Unieważnienie w trakcie pobierania - dane mogą być sprzed zmiany
+        fresh_from = started if generation == self._generation else started - self.ttl - self.stale_ttl
+        self._loaded_at = fresh_from
+        self._availability_at = fresh_from
+        self.refreshed_at = time.time()
+        self._bump()
+
+    def _refresh_availability(self) -> None:
+        started = time.monotonic()
+        with self._lock:
+            generation = self._generation
+        rows = self._availability_loader()
+
+        with self._lock:
+            self.availability_loads += 1
+            if rows is None:
+                self.errors += 1
+                return
+            if self._rows is None or generation != self._generation:
+                return
+            # Dodana lub usunięta restauracja - potrzebny pełny katalog
+            catalog_changed = {row_key(row) for row in rows} != {row_key(row) for row in self._rows}
+            if not catalog_changed:
+                updates = self._with_deltas(self._merge(list(rows), self._pending_rows))
+                self._rows, changed = self._merge_changes(self._rows, updates)
+                self._availability_at = started
+                self.refreshed_at = time.time()
+                self._bump(changed)
+
+        if catalog_changed:
+            self._refresh_full()
+
+    @staticmethod
+    def _merge(rows: List[Dict], updates: List[Dict]) -> List[Dict]:
+        """Nowa lista wierszy z nałożonymi zmianami (kolejność zachowana)"""
+        if not updates:
+            return rows
+        changes: Dict[Any, Dict] = {}
+        for update in updates:
+            changes.setdefault(row_key(update), {}).update(update)
+        return [{**row, **changes[row_key(row)]} if row_key(row) in changes else row for row in rows]
+
+    @staticmethod
+    def _merge_changes(rows: List[Dict], updates: List[Dict]) -> tuple:
+        """Jak _merge, ale zwraca też zbiór pól, których wartości się zmieniły"""
+        merged = RestaurantCatalog._merge(rows, updates)
+        changed = set()
+        for before, after in zip(rows, merged):
+            if before is not after:
+                changed.update(field for field, value in after.items()
+                               if field not in before or before[field] != value)
+        return merged, changed
+
+    def stats(self) -> Dict[str, Any]:
+        """Stan i liczniki cache"""
+        with self._lock:
+            now = time.monotonic()
+            loaded = self._rows is not None
+            return {
+                "loaded": loaded,
+                "version": self.version,
+                "size": len(self._rows) if loaded else 0,
+                "refreshed_at": self.refreshed_at,
+                "age": round(now - self._loaded_at, 3) if loaded else None,
+                "availability_age": round(now - self._availability_at, 3) if loaded else None,
+                "ttl": self.ttl,
+                "availability_ttl": self.availability_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "partial_rows": len(self._partial),
+                "partial_hits": self.partial_hits,
+                "loads": self.loads,
+                "availability_loads": self.availability_loads,
+                "errors": self.errors,
+                "live": self.live,
+                "events": self.events,
+                "index_builds": self.index_builds,
+            }
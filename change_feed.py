@@ -0,0 +1,261 @@
+# =============================================================================
+# CHANGE_FEED.PY - Kanał zmian wierszy tabeli restaurants dla Hotable
+# Zdarzenia INSERT / UPDATE / DELETE trafiają do subskrybentów (np. katalogu
+# restauracji w pamięci) bez odpytywania bazy. Backendy: lokalny (zdarzenia
+# publikowane w procesie) albo Supabase Realtime (wymaga websocket-client)
+# =============================================================================
+
+import itertools
+import json
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from catalog_cache import EVENT_DELETE, EVENT_INSERT, EVENT_UPDATE
+
+try:
+    import websocket  # websocket-client - opcjonalnie, tylko dla Supabase Realtime
+except ImportError:
+    websocket = None
+
+# Nazwy kanałów (np. do konfiguracji przez zmienne środowiskowe)
+FEED_LOCAL = "local"
+FEED_SUPABASE = "supabase"
+
+
+class ChangeEvent(NamedTuple):
+    """
+    Zmiana jednego wiersza: type (INSERT / UPDATE / DELETE), record - nowa
+    postać wiersza, old_record - poprzednia (przy DELETE wystarczy klucz, np. id)
+    """
+    type: str
+    record: Optional[Dict[str, Any]] = None
+    old_record: Optional[Dict[str, Any]] = None
+
+
+class LocalChangeFeed:
+    """
+    Kanał zmian w obrębie procesu - zdarzenia publikuje sama aplikacja
+    (np. skrypt administracyjny albo test). Subskrybent dostaje każde
+    zdarzenie (on_change), a po możliwej utracie zdarzeń - sygnał
+    do ponownej synchronizacji (on_resync).
+    """
+
+    def __init__(self):
+        self._subscribers: List[Tuple[Callable, Optional[Callable]]] = []
+        self._lock = threading.Lock()
+
+        # Liczniki
+        self.events = 0
+        self.resyncs = 0
+        self.errors = 0
+
+    def subscribe(self, on_change: Callable[[ChangeEvent], None],
+                  on_resync: Optional[Callable[[], None]] = None) -> None:
+        with self._lock:
+            self._subscribers.append((on_change, on_resync))
+
+    def unsubscribe(self, on_change: Callable[[ChangeEvent], None]) -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] != on_change]
+
+    def publish(self, event: ChangeEvent) -> None:
+        """Przekazanie zdarzenia wszystkim subskrybentom"""
+        self.events += 1
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for on_change, _ in subscribers:
+            try:
+                on_change(event)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Błąd obsługi zmiany {event.type}: {e}")
+
+    def resync(self) -> None:
+        """Sygnał dla subskrybentów, że zdarzenia mogły przepaść"""
+        self.resyncs += 1
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for _, on_resync in subscribers:
+            if on_resync is not None:
+                on_resync()
+
+    def insert(self, record: Dict[str, Any]) -> None:
+        self.publish(ChangeEvent(EVENT_INSERT, record))
+
+    def update(self, record: Dict[str, Any], old_record: Optional[Dict[str, Any]] = None) -> None:
+        self.publish(ChangeEvent(EVENT_UPDATE, record, old_record))
+
+    def delete(self, old_record: Dict[str, Any]) -> None:
+        self.publish(ChangeEvent(EVENT_DELETE, None, old_record))
+
+    def start(self) -> None:
+        """Kanał lokalny nie ma połączenia do uruchomienia"""
+
+    def stop(self) -> None:
+        """Kanał lokalny nie ma połączenia do zamknięcia"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "resyncs": self.resyncs,
+            "errors": self.errors,
+        }
+
+
+class SupabaseRealtimeFeed(LocalChangeFeed):
+    """
+    Zmiany tabeli z Supabase Realtime (protokół Phoenix przez WebSocket).
+
+    - wątek w tle utrzymuje połączenie i wysyła heartbeat co
+      `heartbeat_interval` sekund
+    - po zerwaniu połączenia łączy się ponownie z rosnącym opóźnieniem
+      (najwyżej `max_backoff` sekund)
+    - po każdym dołączeniu do kanału, także pierwszym, wysyła subskrybentom
+      resync - zmiany sprzed dołączenia (np. w trakcie pobierania katalogu)
+      i z przerwy w połączeniu nie dotarły jako zdarzenia
+    - tabela musi mieć włączoną replikację (publikacja supabase_realtime)
+    """
+
+    def __init__(self, supabase_url: str, supabase_key: str, table: str = "restaurants",
+                 schema: str = "public", heartbeat_interval: float = 25.0, max_backoff: float = 30.0):
+        if websocket is None:
+            raise ImportError("❌ Kanał zmian Supabase wymaga pakietu websocket-client")
+        super().__init__()
+        base = supabase_url.rstrip("/").replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        self.url = f"{base}/realtime/v1/websocket?apikey={supabase_key}&vsn=1.0.0"
+        self.supabase_key = supabase_key
+        self.table = table
+        self.schema = schema
+        self.topic = f"realtime:{schema}:{table}"
+        self.heartbeat_interval = heartbeat_interval
+        self.max_backoff = max_backoff
+
+        self._refs = itertools.count(1)
+        self._join_ref = None
+        self._app = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.joined = False
+
+        # Liczniki
+        self.reconnects = 0
+
+    def start(self) -> None:
+        """Uruchomienie wątków połączenia i heartbeat"""
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._run, daemon=True),
+                         threading.Thread(target=self._heartbeat, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._app is not None:
+            self._app.close()
+        for thread in self._threads:
+            thread.join(timeout=5.0)
+        self._threads = []
+
+    def _run(self) -> None:
+        """Pętla połączenia z ponawianiem"""
+        backoff = 1.0
+        while not self._stop.is_set():
+            self._app = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            self._app.run_forever()
+            was_joined, self.joined = self.joined, False
+            if self._stop.is_set():
+                return
+            if was_joined:
+                backoff = 1.0
+            self.reconnects += 1
+            print(f"⚠️ Kanał zmian Supabase rozłączony - ponowna próba za {backoff:.0f} s")
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _send(self, topic: str, event: str, payload: Dict[str, Any], join_ref: Optional[str] = None) -> str:
+        ref = str(next(self._refs))
+        message = {"topic": topic, "event": event, "payload": payload, "ref": ref}
+        if join_ref is not None:
+            message["join_ref"] = join_ref
+        self._app.send(json.dumps(message))
+        return ref
+
+    def _on_open(self, _ws) -> None:
+        """Dołączenie do kanału zmian tabeli"""
+        payload = {
+            "config": {
+                "broadcast": {"self": False},
+                "presence": {"key": ""},
+                "postgres_changes": [{"event": "*", "schema": self.schema, "table": self.table}],
+            },
+            "access_token": self.supabase_key,
+        }
+        ref = str(next(self._refs))
+        self._join_ref = ref
+        self._app.send(json.dumps({"topic": self.topic, "event": "phx_join", "payload": payload,
+                                   "ref": ref, "join_ref": ref}))
+
+    def _on_message(self, _ws, message: str) -> None:
+        self._handle_message(json.loads(message))
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        """Obsługa jednej wiadomości Phoenix"""
+        event = message.get("event")
+        payload = message.get("payload") or {}
+
+        if event == "phx_reply" and message.get("ref") == self._join_ref:
+            if payload.get("status") != "ok":
+                self.errors += 1
+                print(f"❌ Kanał zmian Supabase odrzucił subskrypcję: {payload.get('response')}")
+                return
+            self.joined = True
+            print(f"✅ Kanał zmian Supabase: {self.schema}.{self.table}")
+            self.resync()
+        elif event == "postgres_changes":
+            data = payload.get("data") or {}
+            self._publish_change(data)
+        elif event in (EVENT_INSERT, EVENT_UPDATE, EVENT_DELETE):
+            # Starszy format Realtime - zmiana bezpośrednio w payload
+            self._publish_change(payload)
+        elif event in ("phx_error", "phx_close") and message.get("topic") == self.topic:
+            # Kanał zamknięty po stronie serwera - nowe połączenie i ponowne dołączenie
+            self._app.close()
+
+    def _publish_change(self, data: Dict[str, Any]) -> None:
+        if data.get("type") in (EVENT_INSERT, EVENT_UPDATE, EVENT_DELETE):
+            self.publish(ChangeEvent(data["type"], data.get("record"), data.get("old_record")))
+
+    def _on_error(self, _ws, error: Exception) -> None:
+        self.errors += 1
+        print(f"❌ Błąd kanału zmian Supabase: {error}")
+
+    def _heartbeat(self) -> None:
+        """Heartbeat Phoenix - bez niego serwer zamyka bezczynne połączenie"""
+        while not self._stop.wait(self.heartbeat_interval):
+            if self.joined:
+                try:
+                    self._send("phoenix", "heartbeat", {})
+                except Exception as e:
+                    print(f"⚠️ Heartbeat kanału zmian nieudany: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "joined": self.joined,
+            "reconnects": self.reconnects,
+        }
+
+
+def create_change_feed(kind: str, **options):
+    """Tworzenie kanału zmian po nazwie (local / supabase)"""
+    if kind == FEED_LOCAL:
+        return LocalChangeFeed()
+    if kind == FEED_SUPABASE:
+        return SupabaseRealtimeFeed(**options)
+    raise ValueError(f"Nieznany kanał zmian: {kind}")
@@ -0,0 +1,110 @@
+# =============================================================================
+# CIRCUIT_BREAKER.PY - Bezpiecznik zapytań do bazy dla Hotable
+# Gdy baza przestaje odpowiadać, kolejne zapytania są odrzucane od razu
+# (zamiast czekać na limit czasu), a po przerwie - sprawdzane jednym zapytaniem
+# =============================================================================
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Stany bezpiecznika
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik (circuit breaker) dla zapytań do zewnętrznej usługi.
+
+    - closed: zapytania przechodzą; `failure_threshold` kolejnych błędów
+      otwiera bezpiecznik
+    - open: zapytania są odrzucane od razu przez `reset_timeout` sekund
+    - half_open: przechodzi jedno zapytanie próbne - sukces zamyka
+      bezpiecznik, błąd otwiera go ponownie
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = "baza"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        # Początek zapytania próbnego (None - brak próby w toku)
+        self._trial_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+        # Liczniki
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.last_failure_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        """Stan z uwzględnieniem upływu czasu (wywoływane pod blokadą)"""
+        if self._state == BREAKER_OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = BREAKER_HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Czy zapytanie może zostać wysłane (False - odrzucone bez wysyłania)"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == BREAKER_CLOSED:
+                return True
+            if state == BREAKER_HALF_OPEN:
+                # Jedno zapytanie próbne naraz (zawieszona próba nie blokuje na zawsze)
+                if self._trial_at is None or now - self._trial_at >= self.reset_timeout:
+                    self._trial_at = now
+                    return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            if self._state != BREAKER_CLOSED:
+                print(f"✅ Bezpiecznik ({self.name}) zamknięty - usługa znów odpowiada")
+            self._state = BREAKER_CLOSED
+            self._failures = 0
+            self._trial_at = None
+
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.failures += 1
+            self.last_failure_at = time.time()
+            self._failures += 1
+            state = self._current_state(now)
+            if state == BREAKER_HALF_OPEN or (state == BREAKER_CLOSED and self._failures >= self.failure_threshold):
+                self._state = BREAKER_OPEN
+                self._opened_at = now
+                self._trial_at = None
+                self.opened += 1
+                print(f"⚠️ Bezpiecznik ({self.name}) otwarty - zapytania wstrzymane na {self.reset_timeout:.0f} s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in": round(max(0.0, self.reset_timeout - (now - self._opened_at)), 1)
+                if state == BREAKER_OPEN else None,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+                "last_failure_at": self.last_failure_at,
+            }
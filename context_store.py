@@ -0,0 +1,171 @@
+# =============================================================================
+# CONTEXT_STORE.PY - Kontekst rozmowy per sesja dla Hotable
+# Backendy: pamięć procesu (LRU + TTL) albo lokalny plik SQLite współdzielony
+# przez wiele procesów
+# =============================================================================
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from lru_cache import LRUCache
+
+# Nazwy backendów (np. do konfiguracji przez zmienne środowiskowe)
+BACKEND_MEMORY = "memory"
+BACKEND_SQLITE = "sqlite"
+
+
+class ConversationContext:
+    """Pamięć jednej rozmowy (kompaktowy rekord ze __slots__)"""
+
+    __slots__ = ("session_id", "last_restaurant", "last_cuisine", "conversation_count")
+
+    def __init__(self, session_id: str, last_restaurant: Optional[str] = None,
+                 last_cuisine: Optional[str] = None, conversation_count: int = 0):
+        self.session_id = session_id
+        self.last_restaurant = last_restaurant
+        self.last_cuisine = last_cuisine
+        self.conversation_count = conversation_count
+
+    def reset(self) -> None:
+        """Zapomnienie tematu rozmowy (licznik wiadomości zostaje)"""
+        self.last_restaurant = None
+        self.last_cuisine = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class InMemoryContextStore:
+    """
+    Konteksty w pamięci procesu: najdawniej używane sesje są usuwane po
+    przekroczeniu `max_sessions`, nieaktywne - po `ttl` sekundach.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl: Optional[float] = 1800):
+        self._sessions = LRUCache(maxsize=max_sessions, ttl=ttl)
+
+    def load(self, session_id: str) -> ConversationContext:
+        """Kontekst sesji (nowy, jeśli sesja nie istnieje lub wygasła)"""
+        context = self._sessions.get(session_id)
+        return context if context is not None else ConversationContext(session_id)
+
+    def save(self, context: ConversationContext) -> None:
+        self._sessions.put(context.session_id, context)
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": BACKEND_MEMORY, **self._sessions.stats()}
+
+
+class SQLiteContextStore:
+    """
+    Konteksty w lokalnym pliku SQLite - wspólne dla kilku procesów
+    aplikacji na tej samej maszynie. Każdy wątek ma własne połączenie.
+    Wygasłe i nadmiarowe sesje są usuwane co `cleanup_every` zapisów.
+    """
+
+    def __init__(self, path: str = "hotable_sessions.db", max_sessions: int = 10000,
+                 ttl: Optional[float] = 1800, cleanup_every: int = 500):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        connection = self._connection()
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_context (
+                session_id TEXT PRIMARY KEY,
+                last_restaurant TEXT,
+                last_cuisine TEXT,
+                conversation_count INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversation_context_updated_at "
+            "ON conversation_context (updated_at)"
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, session_id: str) -> ConversationContext:
+        """Kontekst sesji (nowy, jeśli sesja nie istnieje lub wygasła)"""
+        row = self._connection().execute(
+            "SELECT last_restaurant, last_cuisine, conversation_count, updated_at "
+            "FROM conversation_context WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[3] > self.ttl):
+            return ConversationContext(session_id)
+        return ConversationContext(session_id, row[0], row[1], row[2])
+
+    def save(self, context: ConversationContext) -> None:
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO conversation_context "
+            "(session_id, last_restaurant, last_cuisine, conversation_count, updated_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET "
+            "last_restaurant = excluded.last_restaurant, last_cuisine = excluded.last_cuisine, "
+            "conversation_count = excluded.conversation_count, updated_at = excluded.updated_at",
+            (context.session_id, context.last_restaurant, context.last_cuisine,
+             context.conversation_count, time.time())
+        )
+        connection.commit()
+
+        with self._lock:
+            self._writes += 1
+            cleanup = self._writes % self.cleanup_every == 0
+        if cleanup:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        """Usunięcie wygasłych sesji i najstarszych ponad limit `max_sessions`"""
+        connection = self._connection()
+        if self.ttl is not None:
+            connection.execute(
+                "DELETE FROM conversation_context WHERE updated_at < ?",
+                (time.time() - self.ttl,)
+            )
+        connection.execute(
+            "DELETE FROM conversation_context WHERE session_id IN ("
+            "SELECT session_id FROM conversation_context ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+        connection.commit()
+
+    def clear(self) -> None:
+        connection = self._connection()
+        connection.execute("DELETE FROM conversation_context")
+        connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        size = self._connection().execute("SELECT COUNT(*) FROM conversation_context").fetchone()[0]
+        return {"backend": BACKEND_SQLITE, "size": size, "maxsize": self.max_sessions, "ttl": self.ttl}
+
+
+def create_context_store(backend: str = BACKEND_MEMORY, max_sessions: int = 10000,
+                         ttl: Optional[float] = 1800, path: str = "hotable_sessions.db"):
+    """Tworzenie magazynu kontekstu po nazwie backendu (memory / sqlite)"""
+    if backend == BACKEND_MEMORY:
+        return InMemoryContextStore(max_sessions=max_sessions, ttl=ttl)
+    if backend == BACKEND_SQLITE:
+        return SQLiteContextStore(path, max_sessions=max_sessions, ttl=ttl)
+    raise ValueError(f"Nieznany backend kontekstu rozmowy: {backend}")
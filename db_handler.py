@@ -3,12 +3,32 @@
 # =============================================================================
 
 import os
+import re
 import requests
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Iterable, List, Dict, Optional, Sequence, Set
 
-# Ładowanie zmiennych środowiskowych
-load_dotenv()
+from catalog_cache import RestaurantCatalog, cuisine_key
+from circuit_breaker import CircuitBreaker
+from entities import KW_RESTAURANTS
+
+# Nazwy backendów bazy (np. do konfiguracji przez zmienne środowiskowe)
+BACKEND_SUPABASE = "supabase"
+BACKEND_SQLITE = "sqlite"
+
+# Zapytania odświeżające katalog (pełny i sama dostępność)
+CATALOG_PARAMS = {"select": "*", "order": "name"}
+AVAILABILITY_PARAMS = {"select": "id,name,available_tables", "order": "name"}
+
+# Statusy HTTP oznaczające awarię bazy (liczone przez bezpiecznik, zapytania GET ponawiane)
+FAILURE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Kuchnie restauracji małymi literami (cuisine_key) - filtr kuchni po stronie bazy
+CUISINE_SEARCH_COLUMN = "cuisine_search"
+
+# Błąd PostgREST dla nieistniejącej kolumny, np. "column restaurants.features does not exist"
+MISSING_COLUMN_RE = re.compile(r'column (?:"?\w+"?\.)?"?(\w+)"? does not exist')
 
 class DatabaseHandler:
     """
@@ -16,10 +36,25 @@ class DatabaseHandler:
     Przechowuje informacje o restauracjach i ich dostępności.
     """
     
-    def __init__(self):
-        """Inicjalizacja połączenia z Supabase"""
-        self.supabase_url = os.getenv('SUPABASE_URL')
-        self.supabase_key = os.getenv('SUPABASE_KEY')
+    def __init__(self, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None,
+                 pool_size: Optional[int] = None, connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_factor: float = 0.3, catalog_ttl: Optional[float] = None,
+                 availability_ttl: Optional[float] = None, breaker_threshold: Optional[int] = None,
+                 breaker_reset: Optional[float] = None):
+        """
+        Inicjalizacja połączenia z Supabase.
+        
+        Parametry nadpisują zmienne środowiskowe (SUPABASE_URL, SUPABASE_KEY,
+        DB_POOL_SIZE, DB_CONNECT_TIMEOUT, DB_READ_TIMEOUT, DB_MAX_RETRIES,
+        CATALOG_TTL, CATALOG_AVAILABILITY_TTL, DB_BREAKER_THRESHOLD,
+        DB_BREAKER_RESET), co pozwala też wskazać lokalny serwer testowy.
+        
+        Konstruktor nie łączy się z bazą - test połączenia to osobne
+        wywołanie check_connection().
+        """
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_KEY')
         
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("❌ Brak SUPABASE_URL lub SUPABASE_KEY w zmiennych środowiskowych!")
@@ -35,19 +70,83 @@ class DatabaseHandler:
             "Prefer": "return=representation"
         }
         
-        # Test połączenia
+        # Osobne limity czasu na nawiązanie połączenia i odczyt odpowiedzi
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else float(os.getenv('DB_CONNECT_TIMEOUT', '3.05')),
+            read_timeout if read_timeout is not None else float(os.getenv('DB_READ_TIMEOUT', '10'))
+        )
+        
+        # Trwała sesja HTTP z pulą połączeń (keep-alive) - jedno połączenie
+        # TCP+TLS jest używane ponownie przez kolejne zapytania
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('DB_POOL_SIZE', '10'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('DB_MAX_RETRIES', '3'))
+        self.backoff_factor = backoff_factor
+        self.session = self._create_session(self.pool_size, self.max_retries, backoff_factor)
+        
+        # Bezpiecznik: po serii błędów zapytania są odrzucane od razu, zamiast
+        # czekać na limit czasu (cache katalogu serwuje wtedy ostatnie dane)
+        self.breaker = CircuitBreaker(
+            breaker_threshold if breaker_threshold is not None else int(os.getenv('DB_BREAKER_THRESHOLD', '5')),
+            breaker_reset if breaker_reset is not None else float(os.getenv('DB_BREAKER_RESET', '30')),
+            name="Supabase"
+        )
+        
+        # Cache katalogu restauracji (zmienia się rzadko); liczba wolnych
+        # stolików ma własny, krótszy czas życia
+        self.catalog = RestaurantCatalog(
+            self._fetch_all_restaurants,
+            self._fetch_availability,
+            ttl=catalog_ttl if catalog_ttl is not None else float(os.getenv('CATALOG_TTL', '300')),
+            availability_ttl=availability_ttl if availability_ttl is not None else float(os.getenv('CATALOG_AVAILABILITY_TTL', '30'))
+        )
+        
+        # Kolumny, których ta instancja bazy nie ma (check_schema albo błąd 400) -
+        # pomijane w projekcji, pozostałe kolumny są nadal pobierane wybiórczo
+        self.missing_columns: Set[str] = set()
+        self.projection_fallbacks = 0
+        
+        # Aliasy nazw restauracji (np. "porto" -> "Porto Azzurro")
+        self.set_aliases(KW_RESTAURANTS)
+    
+    def _create_session(self, pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+        """
+        Sesja HTTP z pulą połączeń. Ponawianie z wykładniczym opóźnieniem
+        dotyczy tylko idempotentnych zapytań GET (błędy połączenia oraz
+        odpowiedzi 429/5xx).
+        """
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            allowed_methods=frozenset({"GET"}),
+            status_forcelist=FAILURE_STATUSES,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def close(self):
+        """Zamknięcie sesji HTTP i jej puli połączeń"""
+        self.session.close()
+    
+    def check_connection(self) -> bool:
+        """Test połączenia z bazą (zapytanie sieciowe - wywoływane poza startem aplikacji)"""
         if self._test_connection():
             print("✅ Połączono z Supabase")
-        else:
-            print("⚠️ Supabase dostępne, ale tabela może być pusta")
+            return True
+        print("⚠️ Supabase niedostępne albo tabela może być pusta")
+        return False
     
     def _test_connection(self) -> bool:
         """Test połączenia z bazą danych"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.rest_url}/restaurants?select=count",
-                headers=self.headers,
-                timeout=10
+                timeout=self.timeout
             )
             return response.status_code == 200
         except Exception as e:
@@ -55,21 +154,33 @@ class DatabaseHandler:
             return False
     
     def _make_request(self, endpoint: str, method: str = "GET", params: dict = None, data: dict = None) -> Optional[List[Dict]]:
-        """Wykonanie zapytania do Supabase REST API"""
+        """Wykonanie zapytania do Supabase REST API (None przy błędzie lub otwartym bezpieczniku)"""
+        if not self.breaker.allow():
+            return None
         try:
             url = f"{self.rest_url}/{endpoint}"
             
             if method == "GET":
-                response = requests.get(url, headers=self.headers, params=params, timeout=10)
+                response = self.session.get(url, params=params, timeout=self.timeout)
             elif method == "POST":
-                response = requests.post(url, headers=self.headers, json=data, timeout=10)
+                response = self.session.post(url, json=data, timeout=self.timeout)
             elif method == "PATCH":
-                response = requests.patch(url, headers=self.headers, params=params, json=data, timeout=10)
+                response = self.session.patch(url, params=params, json=data, timeout=self.timeout)
             elif method == "DELETE":
-                response = requests.delete(url, headers=self.headers, params=params, timeout=10)
+                response = self.session.delete(url, params=params, timeout=self.timeout)
             else:
                 return None
             
+            if response.status_code in FAILURE_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            
+            if response.status_code == 400 and method == "GET":
+                retry_params = self._projection_fallback(params, response.text)
+                if retry_params is not None:
+                    return self._make_request(endpoint, method, retry_params, data)
+            
             if response.status_code in [200, 201]:
                 return response.json()
             else:
@@ -77,93 +188,276 @@ class DatabaseHandler:
                 return None
                 
         except requests.exceptions.Timeout:
+            self.breaker.record_failure()
             print("❌ Timeout połączenia z Supabase")
             return None
         except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
             print(f"❌ Błąd zapytania: {e}")
             return None
     
     def get_all_restaurants(self) -> List[Dict]:
-        """Pobieranie wszystkich restauracji z Supabase"""
-        result = self._make_request("restaurants", params={"select": "*", "order": "name"})
-        return result if result else []
+        """Wszystkie restauracje (z cache katalogu, w razie potrzeby z Supabase)"""
+        return self.catalog.get_all()
+    
+    def _fetch_all_restaurants(self) -> Optional[List[Dict]]:
+        """Pobieranie wszystkich restauracji z Supabase (None przy błędzie)"""
+        return self._make_request("restaurants", params=CATALOG_PARAMS)
+    
+    def _fetch_availability(self) -> Optional[List[Dict]]:
+        """Lekkie odświeżenie samej dostępności stolików"""
+        return self._make_request("restaurants", params=AVAILABILITY_PARAMS)
+    
+    def _select_clause(self, columns: Optional[Sequence[str]]) -> str:
+        """Parametr `select` dla projekcji kolumn (id i name zawsze dołączane, brakujące pomijane)"""
+        if not columns:
+            return "*"
+        return ",".join(column for column in dict.fromkeys(["id", "name", *columns])
+                        if column not in self.missing_columns)
+    
+    @staticmethod
+    def _projected(params: Optional[dict]) -> bool:
+        """Czy zapytanie wybiera konkretne kolumny (a nie select=*)"""
+        return bool(params) and params.get("select", "*") != "*"
+    
+    def _projection_fallback(self, params: Optional[dict], error: str) -> Optional[dict]:
+        """
+        Parametry ponowienia zapytania odrzuconego przez bazę (400). Kolumna
+        wskazana w błędzie (np. `features`, której ta instancja Supabase nie ma)
+        trafia do missing_columns i jest pomijana w kolejnych projekcjach; to
+        jedno zapytanie jest ponawiane bez niej (select=*, gdy błąd nie wskazuje
+        kolumny). None - bez ponowienia (brak projekcji albo brakuje kolumny filtra).
+        """
+        match = MISSING_COLUMN_RE.search(error)
+        if match:
+            self.missing_columns.add(match.group(1))
+        if not self._projected(params):
+            return None
+        selected = params["select"].split(",")
+        if match and match.group(1) not in selected:
+            return None
+        select = ",".join(c for c in selected if not match or c != match.group(1)) or "*"
+        self.projection_fallbacks += 1
+        print(f"⚠️ Projekcja {params['select']} odrzucona przez bazę ({error.strip()[:200]}) - ponowienie z select={select}")
+        return {**params, "select": select}
     
-    def get_restaurants_by_cuisine(self, cuisine_name: str) -> List[Dict]:
+    def check_schema(self, columns: Iterable[str]) -> Set[str]:
+        """
+        Sprawdzenie jednym zapytaniem (np. przy starcie), których z `columns`
+        brakuje w tabeli restaurants - są od razu pomijane w projekcji.
+        Zwraca brakujące kolumny (pusty zbiór także przy błędzie lub pustej tabeli).
         """
-        Pobiera restauracje pasujące do danej kuchni.
-        Naprawiono: Obsługa kolumny 'cuisine_type' (Array) oraz Case Insensitivity.
+        rows = self._make_request("restaurants", params={"select": "*", "limit": "1"})
+        if not rows:
+            return set()
+        # Także kolumna filtra kuchni (bez niej kuchnie są wyszukiwane w katalogu)
+        missing = {*columns, CUISINE_SEARCH_COLUMN} - set(rows[0])
+        if missing:
+            print(f"⚠️ Brak kolumn w tabeli restaurants: {', '.join(sorted(missing))} - pomijane w zapytaniach")
+            self.missing_columns.update(missing)
+        return missing
+    
+    def get_restaurants_by_cuisine(self, cuisine_name: str, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Pobiera restauracje danej kuchni: jedna z kuchni w 'cuisine_type'
+        równa nazwie z zapytania (cuisine_key - bez rozróżniania wielkości
+        liter). Puste zapytanie - wszystkie restauracje z kuchnią.
+        
+        Gdy katalog jest w cache, wynik pochodzi z lokalnego indeksu
+        kuchnia -> restauracje (bez zapytania). W przeciwnym razie filtr
+        jest wykonywany po stronie bazy na kolumnie 'cuisine_search'
+        (kuchnie małymi literami, migrations/supabase/001_cuisine_search.sql)
+        i przesyłane są tylko pasujące wiersze z kolumnami `columns`.
+        Bez tej kolumny w bazie wynik pochodzi z pobranego katalogu.
         """
         try:
-            # 1. Pobieramy WSZYSTKIE restauracje (dla małej bazy MVP to najbezpieczniejsza metoda filtrowania)
-            all_venues = self.get_all_restaurants()
-
-            matches = []
-            if not all_venues:
-                return matches
-
-            # Normalizujemy szukaną frazę (np. "włoska" -> "włoska")
-            target = cuisine_name.lower().strip()
-
-            # 2. Filtrujemy w Pythonie
-            for venue in all_venues:
-                # Pobieramy listę kuchni, np. ['Włoska', 'Pizza'] lub None
-                c_types = venue.get('cuisine_type', [])
-                
-                # Zabezpieczenie: jeśli w bazie jest null lub pusty string
-                if not c_types:
-                    continue
-                    
-                # Jeśli z jakiegoś powodu to nie lista, robimy z tego listę
-                if not isinstance(c_types, list):
-                    c_types = [str(c_types)]
-                
-                # Sprawdzamy czy nasza szukana kuchnia jest w tej liście (ignorując wielkość liter)
-                # Sprawdzamy: czy "włoska" jest w ["włoska", "pizza"]
-                if any(target in c.lower() for c in [str(x) for x in c_types]):
-                    matches.append(venue)
+            target = cuisine_key(cuisine_name)
             
-            return matches
-
+            if self.catalog.is_loaded() or not target or CUISINE_SEARCH_COLUMN in self.missing_columns:
+                return self._cuisine_from_catalog(target)
+            
+            # Operator PostgREST na tablicy: cuisine_search @> {cel}
+            result = self._make_request(
+                "restaurants",
+                params={
+                    "select": self._select_clause(columns),
+                    CUISINE_SEARCH_COLUMN: f'cs.{{"{self._quote_filter_value(target)}"}}',
+                    "order": "name",
+                }
+            )
+            if result is None:
+                return self._cuisine_from_catalog(target)
+            self.catalog.merge_partial(result)
+            return result
+        
         except Exception as e:
             print(f"❌ DB Error w get_restaurants_by_cuisine: {e}")
             return []
     
-    def check_availability(self, restaurant_name: str) -> Optional[Dict]:
+    def _cuisine_from_catalog(self, target: str) -> List[Dict]:
+        """Wyszukiwanie w indeksie kuchni (pusty cel - wszystkie restauracje z kuchnią)"""
+        rows, index = self.catalog.index("cuisine", self._build_cuisine_index, fields=("cuisine_type",))
+        return [rows[position] for position in self._cuisine_positions(index, target)]
+    
+    @staticmethod
+    def _cuisine_positions(index: Dict[str, List[int]], target: str) -> List[int]:
+        """Pozycje restauracji kuchni `target` (cuisine_key) w indeksie kuchni, rosnąco"""
+        if target:
+            return list(index.get(target, ()))
+        return sorted({position for venues in index.values() for position in venues})
+    
+    @staticmethod
+    def _build_cuisine_index(rows: List[Dict]) -> Dict[str, List[int]]:
+        """Indeks: kuchnia (cuisine_key) -> pozycje restauracji w `rows`"""
+        index: Dict[str, List[int]] = {}
+        for position, venue in enumerate(rows):
+            # Pobieramy listę kuchni, np. ['Włoska', 'Pizza'] lub None
+            c_types = venue.get('cuisine_type', [])
+            
+            # Zabezpieczenie: jeśli w bazie jest null lub pusty string
+            if not c_types:
+                continue
+            
+            # Jeśli z jakiegoś powodu to nie lista, robimy z tego listę
+            if not isinstance(c_types, list):
+                c_types = [str(c_types)]
+            
+            for c_type in dict.fromkeys(cuisine_key(c) for c in c_types):
+                if c_type:
+                    index.setdefault(c_type, []).append(position)
+        return index
+    
+    def check_availability(self, restaurant_name: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
         """Sprawdzanie dostępności stolików w konkretnej restauracji"""
-        # Próba dokładnego dopasowania (case-insensitive)
-        result = self._make_request(
-            "restaurants",
-            params={"select": "*", "name": f"ilike.{restaurant_name}"}
-        )
-        
-        if result and len(result) > 0:
-            return result[0]
+        return self.resolve_restaurants([restaurant_name], columns).get(restaurant_name)
+    
+    def get_restaurant_details(self, restaurant_name: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """Pobieranie szczegółowych informacji o restauracji"""
+        return self.check_availability(restaurant_name, columns)
+    
+    def get_restaurants_by_names(self, restaurant_names: List[str],
+                                 columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Pobieranie wielu restauracji naraz (bez powtórzeń, w kolejności
+        `restaurant_names`; nierozpoznane nazwy są pomijane).
+        """
+        rows = []
+        seen = set()
+        for row in self.resolve_restaurants(restaurant_names, columns).values():
+            if row is not None and id(row) not in seen:
+                seen.add(id(row))
+                rows.append(row)
+        return rows
+    
+    def set_aliases(self, aliases: Dict[str, str]) -> None:
+        """Podmiana słownika aliasów {alias: nazwa restauracji}"""
+        self._aliases = {alias.lower(): name for alias, name in aliases.items()}
+        self.catalog.clear_indexes("aliases")
+    
+    def resolve_restaurants(self, restaurant_names: List[str],
+                            columns: Optional[Sequence[str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Rozpoznanie nazw restauracji: dokładna nazwa (bez rozróżniania
+        wielkości liter), potem alias z entities.py, na końcu fragment nazwy.
         
-        # Próba częściowego dopasowania
-        result = self._make_request(
-            "restaurants",
-            params={"select": "*", "name": f"ilike.%{restaurant_name}%"}
-        )
+        Gdy katalog jest w cache, korzysta z lokalnego indeksu nazw - bez
+        zapytania do bazy. W przeciwnym razie wiersze częściowe z cache
+        (zawierające wszystkie `columns`) są używane od razu, a pozostałe
+        nazwy są sprawdzane jednym zapytaniem pobierającym tylko `columns`
+        (domyślnie wszystkie kolumny). Zwraca {nazwa: wiersz lub None}.
+        """
+        resolved, remaining = self._resolve_cached(restaurant_names, columns)
+        if remaining:
+            result = self._make_request("restaurants", params=self._candidates_params(remaining, columns))
+            self._resolve_fetched(resolved, remaining, result if result else [])
+        return resolved
+    
+    def _resolve_cached(self, restaurant_names: List[str],
+                        columns: Optional[Sequence[str]] = None) -> tuple:
+        """
+        Rozpoznanie nazw bez zapytania do bazy (katalog lub wiersze częściowe).
+        Zwraca ({nazwa: wiersz lub None}, nazwy do sprawdzenia w bazie).
+        """
+        resolved: Dict[str, Optional[Dict]] = dict.fromkeys(restaurant_names)
+        names = [name for name in resolved if name and name.strip()]
         
-        if result and len(result) > 0:
-            return result[0]
+        if self.catalog.is_loaded():
+            rows, by_name = self.catalog.index("names", self._build_name_index, fields=("name",))
+            _, by_alias = self.catalog.index("aliases", self._build_alias_index, fields=("name",))
+            for name in names:
+                resolved[name] = self._match_name(name, rows, by_name, by_alias)
+            return resolved, []
         
+        if columns:
+            for name in names:
+                resolved[name] = self._cached_partial(name, columns)
+            names = [name for name in names if resolved[name] is None]
+        return resolved, names
+    
+    def _resolve_fetched(self, resolved: Dict[str, Optional[Dict]], names: List[str], rows: List[Dict]) -> None:
+        """Dopasowanie `names` do wierszy pobranych z bazy (i zapamiętanie ich w cache)"""
+        by_name = self._build_name_index(rows)
+        by_alias = self._build_alias_index(rows)
+        self.catalog.merge_partial(rows)
+        for name in names:
+            resolved[name] = self._match_name(name, rows, by_name, by_alias)
+    
+    def _cached_partial(self, name: str, columns: Sequence[str]) -> Optional[Dict]:
+        """Wiersz częściowy z cache po dokładnej nazwie lub aliasie"""
+        target = name.strip().lower()
+        for candidate in dict.fromkeys(filter(None, [target, self._aliases.get(target)])):
+            row = self.catalog.get_partial(candidate, columns)
+            if row is not None:
+                return row
         return None
     
-    def get_restaurant_details(self, restaurant_name: str) -> Optional[Dict]:
-        """Pobieranie szczegółowych informacji o restauracji"""
-        return self.check_availability(restaurant_name)
+    def _candidates_params(self, names: List[str], columns: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        """Jedno zapytanie o wszystkie restauracje pasujące do którejś z nazw"""
+        conditions = []
+        for name in names:
+            target = name.strip()
+            canonical = self._aliases.get(target.lower())
+            for value in dict.fromkeys(filter(None, [target, canonical])):
+                conditions.append(f'name.ilike."{self._quote_filter_value(value)}"')
+            conditions.append(f'name.ilike."*{self._quote_filter_value(target)}*"')
+        
+        return {"select": self._select_clause(columns), "or": f"({','.join(conditions)})", "order": "name"}
+    
+    @staticmethod
+    def _build_name_index(rows: List[Dict]) -> Dict[str, int]:
+        """Indeks: nazwa (małe litery) -> pozycja wiersza w `rows`"""
+        by_name: Dict[str, int] = {}
+        for position, row in enumerate(rows):
+            by_name.setdefault(str(row.get('name', '')).lower(), position)
+        return by_name
+    
+    def _build_alias_index(self, rows: List[Dict]) -> Dict[str, int]:
+        """Indeks: alias z entities.py -> pozycja restauracji w `rows`"""
+        by_name = self._build_name_index(rows)
+        return {alias: by_name[canonical.lower()] for alias, canonical in self._aliases.items()
+                if canonical.lower() in by_name}
+    
+    @staticmethod
+    def _match_name(name: str, rows: List[Dict], by_name: Dict[str, int],
+                    by_alias: Dict[str, int]) -> Optional[Dict]:
+        """Dopasowanie jednej nazwy: dokładne -> alias -> fragment nazwy"""
+        target = name.strip().lower()
+        position = by_name.get(target)
+        if position is None:
+            position = by_alias.get(target)
+        if position is not None:
+            return rows[position]
+        return next((r for r in rows if target in str(r.get('name', '')).lower()), None)
+    
+    @staticmethod
+    def _quote_filter_value(value: str) -> str:
+        """Escapowanie wartości w cudzysłowie dla filtrów PostgREST (or=...)"""
+        return value.replace('\\', '\\\\').replace('"', '\\"')
     
     def get_restaurant_description(self, restaurant_name: str) -> Optional[str]:
-        """Pobieranie opisu restauracji"""
-        result = self._make_request(
-            "restaurants",
-            params={"select": "description", "name": f"ilike.{restaurant_name}"}
-        )
-        
-        if result and len(result) > 0:
-            return result[0].get('description')
-        return None
+        """Pobieranie opisu restauracji (z cache, jeśli wiersz był już pobrany)"""
+        row = self.get_restaurant_details(restaurant_name, columns=("description",))
+        return row.get('description') if row else None
     
     def update_availability(self, restaurant_name: str, available_tables: int) -> bool:
         """Aktualizacja liczby dostępnych stolików"""
@@ -174,7 +468,75 @@ class DatabaseHandler:
             data={"available_tables": available_tables}
         )
         
+        # Zmienione wiersze trafiają od razu do cache; bez odpowiedzi nie
+        # wiadomo, co się zmieniło - katalog jest unieważniany
+        if result:
+            self.catalog.apply_rows(result)
+        else:
+            self.catalog.invalidate()
+        
         return result is not None and len(result) > 0
+    
+    def get_availability(self, restaurant_ids: Sequence[Any]) -> Optional[Dict[Any, int]]:
+        """
+        Bieżąca liczba wolnych stolików z bazy (z pominięciem cache), jednym
+        zapytaniem: {id: liczba}. None przy błędzie.
+        """
+        if not restaurant_ids:
+            return {}
+        result = self._make_request(
+            "restaurants",
+            params={"select": "id,available_tables", "id": f"in.({','.join(str(i) for i in restaurant_ids)})"}
+        )
+        if result is None:
+            return None
+        return {row['id']: row.get('available_tables') for row in result}
+    
+    def compare_and_set_availability(self, restaurant_id: Any, expected: int, value: int) -> Optional[List[Dict]]:
+        """
+        Zapis `value` tylko wtedy, gdy w bazie jest nadal `expected`
+        (compare-and-swap). Zwraca zmienione wiersze: [] przy konflikcie,
+        None przy błędzie zapytania.
+        """
+        return self._make_request(
+            "restaurants",
+            method="PATCH",
+            params={"id": f"eq.{restaurant_id}", "available_tables": f"eq.{expected}",
+                    "select": "id,name,available_tables"},
+            data={"available_tables": value}
+        )
+
+    def subscribe(self, feed) -> None:
+        """
+        Tryb subskrypcji: zmiany wierszy z kanału zmian (change_feed.py)
+        trafiają od razu do katalogu w pamięci, a okresowe odpytywanie
+        o dostępność jest wyłączone. Po każdym dołączeniu do kanału (także
+        pierwszym - katalog pobrany przed nim mógł pominąć zmiany) i po
+        przerwie katalog jest odświeżany w tle; pełne odświeżenie co
+        CATALOG_TTL zostaje jako zabezpieczenie.
+        """
+        feed.subscribe(self.catalog.apply_change, on_resync=self.catalog.expire)
+        self.catalog.set_live(True)
+        # Katalog w pamięci od pierwszego zapytania
+        self.catalog.get_all()
+
+
+def create_database_handler(backend: Optional[str] = None, **options):
+    """
+    Tworzenie obsługi bazy po nazwie backendu (supabase / sqlite,
+    domyślnie ze zmiennej DB_BACKEND). Oba backendy mają te same metody:
+    get_all_restaurants, get_restaurants_by_cuisine, check_availability,
+    get_restaurant_details, get_restaurants_by_names, resolve_restaurants,
+    get_restaurant_description, update_availability, get_availability,
+    compare_and_set_availability, set_aliases, check_connection, close.
+    """
+    backend = backend or os.getenv('DB_BACKEND', BACKEND_SUPABASE)
+    if backend == BACKEND_SUPABASE:
+        return DatabaseHandler(**options)
+    if backend == BACKEND_SQLITE:
+        from sqlite_db_handler import SQLiteDatabaseHandler  # import lokalny - backend opcjonalny
+        return SQLiteDatabaseHandler(**options)
+    raise ValueError(f"Nieznany backend bazy danych: {backend}")
 
 
 # =============================================================================
@@ -182,6 +544,9 @@ class DatabaseHandler:
 # =============================================================================
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     print("=" * 50)
     print("TEST POŁĄCZENIA Z SUPABASE")
     print("=" * 50)
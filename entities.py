@@ -76,6 +76,7 @@ KW_CUISINE = {
     "a streetfood": "StreetFood",
     "coś szybkiego": "StreetFood",
     "szybkie": "StreetFood",
+    "szybkiego": "StreetFood",
     "na szybko": "StreetFood",
     "food truck": "StreetFood",
     "foodtruck": "StreetFood",
@@ -107,6 +108,9 @@ KW_CUISINE = {
     "włoskiej": "Śródziemnomorska",
     "wloskiej": "Śródziemnomorska",
     "włoskie": "Śródziemnomorska",
+    "włoskiego": "Śródziemnomorska",
+    "wloskiego": "Śródziemnomorska",
+    "włoskim": "Śródziemnomorska",
     "pizza": "Śródziemnomorska",
     "pizzę": "Śródziemnomorska",
     "pizzy": "Śródziemnomorska",
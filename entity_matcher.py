@@ -0,0 +1,119 @@
+# =============================================================================
+# ENTITY_MATCHER.PY - Automat Aho-Corasick do wyszukiwania encji (Hotable)
+# Jedno przejście po tekście znajduje wszystkie wystąpienia aliasów
+# restauracji i kuchni ze słowników w entities.py
+# =============================================================================
+
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class EntityMatch(NamedTuple):
+    """Pojedyncze wystąpienie aliasu encji w (znormalizowanym) tekście"""
+    entity_type: str    # Typ encji, np. 'restaurant' lub 'cuisine'
+    canonical: str      # Ustandaryzowana nazwa (wartość ze słownika)
+    alias: str          # Dopasowany alias (klucz ze słownika)
+    start: int          # Początek wystąpienia w tekście
+    end: int            # Koniec wystąpienia (wyłącznie)
+    priority: int       # Pozycja aliasu w słowniku (rozstrzyga remisy)
+
+
+class EntityMatcher:
+    """
+    Automat Aho-Corasick zbudowany raz ze słowników {alias: nazwa}.
+
+    Koszt wyszukiwania jest liniowy względem długości tekstu (plus liczba
+    znalezionych wystąpień), niezależnie od liczby aliasów.
+    """
+
+    def __init__(self, dictionaries: Dict[str, Dict[str, str]]):
+        """
+        dictionaries: typ encji -> słownik {alias: nazwa kanoniczna},
+        np. {'restaurant': KW_RESTAURANTS, 'cuisine': KW_CUISINE}
+        """
+        self.entity_types = tuple(dictionaries)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[list] = [[]]
+
+        for entity_type, mapping in dictionaries.items():
+            for priority, (alias, canonical) in enumerate(mapping.items()):
+                self._add(alias, (entity_type, canonical, alias, priority))
+
+        self._build_failure_links()
+
+    def _add(self, alias: str, output: tuple) -> None:
+        """Dodanie aliasu do drzewa trie"""
+        if not alias:
+            return
+        node = 0
+        for char in alias:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append(output)
+
+    def _build_failure_links(self) -> None:
+        """Przejście BFS: linki porażki i scalenie wyjść z sufiksów"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterable[EntityMatch]:
+        """Wszystkie wystąpienia aliasów (także wewnątrz słów i nakładające się)"""
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for entity_type, canonical, alias, priority in outputs[node]:
+                end = index + 1
+                yield EntityMatch(entity_type, canonical, alias, end - len(alias), end, priority)
+
+    def find_all(self, text: str, whole_words: bool = True) -> List[EntityMatch]:
+        """
+        Lista wystąpień w kolejności pozycji w tekście.
+        whole_words=True zostawia tylko wystąpienia na granicach słów
+        (tekst po normalizacji - słowa rozdzielone pojedynczymi spacjami).
+        """
+        matches = self.iter_matches(text)
+        if whole_words:
+            matches = (m for m in matches if is_word_bounded(text, m.start, m.end))
+        return sorted(matches, key=lambda m: (m.start, -len(m.alias)))
+
+    @staticmethod
+    def best_match(matches: Iterable[EntityMatch], entity_type: str) -> Optional[EntityMatch]:
+        """Najdłuższy alias danego typu (remis - wcześniejszy w słowniku)"""
+        best = None
+        for match in matches:
+            if match.entity_type != entity_type:
+                continue
+            if best is None or (len(match.alias), -match.priority) > (len(best.alias), -best.priority):
+                best = match
+        return best
+
+
+def is_word_bounded(text: str, start: int, end: int) -> bool:
+    """Czy fragment text[start:end] zaczyna i kończy się na granicy słowa"""
+    if start > 0 and not text[start - 1].isspace():
+        return False
+    if end < len(text) and not text[end].isspace():
+        return False
+    return True
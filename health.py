@@ -0,0 +1,93 @@
+# =============================================================================
+# HEALTH.PY - Stan instancji Hotable dla sond i monitoringu
+# Liczniki zapytań HTTP oraz kosztowne sprawdzenia wykonywane najwyżej raz
+# na określony czas - zwykła sonda /health nie odpytuje bazy
+# =============================================================================
+
+import threading
+import time
+from typing import Any, Callable, Collection, Dict, Optional
+
+
+class RequestCounters:
+    """
+    Liczniki zapytań HTTP: łącznie, według endpointu i klasy statusu (2xx, 4xx, 5xx).
+
+    expected_statuses - statusy 5xx, które dla danego endpointu są
+    odpowiedzią, a nie błędem (np. 503 z /health/ready w trakcie
+    uruchamiania); liczone osobno jako `expected`, nie w `errors`.
+    """
+
+    def __init__(self, expected_statuses: Optional[Dict[str, Collection[int]]] = None):
+        self.started_at = time.time()
+        self.expected_statuses = expected_statuses or {}
+        # endpoint -> [liczba, błędy 5xx, łączny czas obsługi, oczekiwane 5xx]
+        self._endpoints: Dict[str, list] = {}
+        self._statuses: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, status: int, seconds: float) -> None:
+        status_class = f"{status // 100}xx"
+        expected = status in self.expected_statuses.get(endpoint, ())
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, [0, 0, 0.0, 0])
+            counters[0] += 1
+            counters[1] += status >= 500 and not expected
+            counters[2] += seconds
+            counters[3] += expected
+            self._statuses[status_class] = self._statuses.get(status_class, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total": sum(counters[0] for counters in self._endpoints.values()),
+                "by_status": dict(self._statuses),
+                "by_endpoint": {
+                    endpoint: {
+                        "count": count,
+                        "errors": errors,
+                        "expected": expected,
+                        "avg_ms": round(seconds / count * 1000, 2),
+                    }
+                    for endpoint, (count, errors, seconds, expected) in self._endpoints.items()
+                },
+                "uptime": round(time.time() - self.started_at, 1),
+            }
+
+
+class RateLimitedCheck:
+    """
+    Kosztowne sprawdzenie (np. zapytanie do bazy) wykonywane najwyżej raz
+    na `min_interval` sekund - w międzyczasie zwracany jest zapamiętany wynik.
+    `check` zwraca słownik z wynikiem; wyjątek daje {"ok": False, "error": ...}.
+    Jednocześnie trwa co najwyżej jedno sprawdzenie; pozostali wołający
+    dostają poprzedni wynik zamiast czekać.
+    """
+
+    def __init__(self, check: Callable[[], Dict[str, Any]], min_interval: float = 30.0):
+        self.check = check
+        self.min_interval = min_interval
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._running = threading.Lock()
+        self.runs = 0
+
+    def run(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        if self._result is None or now - self._checked_at >= self.min_interval:
+            if self._running.acquire(blocking=self._result is None):
+                try:
+                    if self._result is None or time.monotonic() - self._checked_at >= self.min_interval:
+                        self._execute()
+                finally:
+                    self._running.release()
+        return {**self._result, "age": round(time.monotonic() - self._checked_at, 3)}
+
+    def _execute(self) -> None:
+        self.runs += 1
+        try:
+            result = self.check()
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        self._result = result
+        self._checked_at = time.monotonic()
@@ -0,0 +1,87 @@
+# =============================================================================
+# LRU_CACHE.PY - Ograniczony, wątkowo bezpieczny cache LRU z TTL dla Hotable
+# =============================================================================
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Cache LRU o ograniczonym rozmiarze z opcjonalnym czasem życia wpisów.
+
+    - maxsize: maksymalna liczba wpisów (0 = cache wyłączony)
+    - ttl: czas życia wpisu w sekundach (None = bez wygasania)
+
+    Wszystkie operacje są chronione blokadą, więc jeden obiekt może być
+    współdzielony przez wątki Flaska.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # klucz -> (wartość, czas_zapisu)
+        self._lock = threading.Lock()
+
+        # Liczniki
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Pobranie wartości (i oznaczenie jej jako ostatnio używanej)"""
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.misses += 1
+                return default
+
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Zapis wartości; przy przepełnieniu usuwa najdawniej używany wpis"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Usunięcie wszystkich wpisów (liczniki pozostają)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Liczniki trafień, chybień i usunięć"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
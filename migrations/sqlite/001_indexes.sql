@@ -0,0 +1,8 @@
+-- =============================================================================
+-- 001_INDEXES.SQL - Indeksy wyszukiwania dla hotable.db (SQLite)
+-- Nazwa restauracji bez rozróżniania wielkości liter (ASCII) - dokładne
+-- dopasowanie w resolve_restaurants / check_availability.
+-- Uruchomienie: python sqlite_db_handler.py --migrate
+-- =============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_restaurants_name_nocase ON restaurants (name COLLATE NOCASE);
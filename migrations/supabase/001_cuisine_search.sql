@@ -0,0 +1,30 @@
+-- =============================================================================
+-- 001_CUISINE_SEARCH.SQL - Filtr kuchni po stronie bazy dla Hotable (Supabase)
+-- Kolumna cuisine_search: kuchnie z cuisine_type małymi literami, bez spacji
+-- na brzegach (ta sama reguła co catalog_cache.cuisine_key), utrzymywana
+-- przez trigger. DatabaseHandler.get_restaurants_by_cuisine filtruje po niej
+-- operatorem cs (@>); bez tej kolumny wynik pochodzi z pobranego katalogu.
+-- Uruchomienie: SQL Editor w panelu Supabase albo psql "$DATABASE_URL" -f ...
+-- =============================================================================
+
+ALTER TABLE restaurants ADD COLUMN IF NOT EXISTS cuisine_search text[] NOT NULL DEFAULT '{}';
+
+CREATE OR REPLACE FUNCTION restaurants_cuisine_search() RETURNS trigger AS $$
+BEGIN
+    NEW.cuisine_search := coalesce(
+        array(SELECT lower(btrim(c)) FROM unnest(NEW.cuisine_type) AS c WHERE btrim(c) <> ''),
+        '{}'
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS restaurants_cuisine_search ON restaurants;
+CREATE TRIGGER restaurants_cuisine_search
+    BEFORE INSERT OR UPDATE OF cuisine_type ON restaurants
+    FOR EACH ROW EXECUTE FUNCTION restaurants_cuisine_search();
+
+-- Uzupełnienie istniejących wierszy (trigger UPDATE OF cuisine_type)
+UPDATE restaurants SET cuisine_type = cuisine_type;
+
+CREATE INDEX IF NOT EXISTS idx_restaurants_cuisine_search ON restaurants USING gin (cuisine_search);
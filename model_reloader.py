@@ -0,0 +1,125 @@
+# =============================================================================
+# MODEL_RELOADER.PY - Przeładowanie modelu NLP Hotable bez restartu serwera
+# Nowy ChatbotBrain jest budowany obok działającego i podmieniany jednym
+# przypisaniem - zapytania w toku kończą się na modelu, z którym zaczęły
+# =============================================================================
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import entities
+from nlp_engine import ChatbotBrain
+
+
+class ModelReloader:
+    """
+    Przechowuje bieżący model i podmienia go na nowy po zmianie plików.
+
+    - watch_paths: pliki obserwowane przez wątek sprawdzający (domyślnie
+      intents.json modelu i entities.py)
+    - interval: co ile sekund sprawdzać zmiany (start())
+    - on_reload: wywoływane z nowym modelem zaraz po podmianie, przed kolejnym
+      przeładowaniem (np. aktualizacja aliasów w DatabaseHandler, pula NLP)
+    """
+
+    def __init__(self, brain: ChatbotBrain, watch_paths: Optional[Sequence[str]] = None,
+                 interval: float = 2.0, on_reload: Optional[Callable[[ChatbotBrain], None]] = None):
+        self._brain = brain
+        self.watch_paths = tuple(watch_paths or (brain.intents_file, entities.__file__))
+        self.interval = interval
+        self.on_reload = on_reload
+
+        # Jedno przeładowanie naraz (watcher i endpoint administracyjny)
+        self._reload_lock = threading.Lock()
+        self._snapshot = self._file_state()
+        self._stop = threading.Event()
+        self._watcher = None
+
+        # Liczniki
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload_at = None
+        self.last_duration = None
+        self.last_error = None
+
+    @property
+    def brain(self) -> ChatbotBrain:
+        """Bieżący model - zapytanie pobiera go raz i używa do końca"""
+        return self._brain
+
+    def _file_state(self) -> Tuple:
+        state = []
+        for path in self.watch_paths:
+            try:
+                stat = os.stat(path)
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    def changed(self) -> bool:
+        """Czy obserwowane pliki zmieniły się od ostatniego przeładowania"""
+        return self._file_state() != self._snapshot
+
+    def reload(self) -> Optional[ChatbotBrain]:
+        """
+        Zbudowanie nowego modelu i podmiana. Zwraca nowy model albo None,
+        gdy budowa się nie powiodła (działa wtedy dalej poprzedni).
+        """
+        with self._reload_lock:
+            snapshot = self._file_state()
+            started = time.perf_counter()
+            try:
+                brain = self._brain.rebuilt()
+                if not brain.intents:
+                    raise ValueError(f"brak intencji w {brain.intents_file}")
+            except Exception as e:
+                # Błędny plik nie może zatrzymać serwera - zostaje stary model
+                self._snapshot = snapshot
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"❌ Przeładowanie modelu nie powiodło się: {e}")
+                return None
+
+            self._brain = brain
+            self._snapshot = snapshot
+            self.reloads += 1
+            self.last_reload_at = time.time()
+            self.last_duration = time.perf_counter() - started
+            self.last_error = None
+
+            if self.on_reload:
+                self.on_reload(brain)
+        print(f"🔄 Model NLP przeładowany (wersja {brain.model_version}, {self.last_duration * 1000:.0f} ms)")
+        return brain
+
+    def start(self) -> None:
+        """Uruchomienie wątku sprawdzającego zmiany plików co `interval` sekund"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self.changed():
+                self.reload()
+
+    def stats(self) -> Dict:
+        return {
+            "model_version": self._brain.model_version,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reload_at": self.last_reload_at,
+            "last_duration_ms": round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None,
+        }
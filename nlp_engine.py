@@ -2,11 +2,308 @@
 # NLP_ENGINE.PY - Silnik przetwarzania języka naturalnego dla Hotable
 # =============================================================================
 
+import hashlib
+import heapq
+import importlib
 import json
-import random
+import math
+import os
+import pickle
 import re
+import threading
+from collections import Counter
 from difflib import SequenceMatcher
-from entities import KW_CUISINE, KW_RESTAURANTS, COMMON_WORDS, INTENT_KEYWORDS
+from typing import NamedTuple, Optional
+import entities as entities_module
+import entity_matcher as entity_matcher_module
+from entities import COMMON_WORDS
+from entity_matcher import EntityMatcher, is_word_bounded
+from lru_cache import LRUCache
+from response_selectors import RandomSelector
+
+try:
+    import numpy as np
+except ImportError:  # silnik TF-IDF działa też bez numpy (wolniejsza ścieżka)
+    np = None
+
+# Prekompilowane wyrażenia normalizacji (używane dla każdej wiadomości i wzorca)
+_PUNCTUATION_RE = re.compile(r'[^\w\sąćęłńóśźżĄĆĘŁŃÓŚŹŻ]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+# Tryby wyszukiwania wzorców w etapie 2
+SEARCH_EXHAUSTIVE = "exhaustive"  # ocena wszystkich wzorców (pełny skan)
+SEARCH_INDEXED = "indexed"        # ocena tylko top-K kandydatów z indeksu odwróconego
+
+# Długość n-gramów znakowych (łapie odmiany typu "neonie" / "neon")
+NGRAM_SIZE = 3
+# Waga wspólnego całego słowa względem wspólnego n-gramu
+TOKEN_WEIGHT = 2.0
+
+# Próg podobieństwa słów w _word_overlap_score
+WORD_SIMILARITY_CUTOFF = 0.8
+
+# Silniki oceny wzorców w etapie 2
+ENGINE_LEGACY = "legacy"  # podobieństwo napisów + nakładanie słów (SequenceMatcher)
+ENGINE_TFIDF = "tfidf"    # podobieństwo kosinusowe wektorów TF-IDF n-gramów znakowych
+
+# Zakres długości n-gramów znakowych silnika TF-IDF
+TFIDF_NGRAM_RANGE = (2, 4)
+
+# Wersja formatu artefaktu modelu (build_model.py) - zmiana unieważnia stare artefakty
+MODEL_FORMAT_VERSION = 1
+# Stan ChatbotBrain zapisywany w artefakcie (wynik kompilacji intents.json i entities.py)
+MODEL_STATE = (
+    'intents', 'entity_matcher', 'pattern_index', 'compiled_patterns', '_word_char_counts',
+    'unindexed_pattern_ids', 'token_index', 'ngram_index', 'tfidf_index', 'responses',
+    '_compiled_intents',
+)
+
+# Etapy, które mogą zdecydować o intencji
+STAGE_EXACT = "exact"
+STAGE_FUZZY = "fuzzy"
+STAGE_ENTITY = "entity_heuristic"
+STAGE_PHRASE = "phrase_heuristic"
+STAGE_FALLBACK = "fallback"
+
+
+class IntentResult(NamedTuple):
+    """Wynik jednego przejścia oceny wiadomości (score_intent)"""
+    intent: str                 # Ostateczna intencja (jak predict_intent)
+    stage: str                  # Etap, który zdecydował (STAGE_*)
+    best_match: str             # Najlepsza intencja z oceny wzorców
+    score: float                # Wynik best_match
+    runner_up: Optional[str]    # Najlepsza z pozostałych intencji
+    runner_up_score: float      # Wynik runner_up
+
+
+def _significant_words(words, common_words=COMMON_WORDS):
+    """Filtrowanie słów funkcyjnych (zachowuje kolejność iteracji wejścia)"""
+    return [w for w in words if w not in common_words and len(w) > 2]
+
+
+def _char_ngrams(word, n=NGRAM_SIZE):
+    """N-gramy znakowe słowa z dopełnieniem spacjami na brzegach"""
+    padded = f" {word} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def _common_chars(counts_a, counts_b):
+    """Liczba wspólnych znaków (z krotnościami) - licznik z quick_ratio()"""
+    if len(counts_a) > len(counts_b):
+        counts_a, counts_b = counts_b, counts_a
+    return sum(min(count, counts_b[char]) for char, count in counts_a.items() if char in counts_b)
+
+
+class CompiledPattern:
+    """
+    Wzorzec intencji przetworzony raz, przy ładowaniu modelu.
+    Pętla oceniająca korzysta wyłącznie z tych pól - nie normalizuje
+    ani nie dzieli tekstu wzorca przy każdej wiadomości.
+    """
+    
+    __slots__ = ('pattern_id', 'tag', 'text', 'length', 'char_counts', 'words',
+                 'significant', 'significant_set', 'significant_count')
+    
+    def __init__(self, pattern_id, tag, normalized, common_words=COMMON_WORDS):
+        self.pattern_id = pattern_id
+        self.tag = tag
+        self.text = normalized
+        self.length = len(normalized)
+        self.char_counts = Counter(normalized)
+        self.words = frozenset(normalized.split())
+        # Krotka w kolejności iteracji zbioru słów - taka sama jak w pierwotnej
+        # implementacji, więc sumy częściowych dopasowań są identyczne
+        self.significant = tuple(_significant_words(set(normalized.split()), common_words))
+        self.significant_set = frozenset(self.significant)
+        self.significant_count = len(self.significant)
+    
+    def renumbered(self, pattern_id):
+        """Ten sam wzorzec pod innym ID (ponowne użycie przy przeładowaniu modelu)"""
+        if pattern_id == self.pattern_id:
+            return self
+        copy = object.__new__(CompiledPattern)
+        for slot in self.__slots__:
+            setattr(copy, slot, getattr(self, slot))
+        copy.pattern_id = pattern_id
+        return copy
+
+
+class _MatcherPool:
+    """
+    Pula obiektów SequenceMatcher dla wzorców.
+    
+    Wiadomość musi pozostać pierwszą sekwencją (ratio() nie jest symetryczne),
+    więc ponownie używamy strony wzorca: seq2 (wraz z jego indeksem b2j)
+    przygotowujemy raz, a dla każdej wiadomości wywołujemy tylko set_seq1.
+    Każdy wątek pobiera na czas oceny własny zestaw matcherów.
+    """
+    
+    def __init__(self, patterns):
+        self._patterns = patterns
+        self._free = []
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return {}
+    
+    def release(self, matchers):
+        with self._lock:
+            self._free.append(matchers)
+    
+    def ratio(self, matchers, pattern, normalized_message):
+        """SequenceMatcher(None, wiadomość, wzorzec).ratio() z ponownym użyciem seq2"""
+        matcher = matchers.get(pattern.pattern_id)
+        if matcher is None:
+            matcher = SequenceMatcher(None, '', pattern.text)
+            matchers[pattern.pattern_id] = matcher
+        matcher.set_seq1(normalized_message)
+        return matcher.ratio()
+
+
+def _tfidf_terms(normalized):
+    """N-gramy znakowe (TFIDF_NGRAM_RANGE) słów wiadomości z krotnościami"""
+    terms = Counter()
+    low, high = TFIDF_NGRAM_RANGE
+    for word in normalized.split():
+        padded = f" {word} "
+        for n in range(low, high + 1):
+            terms.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return terms
+
+
+def model_fingerprint(intents_file, engine=ENGINE_LEGACY):
+    """
+    Skrót SHA-256 wszystkiego, od czego zależy skompilowany model:
+    intents.json, entities.py, kod kompilujący (ten moduł i entity_matcher),
+    silnik oceny oraz wersja formatu artefaktu.
+    """
+    digest = hashlib.sha256(f"{MODEL_FORMAT_VERSION}:{engine}".encode())
+    for path in (intents_file, entities_module.__file__, entity_matcher_module.__file__, __file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class TfidfIndex:
+    """
+    Macierz TF-IDF n-gramów znakowych wszystkich wzorców (wiersze
+    znormalizowane do długości 1). Wiadomość jest oceniana względem
+    wszystkich wzorców jednym iloczynem macierz-wektor (numpy), a bez
+    numpy - przez listy wystąpień n-gramów (rzadki iloczyn w czystym Pythonie).
+    
+    N-gramy spoza słownika wzorców nie wnoszą nic do iloczynu, ale liczą się
+    do długości wektora wiadomości - treść niepodobna do żadnego wzorca
+    obniża wynik.
+    """
+    
+    def __init__(self, patterns, previous=None):
+        # N-gramy niezmienionych wzorców przejmujemy z poprzedniego indeksu
+        known = previous.documents if previous is not None else {}
+        documents = [known.get(pattern.text) or _tfidf_terms(pattern.text) for pattern in patterns]
+        self.documents = {pattern.text: document for pattern, document in zip(patterns, documents)}
+        frequencies = Counter(term for document in documents for term in document)
+        count = len(documents)
+        
+        self.tags = [pattern.tag for pattern in patterns]
+        self.vocabulary = {term: column for column, term in enumerate(sorted(frequencies))}
+        self.idf = [math.log((1 + count) / (1 + frequencies[term])) + 1.0 for term in sorted(frequencies)]
+        self.unknown_idf = math.log(1 + count) + 1.0
+        
+        # Listy wystąpień: kolumna -> [(nr wzorca, waga)]
+        self.postings = [[] for _ in self.vocabulary]
+        for row, document in enumerate(documents):
+            for column, weight in self._weights(document)[0].items():
+                self.postings[column].append((row, weight))
+        
+        self._build_matrix()
+    
+    def _build_matrix(self):
+        """Gęsta macierz z list wystąpień (tylko z numpy)"""
+        self.matrix = None
+        if np is None:
+            return
+        columns, rows, weights = [], [], []
+        for column, entries in enumerate(self.postings):
+            for row, weight in entries:
+                columns.append(column)
+                rows.append(row)
+                weights.append(weight)
+        # Transponowana macierz wzorców: wiersz = n-gram, kolumna = wzorzec
+        self.matrix = np.zeros((len(self.vocabulary), len(self.tags)))
+        self.matrix[columns, rows] = weights
+        tag_ids = {}
+        self.tag_ids = np.array([tag_ids.setdefault(tag, len(tag_ids)) for tag in self.tags])
+    
+    def __getstate__(self):
+        # Artefakt modelu zawiera tylko listy wystąpień - macierz jest odtwarzana
+        # przy wczytaniu (mniejszy plik, działa też bez numpy)
+        state = self.__dict__.copy()
+        state.pop('matrix', None)
+        state.pop('tag_ids', None)
+        state['documents'] = {}
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_matrix()
+    
+    def _weights(self, terms):
+        """(kolumna -> znormalizowana waga, czy wektor jest niezerowy)"""
+        weights = {}
+        norm = 0.0
+        for term, frequency in terms.items():
+            column = self.vocabulary.get(term)
+            weight = (1.0 + math.log(frequency)) * (self.idf[column] if column is not None else self.unknown_idf)
+            norm += weight * weight
+            if column is not None:
+                weights[column] = weight
+        if not norm:
+            return {}, False
+        norm = math.sqrt(norm)
+        return {column: weight / norm for column, weight in weights.items()}, True
+    
+    def match(self, normalized_message):
+        """
+        Najlepszy wzorzec i najlepszy wzorzec innej intencji:
+        (najlepsza_intencja, wynik, druga_intencja, wynik_drugiej)
+        - ten sam kształt wyniku co ChatbotBrain._fuzzy_match.
+        """
+        weights, _ = self._weights(_tfidf_terms(normalized_message))
+        if not weights:
+            return "fallback", 0.0, None, 0.0
+        
+        if self.matrix is not None:
+            columns = list(weights)
+            scores = np.fromiter(weights.values(), dtype=float, count=len(columns)) @ self.matrix[columns]
+            best = int(scores.argmax())
+            if scores[best] <= 0:
+                return "fallback", 0.0, None, 0.0
+            others = np.where(self.tag_ids == self.tag_ids[best], -1.0, scores)
+            second = int(others.argmax())
+            if others[second] <= 0:
+                return self.tags[best], float(scores[best]), None, 0.0
+            return self.tags[best], float(scores[best]), self.tags[second], float(others[second])
+        
+        scores = {}
+        for column, query_weight in weights.items():
+            for row, weight in self.postings[column]:
+                scores[row] = scores.get(row, 0.0) + query_weight * weight
+        best_intent, best_score, runner_up, runner_up_score = "fallback", 0.0, None, 0.0
+        # Kolejność wzorców jak w intents.json - przy remisie wygrywa wcześniejszy
+        for row in sorted(scores):
+            score, tag = scores[row], self.tags[row]
+            if score > best_score:
+                if tag != best_intent and best_score > 0:
+                    runner_up, runner_up_score = best_intent, best_score
+                best_intent, best_score = tag, score
+            elif tag != best_intent and score > runner_up_score:
+                runner_up, runner_up_score = tag, score
+        return best_intent, best_score, runner_up, runner_up_score
+
 
 class ChatbotBrain:
     """
@@ -17,15 +314,50 @@ class ChatbotBrain:
     - Generowanie odpowiedzi
     """
     
-    def __init__(self, intents_file='intents.json'):
-        """Inicjalizacja silnika NLP"""
-        self.intents = self._load_intents(intents_file)
+    def __init__(self, intents_file='intents.json', search_mode=SEARCH_EXHAUSTIVE, top_k=50,
+                 cache_size=1024, cache_ttl=300, response_selector=None, engine=ENGINE_LEGACY,
+                 model_file=None, previous=None):
+        """
+        Inicjalizacja silnika NLP.
+        
+        search_mode: SEARCH_EXHAUSTIVE (pełny skan) lub SEARCH_INDEXED
+                     (ocena tylko top_k kandydatów z indeksu odwróconego)
+        cache_size:  liczba zapamiętanych wyników dla znormalizowanych
+                     wiadomości (0 = cache wyłączony)
+        cache_ttl:   czas życia wyniku w cache w sekundach (None = bez limitu)
+        response_selector: strategia wyboru odpowiedzi z response_selectors
+                     (domyślnie RandomSelector)
+        engine:      ENGINE_LEGACY (podobieństwo napisów) lub ENGINE_TFIDF
+                     (kosinus wektorów TF-IDF n-gramów znakowych; search_mode
+                     i top_k dotyczą tylko silnika legacy)
+        model_file:  artefakt zbudowany przez build_model.py - wczytywany
+                     zamiast kompilacji, jeśli pasuje do plików źródłowych
+        previous:    poprzednia wersja modelu (rebuilt) - niezmienione
+                     intencje i słowniki encji są przejmowane bez kompilacji
+        """
+        if search_mode not in (SEARCH_EXHAUSTIVE, SEARCH_INDEXED):
+            raise ValueError(f"Nieznany tryb wyszukiwania: {search_mode}")
+        if engine not in (ENGINE_LEGACY, ENGINE_TFIDF):
+            raise ValueError(f"Nieznany silnik oceny wzorców: {engine}")
+        
+        self.intents_file = intents_file
+        self.model_file = model_file
         self.confidence_threshold = 0.25  # Próg pewności dla fallback
+        self.search_mode = search_mode
+        self.top_k = top_k
+        self.engine = engine
+        self.response_selector = response_selector or RandomSelector()
         
-        # Budowanie indeksu słów kluczowych dla szybszego wyszukiwania
-        self._build_pattern_index()
+        # Cache wyników: (wersja modelu, znormalizowana wiadomość) -> (IntentResult, encje, wzmianki)
+        self.result_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.model_version = previous.model_version if previous is not None else 0
         
-        print("✅ NLP Engine załadowany pomyślnie")
+        # Artefakt modelu albo kompilacja intents.json i entities.py
+        self._previous = previous
+        loaded = self._compile()
+        self._previous = None  # bez łańcucha odwołań do starych modeli
+        
+        print(f"✅ NLP Engine załadowany pomyślnie{' (z artefaktu modelu)' if loaded else ''}")
     
     def _load_intents(self, filepath):
         """Ładowanie intencji z pliku JSON"""
@@ -40,16 +372,227 @@ class ChatbotBrain:
             print(f"❌ Błąd parsowania JSON: {e}")
             return []
     
+    def _load_entities(self, entity_matcher=None):
+        """
+        Przypięcie słowników encji do instancji (nowy model z rebuilt() ma własne).
+        `entity_matcher` - gotowy automat z artefaktu modelu.
+        """
+        self.kw_restaurants = entities_module.KW_RESTAURANTS
+        self.kw_cuisine = entities_module.KW_CUISINE
+        self.common_words = entities_module.COMMON_WORDS
+        
+        previous = self._previous
+        if entity_matcher is None and previous is not None and (
+            previous.kw_restaurants == self.kw_restaurants and previous.kw_cuisine == self.kw_cuisine
+        ):
+            entity_matcher = previous.entity_matcher
+        
+        # Jeden automat dla wszystkich aliasów restauracji i kuchni
+        self.entity_matcher = entity_matcher or EntityMatcher({
+            'restaurant': self.kw_restaurants,
+            'cuisine': self.kw_cuisine
+        })
+    
+    def rebuilt(self):
+        """
+        Nowy model z aktualnych intents.json i entities.py, z tą samą
+        konfiguracją i pustym cache wyników. Ta instancja pozostaje bez
+        zmian - obsługiwane właśnie zapytania kończą się na starym modelu.
+        Skompilowane wzorce niezmienionych intencji są przejmowane.
+        
+        Model nie jest nigdy przebudowywany w miejscu: przeładowanie to
+        podmiana referencji na wynik rebuilt() (ModelReloader).
+        """
+        importlib.reload(entities_module)
+        return ChatbotBrain(
+            self.intents_file, self.search_mode, self.top_k,
+            cache_size=self.result_cache.maxsize, cache_ttl=self.result_cache.ttl,
+            response_selector=self.response_selector, engine=self.engine,
+            model_file=self.model_file, previous=self
+        )
+    
+    def _compile(self):
+        """
+        Zbudowanie modelu: z aktualnego artefaktu (jeśli podano model_file)
+        albo z plików źródłowych. Zwraca True, gdy użyto artefaktu.
+        """
+        if self.model_file and self._load_model(self.model_file):
+            return True
+        self.intents = self._load_intents(self.intents_file)
+        self._load_entities()
+        self._build_pattern_index()
+        self._build_response_table()
+        return False
+    
+    def _model_header(self):
+        """Nagłówek artefaktu - artefakt jest aktualny, gdy nagłówki są równe"""
+        return {
+            "format": MODEL_FORMAT_VERSION,
+            "engine": self.engine,
+            "fingerprint": model_fingerprint(self.intents_file, self.engine),
+        }
+    
+    def save_model(self, path):
+        """
+        Zapis skompilowanego modelu do artefaktu (nagłówek + stan MODEL_STATE).
+        Plik jest podmieniany atomowo - działające procesy nie widzą
+        niedokończonego zapisu.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump(self._model_header(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump({name: getattr(self, name) for name in MODEL_STATE}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    
+    def _load_model(self, path):
+        """
+        Wczytanie artefaktu modelu, jeśli jest aktualny (nagłówek zgodny
+        z plikami źródłowymi). Artefakt to pickle - wczytujemy tylko pliki
+        zbudowane lokalnie przez build_model.py.
+        """
+        try:
+            with open(path, 'rb') as f:
+                if pickle.load(f) != self._model_header():
+                    print(f"⚠️ Artefakt modelu {path} nie pasuje do plików źródłowych lub silnika - kompilacja od nowa")
+                    return False
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ Nie udało się wczytać artefaktu modelu {path}: {e}")
+            return False
+        
+        self._load_entities(state['entity_matcher'])
+        for name in MODEL_STATE:
+            setattr(self, name, state[name])
+        self._matcher_pool = _MatcherPool(self.compiled_patterns)
+        self.model_version += 1
+        return True
+    
+    def _build_response_table(self):
+        """Tablica tag -> odpowiedzi (pierwsza intencja z niepustą listą)"""
+        self.responses = {}
+        for intent in self.intents:
+            responses = intent.get('responses', [])
+            if responses and intent['tag'] not in self.responses:
+                self.responses[intent['tag']] = tuple(responses)
+    
     def _build_pattern_index(self):
-        """Budowanie indeksu wzorców dla optymalizacji wyszukiwania"""
+        """
+        Kompilacja modelu: indeks dokładnych dopasowań oraz lista
+        prekompilowanych wzorców (w kolejności z intents.json).
+        """
+        previous = self._previous
+        # Wzorce intencji bez zmian (ten sam tag, wzorce i słowa funkcyjne)
+        # są przejmowane z poprzedniego modelu zamiast kompilowane od nowa
+        reusable = {}
+        if previous is not None and previous.common_words == self.common_words:
+            reusable = previous._compiled_intents
+        
         self.pattern_index = {}
+        self.compiled_patterns = []
+        self._compiled_intents = {}
         for intent in self.intents:
             tag = intent['tag']
-            for pattern in intent.get('patterns', []):
-                normalized = self._normalize_text(pattern)
-                if normalized not in self.pattern_index:
-                    self.pattern_index[normalized] = []
-                self.pattern_index[normalized].append(tag)
+            key = (tag, tuple(intent.get('patterns', [])))
+            start = len(self.compiled_patterns)
+            compiled = reusable.get(key)
+            if compiled is None:
+                compiled = tuple(
+                    CompiledPattern(start + offset, tag, self._normalize_text(pattern), self.common_words)
+                    for offset, pattern in enumerate(key[1])
+                )
+            else:
+                compiled = tuple(pattern.renumbered(start + offset) for offset, pattern in enumerate(compiled))
+            self._compiled_intents.setdefault(key, compiled)
+            for pattern in compiled:
+                self.pattern_index.setdefault(pattern.text, []).append(tag)
+            self.compiled_patterns.extend(compiled)
+        
+        known_counts = previous._word_char_counts if reusable else {}
+        self._word_char_counts = {
+            word: known_counts.get(word) or Counter(word)
+            for pattern in self.compiled_patterns
+            for word in pattern.significant
+        }
+        self._matcher_pool = _MatcherPool(self.compiled_patterns)
+        self._build_inverted_index()
+        self.tfidf_index = TfidfIndex(
+            self.compiled_patterns, previous.tfidf_index if previous is not None else None
+        ) if self.engine == ENGINE_TFIDF else None
+        
+        # Nowa wersja modelu - wyniki policzone starym modelem nie są już trafiane
+        self.model_version += 1
+    
+    def _build_inverted_index(self):
+        """
+        Indeks odwrócony: słowo znaczące / n-gram znakowy -> ID wzorców.
+        Każdy klucz ma wagę IDF, więc rzadkie słowa liczą się bardziej.
+        Wzorce bez słów znaczących (np. "Hej", "Co to?") nie mają
+        kluczy w indeksie - są zawsze dokładane do kandydatów.
+        """
+        token_postings = {}
+        ngram_postings = {}
+        self.unindexed_pattern_ids = []
+        
+        for pattern in self.compiled_patterns:
+            if not pattern.significant:
+                self.unindexed_pattern_ids.append(pattern.pattern_id)
+                continue
+            grams = set()
+            for word in pattern.significant:
+                token_postings.setdefault(word, []).append(pattern.pattern_id)
+                grams |= _char_ngrams(word)
+            for gram in grams:
+                ngram_postings.setdefault(gram, []).append(pattern.pattern_id)
+        
+        total = len(self.compiled_patterns) or 1
+        self.token_index = {
+            word: (tuple(ids), TOKEN_WEIGHT * math.log(1 + total / len(ids)))
+            for word, ids in token_postings.items()
+        }
+        self.ngram_index = {
+            gram: (tuple(ids), math.log(1 + total / len(ids)))
+            for gram, ids in ngram_postings.items()
+        }
+    
+    def _candidate_patterns(self, user_significant):
+        """
+        Wybór wzorców do oceny w etapie 2.
+        
+        W trybie SEARCH_INDEXED zwraca top_k wzorców z największą sumą wag
+        wspólnych słów i n-gramów (plus wzorce nieindeksowane), w kolejności
+        z intents.json. Gdy wiadomość nie ma żadnego wspólnego klucza
+        z indeksem - wraca do pełnego skanu.
+        """
+        if self.search_mode == SEARCH_EXHAUSTIVE:
+            return self.compiled_patterns
+        
+        evidence = {}
+        for word in user_significant:
+            postings = self.token_index.get(word)
+            if postings:
+                ids, weight = postings
+                for pattern_id in ids:
+                    evidence[pattern_id] = evidence.get(pattern_id, 0) + weight
+            for gram in _char_ngrams(word):
+                postings = self.ngram_index.get(gram)
+                if postings:
+                    ids, weight = postings
+                    for pattern_id in ids:
+                        evidence[pattern_id] = evidence.get(pattern_id, 0) + weight
+        
+        if not evidence:
+            return self.compiled_patterns
+        
+        if len(evidence) > self.top_k:
+            selected = heapq.nlargest(self.top_k, evidence, key=evidence.get)
+        else:
+            selected = list(evidence)
+        selected.extend(self.unindexed_pattern_ids)
+        selected.sort()
+        return [self.compiled_patterns[pattern_id] for pattern_id in selected]
     
     def _normalize_text(self, text):
         """Normalizacja tekstu - lowercase, usunięcie znaków specjalnych"""
@@ -58,28 +601,50 @@ class ChatbotBrain:
         # Zamiana na małe litery
         text = text.lower().strip()
         # Usunięcie znaków interpunkcyjnych (zachowanie polskich znaków)
-        text = re.sub(r'[^\w\sąćęłńóśźżĄĆĘŁŃÓŚŹŻ]', '', text)
+        text = _PUNCTUATION_RE.sub('', text)
         # Usunięcie wielokrotnych spacji
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         return text
     
     def _calculate_similarity(self, text1, text2):
         """Obliczanie podobieństwa między dwoma tekstami"""
         return SequenceMatcher(None, text1, text2).ratio()
     
-    def _word_overlap_score(self, user_words, pattern_words):
-        """Obliczanie wyniku nakładania się słów"""
-        if not pattern_words:
-            return 0
-        
-        # Filtrowanie słów funkcyjnych
-        user_significant = [w for w in user_words if w not in COMMON_WORDS and len(w) > 2]
-        pattern_significant = [w for w in pattern_words if w not in COMMON_WORDS and len(w) > 2]
+    def _words_similar(self, u_word, p_word, user_counts, memo):
+        """
+        Czy _calculate_similarity(u_word, p_word) > WORD_SIMILARITY_CUTOFF.
         
+        Najpierw tanie górne ograniczenia (długości, potem wspólne znaki
+        jak w quick_ratio); pełne ratio() liczymy tylko gdy próg jest
+        w ogóle osiągalny. Wynik dla pary słów jest zapamiętywany na czas
+        jednej wiadomości.
+        """
+        key = (u_word, p_word)
+        similar = memo.get(key)
+        if similar is None:
+            total = len(u_word) + len(p_word)
+            if 2.0 * min(len(u_word), len(p_word)) / total <= WORD_SIMILARITY_CUTOFF:
+                similar = False
+            elif (2.0 * _common_chars(user_counts[u_word], self._word_char_counts[p_word]) / total
+                    <= WORD_SIMILARITY_CUTOFF):
+                similar = False
+            else:
+                similar = self._calculate_similarity(u_word, p_word) > WORD_SIMILARITY_CUTOFF
+            memo[key] = similar
+        return similar
+    
+    def _word_overlap_score(self, user_significant, pattern, user_counts, memo):
+        """
+        Obliczanie wyniku nakładania się słów.
+        `user_significant` to już przefiltrowane słowa wiadomości,
+        `pattern` to CompiledPattern, `user_counts` - liczniki znaków
+        słów wiadomości, `memo` - pamięć podobieństw par słów.
+        """
+        pattern_significant = pattern.significant
         if not pattern_significant:
             return 0
         
-        matches = sum(1 for word in user_significant if word in pattern_significant)
+        matches = sum(1 for word in user_significant if word in pattern.significant_set)
         
         # Sprawdzanie częściowych dopasowań
         for u_word in user_significant:
@@ -87,46 +652,41 @@ class ChatbotBrain:
                 if u_word != p_word:
                     if u_word in p_word or p_word in u_word:
                         matches += 0.5
-                    elif self._calculate_similarity(u_word, p_word) > 0.8:
+                    elif self._words_similar(u_word, p_word, user_counts, memo):
                         matches += 0.7
         
-        return matches / len(pattern_significant)
+        return matches / pattern.significant_count
     
-    def predict_intent(self, user_message):
+    def _fuzzy_match(self, normalized_message, user_significant):
         """
-        Główna metoda predykcji intencji.
+        ETAP 2: ocena wzorców (podobieństwo, nakładanie słów, zawieranie).
+        Zwraca (najlepsza_intencja, wynik, druga_intencja, wynik_drugiej),
+        gdzie druga intencja to najlepsza z pozostałych intencji (lub None).
         
-        Algorytm:
-        1. Dokładne dopasowanie do wzorca
-        2. Dopasowanie oparte na podobieństwie
-        3. Dopasowanie słów kluczowych
-        4. Fallback jeśli poniżej progu
+        Pełne SequenceMatcher.ratio() jest liczone tylko wtedy, gdy jego górne
+        ograniczenie (długości, a potem wspólne znaki jak w quick_ratio)
+        może zmienić wynik: przekracza pozostałe składowe wyniku wzorca
+        i dotychczasowy wynik jego intencji, a przy tym nie jest niższe
+        od wyniku drugiej intencji. W przeciwnym razie rezultat jest
+        identyczny z pełnym obliczeniem.
         """
-        if not user_message or not user_message.strip():
-            return "fallback"
-        
-        normalized_message = self._normalize_text(user_message)
-        user_words = set(normalized_message.split())
-        
-        # === ETAP 1: Dokładne dopasowanie ===
-        if normalized_message in self.pattern_index:
-            return self.pattern_index[normalized_message][0]
-        
-        # === ETAP 2: Dopasowanie z obliczeniem wyniku ===
         best_intent = "fallback"
         best_score = 0
+        runner_up = None
+        runner_up_score = 0
+        intent_scores = {}
         
-        for intent in self.intents:
-            tag = intent['tag']
-            patterns = intent.get('patterns', [])
-            
-            for pattern in patterns:
-                normalized_pattern = self._normalize_text(pattern)
-                pattern_words = set(normalized_pattern.split())
+        message_length = len(normalized_message)
+        message_counts = Counter(normalized_message)
+        user_counts = {word: Counter(word) for word in user_significant}
+        memo = {}
+        matchers = self._matcher_pool.acquire()
+        try:
+            for pattern in self._candidate_patterns(user_significant):
+                normalized_pattern = pattern.text
+                tag = pattern.tag
                 
-                # Obliczanie różnych metryk
-                similarity = self._calculate_similarity(normalized_message, normalized_pattern)
-                word_overlap = self._word_overlap_score(user_words, pattern_words)
+                word_overlap = self._word_overlap_score(user_significant, pattern, user_counts, memo)
                 
                 # Sprawdzanie czy wzorzec zawiera się w wiadomości lub odwrotnie
                 containment_score = 0
@@ -135,162 +695,465 @@ class ChatbotBrain:
                 elif normalized_message in normalized_pattern:
                     containment_score = 0.7
                 
-                # Łączny wynik (ważona średnia)
-                combined_score = max(
-                    similarity,
-                    word_overlap * 0.8,
-                    containment_score
-                )
+                other_score = max(word_overlap * 0.8, containment_score)
+                intent_score = intent_scores.get(tag, 0)
+                threshold = max(other_score, intent_score)
                 
-                if combined_score > best_score:
+                # Górne ograniczenia ratio() - ten sam wzór co w difflib
+                total = message_length + pattern.length
+                if total:
+                    bound = 2.0 * min(message_length, pattern.length) / total
+                    if bound > threshold and bound >= runner_up_score:
+                        bound = 2.0 * _common_chars(message_counts, pattern.char_counts) / total
+                else:
+                    bound = 1.0
+                
+                if bound <= threshold or bound < runner_up_score:
+                    combined_score = other_score
+                else:
+                    similarity = self._matcher_pool.ratio(matchers, pattern, normalized_message)
+                    # Łączny wynik (ważona średnia)
+                    combined_score = max(similarity, word_overlap * 0.8, containment_score)
+                
+                if combined_score <= intent_score:
+                    continue
+                intent_scores[tag] = combined_score
+                
+                if tag == best_intent:
                     best_score = combined_score
-                    best_intent = tag
+                elif combined_score > best_score:
+                    if best_score > 0:
+                        runner_up, runner_up_score = best_intent, best_score
+                    best_intent, best_score = tag, combined_score
+                elif tag == runner_up or combined_score > runner_up_score:
+                    runner_up, runner_up_score = tag, combined_score
+        finally:
+            self._matcher_pool.release(matchers)
         
+        return best_intent, best_score, runner_up, runner_up_score
+    
+    def _heuristic_intent(self, normalized_message, best_score, mentions):
+        """
+        ETAPY 3-4: heurystyki encji i fraz.
+        `mentions` to wszystkie wystąpienia aliasów (także wewnątrz słów)
+        z jednego przejścia automatu encji.
+        Zwraca (intencja, etap) lub None, gdy żadna heurystyka nie zadziałała.
+        """
         # === ETAP 3: Sprawdzanie słów kluczowych encji ===
         # Jeśli wynik jest niski, sprawdzamy obecność encji
         if best_score < 0.5:
+            mentioned_types = {m.entity_type for m in mentions}
+            
             # Sprawdzenie czy jest nazwa restauracji -> restaurant_info lub check_seats
-            for keyword in KW_RESTAURANTS.keys():
-                if keyword in normalized_message:
-                    # Sprawdzenie kontekstu
-                    if any(w in normalized_message for w in ['ile', 'wolne', 'miejsca', 'stoliki', 'dostępność']):
-                        return "check_seats"
-                    elif any(w in normalized_message for w in ['adres', 'telefon', 'numer', 'kontakt', 'gdzie jest']):
-                        return "check_contact"
-                    elif any(w in normalized_message for w in ['godziny', 'otwarte', 'czynne', 'kiedy']):
-                        return "check_hours"
-                    else:
-                        return "restaurant_info"
+            if 'restaurant' in mentioned_types:
+                # Sprawdzenie kontekstu
+                if any(w in normalized_message for w in ['ile', 'wolne', 'miejsca', 'stoliki', 'dostępność']):
+                    return "check_seats", STAGE_ENTITY
+                elif any(w in normalized_message for w in ['adres', 'telefon', 'numer', 'kontakt', 'gdzie jest']):
+                    return "check_contact", STAGE_ENTITY
+                elif any(w in normalized_message for w in ['godziny', 'otwarte', 'czynne', 'kiedy']):
+                    return "check_hours", STAGE_ENTITY
+                else:
+                    return "restaurant_info", STAGE_ENTITY
             
             # Sprawdzenie czy jest nazwa kuchni -> search_cuisine
-            for keyword in KW_CUISINE.keys():
-                if keyword in normalized_message:
-                    return "search_cuisine"
+            if 'cuisine' in mentioned_types:
+                return "search_cuisine", STAGE_ENTITY
         
         # === ETAP 4: Dodatkowe heurystyki ===
         # Sprawdzenie specyficznych fraz
         if any(phrase in normalized_message for phrase in ['ile miejsc', 'ile stolików', 'wolne stoliki', 'czy są miejsca']):
-            return "check_seats"
+            return "check_seats", STAGE_PHRASE
         
         if any(phrase in normalized_message for phrase in ['jaki adres', 'gdzie jest', 'telefon do', 'kontakt do']):
-            return "check_contact"
+            return "check_contact", STAGE_PHRASE
         
         if any(phrase in normalized_message for phrase in ['godziny otwarcia', 'o której', 'do której', 'kiedy otwarte']):
-            return "check_hours"
+            return "check_hours", STAGE_PHRASE
         
         if any(phrase in normalized_message for phrase in ['co polecasz', 'którą polecasz', 'co wybrać', 'nie wiem co']):
-            return "ask_recommendation"
+            return "ask_recommendation", STAGE_PHRASE
         
         if any(phrase in normalized_message for phrase in ['jakie restauracje', 'lista restauracji', 'pokaż lokale', 'jakie lokale']):
-            return "list_restaurants"
+            return "list_restaurants", STAGE_PHRASE
         
         if any(phrase in normalized_message for phrase in ['jakie kuchnie', 'rodzaje kuchni', 'typy jedzenia', 'co serwujecie']):
-            return "list_cuisines"
+            return "list_cuisines", STAGE_PHRASE
+        
+        return None
+    
+    def score_intent(self, user_message):
+        """
+        Jedno przejście oceny wiadomości - wspólne dla predict_intent
+        i get_intent_confidence.
+        
+        Algorytm:
+        1. Dokładne dopasowanie do wzorca
+        2. Dopasowanie oparte na podobieństwie
+        3. Dopasowanie słów kluczowych encji
+        4. Heurystyki fraz
+        5. Fallback jeśli poniżej progu
+        
+        Zwraca IntentResult. Przy dokładnym dopasowaniu ocena wzorców
+        nie jest uruchamiana (score = 1.0, brak runner_up).
+        Wynik pochodzi z cache, jeśli ta sama znormalizowana wiadomość
+        była już oceniana.
+        """
+        if not user_message or not user_message.strip():
+            return IntentResult("fallback", STAGE_FALLBACK, "fallback", 0.0, None, 0.0)
+        
+        return self._analyze_normalized(self._normalize_text(user_message))[0]
+    
+    def analyze(self, user_message):
+        """
+        Intencja i encje w jednym wywołaniu: (IntentResult, słownik encji).
+        Wiadomość jest normalizowana i oceniana raz (jedno odczytanie cache).
+        """
+        if not user_message or not user_message.strip():
+            return (IntentResult("fallback", STAGE_FALLBACK, "fallback", 0.0, None, 0.0),
+                    self._entities_view(None))
+        
+        intent_result, entities, _ = self._analyze_normalized(self._normalize_text(user_message))
+        return intent_result, self._entities_view(entities)
+    
+    def _analyze_normalized(self, normalized_message):
+        """
+        Wynik (IntentResult, encje, wzmianki) dla znormalizowanej wiadomości -
+        z cache lub obliczony i zapisany w cache.
+        """
+        key = (self.model_version, normalized_message)
+        cached = self.result_cache.get(key)
+        if cached is None:
+            cached = self._compute_normalized(normalized_message)
+            self.result_cache.put(key, cached)
+        return cached
+    
+    def _compute_normalized(self, normalized_message):
+        """Wynik (IntentResult, encje, wzmianki) obliczony bez udziału cache"""
+        # Jedno przejście automatu encji - wspólne dla heurystyk i ekstrakcji
+        mentions = self.entity_matcher.find_all(normalized_message, whole_words=False)
+        entity_mentions = self._select_mentions(normalized_message, mentions)
+        return (
+            self._score_normalized(normalized_message, mentions),
+            self._extract_normalized(entity_mentions),
+            entity_mentions
+        )
+    
+    def _score_normalized(self, normalized_message, mentions):
+        """Ocena intencji dla niepustej wiadomości po normalizacji (bez cache)"""
+        # === ETAP 1: Dokładne dopasowanie ===
+        if normalized_message in self.pattern_index:
+            tag = self.pattern_index[normalized_message][0]
+            return IntentResult(tag, STAGE_EXACT, tag, 1.0, None, 0.0)
+        
+        # === ETAP 2: Dopasowanie z obliczeniem wyniku ===
+        if self.tfidf_index is not None:
+            best_intent, best_score, runner_up, runner_up_score = self.tfidf_index.match(normalized_message)
+        else:
+            user_significant = _significant_words(set(normalized_message.split()), self.common_words)
+            best_intent, best_score, runner_up, runner_up_score = self._fuzzy_match(
+                normalized_message, user_significant
+            )
+        best_score = float(best_score)
+        runner_up_score = float(runner_up_score)
+        
+        # === ETAPY 3-4: Heurystyki encji i fraz ===
+        heuristic = self._heuristic_intent(normalized_message, best_score, mentions)
+        if heuristic:
+            intent, stage = heuristic
+            return IntentResult(intent, stage, best_intent, best_score, runner_up, runner_up_score)
         
         # === ETAP 5: Fallback jeśli poniżej progu ===
         if best_score < self.confidence_threshold:
-            return "fallback"
+            return IntentResult("fallback", STAGE_FALLBACK, best_intent, best_score, runner_up, runner_up_score)
         
-        return best_intent
+        return IntentResult(best_intent, STAGE_FUZZY, best_intent, best_score, runner_up, runner_up_score)
+    
+    def predict_intent(self, user_message):
+        """Główna metoda predykcji intencji (widok na score_intent)"""
+        return self.score_intent(user_message).intent
+    
+    def score_intents(self, messages, workers=None, pool=None):
+        """
+        Ocena wielu wiadomości naraz - lista IntentResult w kolejności
+        `messages` (te same wyniki co score_intent dla każdej z nich).
+        
+        Wiadomości identyczne po normalizacji są oceniane raz, a wyniki
+        obecne w cache nie są liczone ponownie. Nowe wyniki nie trafiają do
+        cache (duża paczka wyparłaby z niego bieżący ruch).
+        
+        workers: liczba procesów do równoległej oceny (tymczasowa NLPPool)
+        pool:    istniejąca NLPPool (np. z app.py) zamiast tymczasowej
+        """
+        results = [None] * len(messages)
+        positions = {}  # znormalizowana wiadomość -> indeksy w `messages`
+        for index, message in enumerate(messages):
+            if not message or not message.strip():
+                results[index] = IntentResult("fallback", STAGE_FALLBACK, "fallback", 0.0, None, 0.0)
+            else:
+                positions.setdefault(self._normalize_text(message), []).append(index)
+        
+        missing = []
+        for normalized, indexes in positions.items():
+            cached = self.result_cache.get((self.model_version, normalized))
+            if cached is None:
+                missing.append(normalized)
+            else:
+                for index in indexes:
+                    results[index] = cached[0]
+        
+        for normalized, result in zip(missing, self._score_many(missing, workers, pool)):
+            for index in positions[normalized]:
+                results[index] = result
+        return results
+    
+    def predict_intents(self, messages, workers=None, pool=None):
+        """Predykcja intencji dla wielu wiadomości (widok na score_intents)"""
+        return [result.intent for result in self.score_intents(messages, workers, pool)]
+    
+    def _score_many(self, normalized_messages, workers=None, pool=None):
+        """Ocena listy znormalizowanych wiadomości - lokalnie lub w puli procesów"""
+        if pool is None and workers and workers > 1 and len(normalized_messages) >= workers:
+            from nlp_pool import NLPPool  # import lokalny - nlp_pool importuje ten moduł
+            temporary = NLPPool(workers, intents_file=self.intents_file, search_mode=self.search_mode,
+                                top_k=self.top_k, cache_size=0, engine=self.engine,
+                                model_file=self.model_file)
+            try:
+                return self._score_many(normalized_messages, pool=temporary)
+            finally:
+                temporary.shutdown()
+        
+        if pool is not None:
+            return pool.score_normalized_many(normalized_messages)
+        return [self._compute_normalized(normalized)[0] for normalized in normalized_messages]
     
     def extract_entities(self, user_message):
         """
-        Ekstrakcja encji z wiadomości użytkownika.
+        Ekstrakcja encji z wiadomości użytkownika (widok zgodności
+        na extract_entity_mentions).
         
         Zwraca słownik z kluczami:
-        - restaurant: nazwa restauracji
-        - cuisine: typ kuchni
+        - restaurant: nazwa restauracji (najdłuższy dopasowany alias)
+        - cuisine: typ kuchni (najdłuższy dopasowany alias)
+        - restaurants: wszystkie wspomniane restauracje (kolejność w tekście)
+        - cuisines: wszystkie wspomniane kuchnie (kolejność w tekście)
         """
+        if not user_message:
+            return self._entities_view(None)
+        return self._entities_view(self._analyze_normalized(self._normalize_text(user_message))[1])
+    
+    @staticmethod
+    def _entities_view(cached):
+        """Słownik encji dla wywołującego - kopia wyniku z cache (None - brak encji)"""
         entities = {
             'restaurant': None,
-            'cuisine': None
+            'cuisine': None,
+            'restaurants': [],
+            'cuisines': []
         }
         
-        if not user_message:
+        if cached is None:
             return entities
         
-        normalized = self._normalize_text(user_message)
+        # Kopia - wynik z cache nie może być modyfikowany przez wywołującego
+        entities.update(cached)
+        entities['restaurants'] = list(cached['restaurants'])
+        entities['cuisines'] = list(cached['cuisines'])
+        return entities
+    
+    def extract_entity_mentions(self, user_message):
+        """
+        Wszystkie wzmianki o encjach w wiadomości, w kolejności wystąpienia.
         
-        # Ekstrakcja restauracji (szukamy od najdłuższych fraz)
-        sorted_restaurants = sorted(KW_RESTAURANTS.keys(), key=len, reverse=True)
-        for keyword in sorted_restaurants:
-            if keyword in normalized:
-                entities['restaurant'] = KW_RESTAURANTS[keyword]
-                break
+        Każda wzmianka (EntityMatch) zawiera typ ('restaurant' / 'cuisine'),
+        nazwę kanoniczną, dopasowany alias oraz zakres [start, end) w tekście
+        po normalizacji (_normalize_text). Wzmianki tego samego typu się nie
+        nakładają - wygrywa alias zaczynający się najwcześniej, a przy tym
+        samym początku najdłuższy.
+        """
+        if not user_message:
+            return []
+        return list(self._analyze_normalized(self._normalize_text(user_message))[2])
+    
+    def _select_mentions(self, normalized, mentions):
+        """Wybór wzmianek: tylko całe słowa, bez nakładania się w obrębie typu"""
+        selected = []
+        last_end = {}
+        for match in mentions:
+            if not is_word_bounded(normalized, match.start, match.end):
+                continue
+            if match.start < last_end.get(match.entity_type, 0):
+                continue
+            selected.append(match)
+            last_end[match.entity_type] = match.end
+        return tuple(selected)
+    
+    def _extract_normalized(self, mentions):
+        """
+        Słownik encji z wybranych wzmianek (bez cache). Dla każdego typu
+        wygrywa najdłuższy alias (remis - wcześniejszy w słowniku).
+        """
+        entities = {
+            'restaurant': None,
+            'cuisine': None,
+            'restaurants': [],
+            'cuisines': []
+        }
         
-        # Ekstrakcja kuchni (szukamy od najdłuższych fraz)
-        sorted_cuisines = sorted(KW_CUISINE.keys(), key=len, reverse=True)
-        for keyword in sorted_cuisines:
-            if keyword in normalized:
-                entities['cuisine'] = KW_CUISINE[keyword]
-                break
+        for entity_type, list_key in (('restaurant', 'restaurants'), ('cuisine', 'cuisines')):
+            match = EntityMatcher.best_match(mentions, entity_type)
+            if match:
+                entities[entity_type] = match.canonical
+            for mention in mentions:
+                if mention.entity_type == entity_type and mention.canonical not in entities[list_key]:
+                    entities[list_key].append(mention.canonical)
         
         return entities
     
-    def get_response(self, intent_tag):
+    def get_response(self, intent_tag, session_id=None):
         """
-        Pobieranie losowej odpowiedzi dla danej intencji.
+        Pobieranie odpowiedzi dla danej intencji.
+        Wybór należy do response_selector (losowo, po kolei lub bez
+        powtórzeń w ramach sesji `session_id`).
         """
-        for intent in self.intents:
-            if intent['tag'] == intent_tag:
-                responses = intent.get('responses', [])
-                if responses:
-                    return random.choice(responses)
+        responses = self.responses.get(intent_tag)
+        if responses:
+            return self.response_selector.choose(intent_tag, responses, session_id)
         
         # Domyślna odpowiedź fallback
         return "Przepraszam, nie zrozumiałem. Spróbuj zapytać inaczej."
     
+    def cache_stats(self):
+        """Liczniki cache wyników (trafienia, chybienia, usunięcia)"""
+        stats = self.result_cache.stats()
+        stats["model_version"] = self.model_version
+        return stats
+    
     def get_intent_confidence(self, user_message):
         """
-        Zwraca intencję wraz z poziomem pewności.
+        Zwraca intencję wraz z poziomem pewności (najlepsze dopasowanie
+        z oceny wzorców - widok na score_intent).
         Przydatne do debugowania i logowania.
         """
-        if not user_message or not user_message.strip():
-            return "fallback", 0.0
-        
-        normalized_message = self._normalize_text(user_message)
-        user_words = set(normalized_message.split())
-        
-        best_intent = "fallback"
-        best_score = 0.0
-        
-        for intent in self.intents:
-            tag = intent['tag']
-            patterns = intent.get('patterns', [])
-            
-            for pattern in patterns:
-                normalized_pattern = self._normalize_text(pattern)
-                pattern_words = set(normalized_pattern.split())
-                
-                similarity = self._calculate_similarity(normalized_message, normalized_pattern)
-                word_overlap = self._word_overlap_score(user_words, pattern_words)
-                
-                containment_score = 0
-                if normalized_pattern in normalized_message:
-                    containment_score = 0.9
-                elif normalized_message in normalized_pattern:
-                    containment_score = 0.7
-                
-                combined_score = max(similarity, word_overlap * 0.8, containment_score)
-                
-                if combined_score > best_score:
-                    best_score = combined_score
-                    best_intent = tag
-        
-        return best_intent, best_score
-
+        result = self.score_intent(user_message)
+        return result.best_match, result.score
 
 # =============================================================================
 # TESTY JEDNOSTKOWE (uruchamiane przy bezpośrednim wykonaniu pliku)
 # =============================================================================
 
+def _reference_confidence(brain, user_message):
+    """
+    Referencyjny, nieoptymalizowany etap 2 (pełne ratio() dla każdego wzorca
+    i każdej pary słów) - wzorzec do sprawdzania identyczności wyników.
+    Zwraca (intencja, wynik, druga_intencja, wynik_drugiej).
+    """
+    if not user_message or not user_message.strip():
+        return "fallback", 0.0, None, 0.0
+    
+    normalized_message = brain._normalize_text(user_message)
+    user_words = set(normalized_message.split())
+    user_significant = [w for w in user_words if w not in COMMON_WORDS and len(w) > 2]
+    
+    best_intent = "fallback"
+    best_score = 0.0
+    intent_scores = {}  # tag -> (wynik, kolejność osiągnięcia)
+    step = 0
+    
+    for intent in brain.intents:
+        for pattern in intent.get('patterns', []):
+            normalized_pattern = brain._normalize_text(pattern)
+            pattern_words = set(normalized_pattern.split())
+            pattern_significant = [w for w in pattern_words if w not in COMMON_WORDS and len(w) > 2]
+            
+            word_overlap = 0
+            if pattern_significant:
+                matches = sum(1 for word in user_significant if word in pattern_significant)
+                for u_word in user_significant:
+                    for p_word in pattern_significant:
+                        if u_word != p_word:
+                            if u_word in p_word or p_word in u_word:
+                                matches += 0.5
+                            elif SequenceMatcher(None, u_word, p_word).ratio() > 0.8:
+                                matches += 0.7
+                word_overlap = matches / len(pattern_significant)
+            
+            similarity = SequenceMatcher(None, normalized_message, normalized_pattern).ratio()
+            
+            containment_score = 0
+            if normalized_pattern in normalized_message:
+                containment_score = 0.9
+            elif normalized_message in normalized_pattern:
+                containment_score = 0.7
+            
+            combined_score = max(similarity, word_overlap * 0.8, containment_score)
+            
+            if combined_score > best_score:
+                best_score = combined_score
+                best_intent = intent['tag']
+            
+            step += 1
+            if combined_score > intent_scores.get(intent['tag'], (0, 0))[0]:
+                intent_scores[intent['tag']] = (combined_score, step)
+    
+    others = [(-score, order, tag) for tag, (score, order) in intent_scores.items() if tag != best_intent]
+    if others:
+        score, _, runner_up = min(others)
+        return best_intent, best_score, runner_up, -score
+    return best_intent, best_score, None, 0.0
+
+
+def _check_equivalence(brain):
+    """
+    Porównanie get_intent_confidence (oraz runner_up ze score_intent)
+    z implementacją referencyjną na całym korpusie intents.json: każdy
+    wzorzec, wzorzec bez ostatniego słowa oraz wzorzec z dopisanym
+    pierwszym słowem kolejnego wzorca.
+    """
+    patterns = [p for intent in brain.intents for p in intent.get('patterns', [])]
+    messages = []
+    for i, pattern in enumerate(patterns):
+        words = pattern.split()
+        messages.append(pattern)
+        if len(words) > 1:
+            messages.append(" ".join(words[:-1]))
+        next_words = patterns[(i + 1) % len(patterns)].split()
+        if next_words:
+            messages.append(f"{pattern} {next_words[0]}")
+    
+    mismatches = 0
+    for message in messages:
+        reference = _reference_confidence(brain, message)
+        result = brain.score_intent(message)
+        expected = reference[:2]
+        actual = brain.get_intent_confidence(message)
+        if result.stage != STAGE_EXACT:
+            # Przy dokładnym dopasowaniu ocena wzorców nie jest uruchamiana
+            expected = reference
+            actual += (result.runner_up, result.runner_up_score)
+        if actual != expected:
+            mismatches += 1
+            print(f"❌ '{message}': oczekiwano {expected}, otrzymano {actual}")
+    
+    status = "✅" if mismatches == 0 else "❌"
+    print(f"{status} Identyczność wyników: {len(messages) - mismatches}/{len(messages)} wiadomości")
+    return mismatches == 0
+
+
 if __name__ == "__main__":
+    import sys
+    
     print("=" * 60)
     print("TESTY NLP ENGINE")
     print("=" * 60)
     
     brain = ChatbotBrain()
     
+    # Pełny test identyczności z implementacją referencyjną:
+    # python nlp_engine.py --equivalence
+    if "--equivalence" in sys.argv:
+        sys.exit(0 if _check_equivalence(brain) else 1)
+    
     test_cases = [
         # Powitania
         ("Cześć", "greet"),
@@ -334,8 +1197,8 @@ if __name__ == "__main__":
     failed = 0
     
     for message, expected_intent in test_cases:
-        predicted = brain.predict_intent(message)
-        intent_with_conf = brain.get_intent_confidence(message)
+        result = brain.score_intent(message)
+        predicted = result.intent
         
         status = "✅" if predicted == expected_intent else "❌"
         if predicted == expected_intent:
@@ -344,10 +1207,47 @@ if __name__ == "__main__":
             failed += 1
         
         print(f"{status} '{message}'")
-        print(f"   Oczekiwano: {expected_intent} | Otrzymano: {predicted} (pewność: {intent_with_conf[1]:.2f})")
+        print(f"   Oczekiwano: {expected_intent} | Otrzymano: {predicted} (pewność: {result.score:.2f}, etap: {result.stage})")
         print()
     
     print("=" * 60)
     print(f"WYNIKI: {passed}/{len(test_cases)} testów przeszło pomyślnie")
     print(f"Współczynnik sukcesu: {(passed/len(test_cases))*100:.1f}%")
-    print("=" * 60)
\ No newline at end of file
+    print("=" * 60)
+    
+    # Zgodność trybu z indeksem odwróconym z pełnym skanem
+    indexed_brain = ChatbotBrain(search_mode=SEARCH_INDEXED)
+    agreed = sum(
+        1 for message, _ in test_cases
+        if indexed_brain.predict_intent(message) == brain.predict_intent(message)
+    )
+    print(f"Tryb indexed: {agreed}/{len(test_cases)} zgodnych z pełnym skanem")
+    
+    # Ocena paczkowa (bez cache) - wyniki identyczne jak pojedynczo
+    batch_brain = ChatbotBrain(cache_size=0)
+    messages = [message for message, _ in test_cases] * 2
+    batch_results = batch_brain.score_intents(messages)
+    agreed = sum(1 for message, result in zip(messages, batch_results) if result == brain.score_intent(message))
+    print(f"score_intents: {agreed}/{len(messages)} zgodnych z score_intent")
+    
+    # analyze - jedna ocena (jedno odczytanie cache) na wiadomość
+    analyze_brain = ChatbotBrain()
+    agreed = sum(
+        1 for message, _ in test_cases
+        if analyze_brain.analyze(message) == (brain.score_intent(message), brain.extract_entities(message))
+    )
+    lookups = analyze_brain.result_cache.hits + analyze_brain.result_cache.misses
+    print(f"analyze: {agreed}/{len(test_cases)} zgodnych, {lookups} odczytów cache na {len(test_cases)} wiadomości")
+    
+    # Silnik TF-IDF - trafność na tych samych przypadkach w porównaniu z legacy
+    tfidf_brain = ChatbotBrain(engine=ENGINE_TFIDF)
+    tfidf_passed = 0
+    agreed = 0
+    for message, expected_intent in test_cases:
+        result = tfidf_brain.score_intent(message)
+        tfidf_passed += result.intent == expected_intent
+        agreed += result.intent == brain.predict_intent(message)
+        if result.intent != expected_intent:
+            print(f"   tfidf ❌ '{message}': {result.intent} (pewność: {result.score:.2f}, etap: {result.stage})")
+    print(f"Silnik tfidf: {tfidf_passed}/{len(test_cases)} poprawnych "
+          f"(legacy: {passed}/{len(test_cases)}), {agreed}/{len(test_cases)} zgodnych z legacy")
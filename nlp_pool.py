@@ -0,0 +1,197 @@
+# =============================================================================
+# NLP_POOL.PY - Ocena intencji i encji w puli procesów dla Hotable
+# Każdy proces roboczy ładuje własny ChatbotBrain raz, przy starcie puli,
+# dzięki czemu ocena wiadomości (czysty Python, CPU) skaluje się z liczbą rdzeni
+# =============================================================================
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence
+
+from nlp_engine import ChatbotBrain
+
+# Model w procesie roboczym (ustawiany przez _init_worker)
+_worker_brain = None
+
+# Procesy robocze startują przez spawn, nie przez fork: fork z procesu
+# z wątkami (serwer, pula połączeń, kanał zmian) może skopiować zablokowane
+# blokady. Nie forkserver - jego proces należy do procesu, który go uruchomił,
+# i worker gunicorn (fork procesu nadrzędnego) nie mógłby z niego korzystać.
+START_METHOD = "spawn"
+
+
+def _init_worker(brain_options):
+    """Inicjalizacja procesu roboczego - jednorazowe załadowanie modelu"""
+    global _worker_brain
+    _worker_brain = ChatbotBrain(**brain_options)
+
+
+def _warm_up(_):
+    """Zadanie rozgrzewające - wymusza start procesu i załadowanie modelu"""
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _analyze_batch(messages):
+    """Analiza paczki wiadomości w procesie roboczym"""
+    return [_worker_brain.analyze(message) for message in messages]
+
+
+def _score_normalized_batch(normalized_messages):
+    """Ocena intencji paczki wiadomości już znormalizowanych (bez cache)"""
+    return [_worker_brain._compute_normalized(normalized)[0] for normalized in normalized_messages]
+
+
+class NLPPool:
+    """
+    Pula procesów wykonujących ChatbotBrain.analyze (intencja + encje).
+
+    - workers: liczba procesów (domyślnie liczba rdzeni)
+    - batch_size / batch_wait: pojedyncze wiadomości z wielu wątków są
+      zbierane w paczki (najwyżej `batch_size` sztuk, czekając najwyżej
+      `batch_wait` sekund), żeby ograniczyć narzut komunikacji z procesami
+    - brain_options: argumenty ChatbotBrain dla procesów roboczych
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: int = 16,
+                 batch_wait: float = 0.002, **brain_options):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._brain_options = brain_options
+
+        self._executor_lock = threading.Lock()
+        self._executor = self._create_executor()
+        self._queue = queue.Queue()
+        self._batcher = threading.Thread(target=self._batch_loop, daemon=True)
+        self._batcher.start()
+
+        # Liczniki
+        self.batches = 0
+        self.messages = 0
+
+        self.warm_up()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(START_METHOD),
+            initializer=_init_worker,
+            initargs=(self._brain_options,)
+        )
+
+    def warm_up(self, executor: Optional[ProcessPoolExecutor] = None) -> List[int]:
+        """Uruchomienie wszystkich procesów i załadowanie w nich modelu"""
+        return list((executor or self._executor).map(_warm_up, range(self.workers)))
+
+    def reload(self) -> None:
+        """
+        Nowe procesy robocze z aktualnym modelem (po zmianie intents.json
+        lub entities.py). Zlecenia trafiają do nich dopiero po ich rozgrzaniu;
+        stare procesy kończą już przyjęte paczki. Podmiana odbywa się pod
+        blokadą, którą biorą też zlecenia - żadne nie trafi do zamykanych procesów.
+        """
+        executor = self._create_executor()
+        self.warm_up(executor)
+        with self._executor_lock:
+            previous, self._executor = self._executor, executor
+        previous.shutdown()
+
+    def submit(self, message: str) -> Future:
+        """Zlecenie analizy jednej wiadomości (wynik: (IntentResult, encje))"""
+        future = Future()
+        self._queue.put((message, future))
+        return future
+
+    def analyze(self, message: str, timeout: Optional[float] = None) -> Any:
+        """Analiza jednej wiadomości - odpowiednik ChatbotBrain.analyze"""
+        return self.submit(message).result(timeout)
+
+    def analyze_many(self, messages: Sequence[str], chunk_size: Optional[int] = None) -> List[Any]:
+        """Analiza wielu wiadomości - paczki rozdzielane między procesy"""
+        return self._map_chunks(_analyze_batch, messages, chunk_size)
+
+    def score_normalized_many(self, normalized_messages: Sequence[str],
+                              chunk_size: Optional[int] = None) -> List[Any]:
+        """IntentResult dla wiadomości już znormalizowanych (ChatbotBrain.score_intents)"""
+        return self._map_chunks(_score_normalized_batch, normalized_messages, chunk_size)
+
+    def _map_chunks(self, function, items: Sequence[str], chunk_size: Optional[int]) -> List[Any]:
+        items = list(items)
+        if not items:
+            return []
+        if chunk_size is None:
+            # Kilka paczek na proces - równomierne obciążenie
+            chunk_size = max(1, min(256, len(items) // (self.workers * 4) or 1))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        with self._executor_lock:
+            # map zleca wszystkie paczki od razu - wyniki odbierane już bez blokady
+            chunk_iterator = self._executor.map(function, chunks)
+        results = []
+        for chunk_results in chunk_iterator:
+            results.extend(chunk_results)
+        return results
+
+    def _batch_loop(self) -> None:
+        """Wątek zbierający pojedyncze zlecenia w paczki"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._dispatch(batch)
+                    return
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch) -> None:
+        """Wysłanie paczki do procesu roboczego (bez czekania na wynik)"""
+        self.batches += 1
+        self.messages += len(batch)
+        futures = [future for _, future in batch]
+        try:
+            with self._executor_lock:
+                done = self._executor.submit(_analyze_batch, [message for message, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        def deliver(done):
+            error = done.exception()
+            if error is not None:
+                for future in futures:
+                    future.set_exception(error)
+                return
+            for future, result in zip(futures, done.result()):
+                future.set_result(result)
+
+        done.add_done_callback(deliver)
+
+    def shutdown(self) -> None:
+        """Zatrzymanie wątku paczkującego i procesów roboczych"""
+        self._queue.put(None)
+        self._batcher.join()
+        self._executor.shutdown()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "batches": self.batches,
+            "messages": self.messages,
+            "avg_batch": round(self.messages / self.batches, 2) if self.batches else 0.0,
+        }
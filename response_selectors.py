@@ -0,0 +1,88 @@
+# =============================================================================
+# RESPONSE_SELECTORS.PY - Strategie wyboru odpowiedzi dla ChatbotBrain
+# =============================================================================
+
+import random
+import threading
+from typing import Optional, Sequence
+
+from lru_cache import LRUCache
+
+# Nazwy strategii (np. do konfiguracji przez zmienne środowiskowe)
+SELECTOR_RANDOM = "random"
+SELECTOR_ROUND_ROBIN = "round_robin"
+SELECTOR_NO_REPEAT = "no_repeat"
+
+
+class RandomSelector:
+    """
+    Losowy wybór odpowiedzi. Z podanym `seed` kolejność wyborów jest
+    powtarzalna (przydatne w testach).
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def choose(self, intent_tag: str, responses: Sequence[str], session_id: Optional[str] = None) -> str:
+        with self._lock:
+            return responses[self._rng.randrange(len(responses))]
+
+
+class RoundRobinSelector:
+    """
+    Kolejne odpowiedzi po kolei, osobno dla każdej pary (sesja, intencja).
+    Stan sesji trzymany w ograniczonym cache LRU.
+    """
+
+    def __init__(self, max_sessions: int = 10000, session_ttl: Optional[float] = 3600):
+        self._positions = LRUCache(maxsize=max_sessions, ttl=session_ttl)
+        self._lock = threading.Lock()
+
+    def choose(self, intent_tag: str, responses: Sequence[str], session_id: Optional[str] = None) -> str:
+        key = (session_id, intent_tag)
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions.put(key, position + 1)
+        return responses[position % len(responses)]
+
+
+class NoRepeatSelector:
+    """
+    Losowy wybór, ale bez powtórzenia poprzedniej odpowiedzi tej samej
+    intencji w danej sesji. Zapamiętywana jest treść odpowiedzi, nie jej
+    pozycja - po przeładowaniu modelu (inna lista odpowiedzi) stan nadal
+    wskazuje właściwą odpowiedź albo żadną, gdy już jej nie ma.
+    """
+
+    def __init__(self, seed: Optional[int] = None, max_sessions: int = 10000,
+                 session_ttl: Optional[float] = 3600):
+        self._rng = random.Random(seed)
+        self._last = LRUCache(maxsize=max_sessions, ttl=session_ttl)
+        self._lock = threading.Lock()
+
+    def choose(self, intent_tag: str, responses: Sequence[str], session_id: Optional[str] = None) -> str:
+        key = (session_id, intent_tag)
+        with self._lock:
+            previous = self._last.get(key)
+            last = responses.index(previous) if previous in responses else None
+            if last is None or len(responses) == 1:
+                index = self._rng.randrange(len(responses))
+            else:
+                # Losujemy spośród wszystkich poza poprzednią
+                index = self._rng.randrange(len(responses) - 1)
+                if index >= last:
+                    index += 1
+            self._last.put(key, responses[index])
+        return responses[index]
+
+
+def create_selector(name: str = SELECTOR_RANDOM, seed: Optional[int] = None):
+    """Tworzenie strategii po nazwie (random / round_robin / no_repeat)"""
+    if name == SELECTOR_RANDOM:
+        return RandomSelector(seed)
+    if name == SELECTOR_ROUND_ROBIN:
+        return RoundRobinSelector()
+    if name == SELECTOR_NO_REPEAT:
+        return NoRepeatSelector(seed)
+    raise ValueError(f"Nieznana strategia wyboru odpowiedzi: {name}")
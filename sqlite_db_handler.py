@@ -0,0 +1,350 @@
+# =============================================================================
+# SQLITE_DB_HANDLER.PY - Lokalna baza SQLite dla Hotable (hotable.db)
+# Ten sam zestaw metod co DatabaseHandler (Supabase) - do wdrożeń bez
+# dostępu do sieci i testów obciążeniowych offline
+# =============================================================================
+
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from catalog_cache import cuisine_key
+from entities import KW_RESTAURANTS
+
+# Kolumna API (jak w Supabase) -> kolumna tabeli w hotable.db
+COLUMN_ALIASES = {"cuisine_type": "cuisine"}
+
+# Migracje schematu (NNN_opis.sql, stosowane po kolei; numer ostatniej
+# zastosowanej w PRAGMA user_version) - python sqlite_db_handler.py --migrate
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations" / "sqlite"
+
+# Indeksy z migracji, których wymagają zapytania (hotable.db je zawiera)
+REQUIRED_INDEXES = ("idx_restaurants_name_nocase",)
+
+
+def migrate(path: str) -> List[str]:
+    """Zastosowanie brakujących migracji do pliku bazy - zwraca nazwy zastosowanych"""
+    applied = []
+    with closing(sqlite3.connect(path)) as connection:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            number = int(migration.name.split("_", 1)[0])
+            if number <= version:
+                continue
+            # Migracja i nowy numer wersji w jednej transakcji
+            connection.executescript(
+                f"BEGIN;\n{migration.read_text(encoding='utf-8')}\nPRAGMA user_version = {number};\nCOMMIT;"
+            )
+            applied.append(migration.name)
+    return applied
+
+
+class SQLiteDatabaseHandler:
+    """
+    Restauracje z lokalnego pliku SQLite (schemat tabeli `restaurants`
+    z hotable.db). Wiersze mają ten sam kształt co z Supabase: kuchnia
+    jest zwracana jako lista `cuisine_type`, a kolumny, których tabela nie
+    ma (np. description), są pomijane w projekcji.
+
+    Każdy wątek ma własne połączenie tylko do odczytu; połączenie do zapisu
+    (dostępność stolików) powstaje dopiero przy pierwszej zmianie. Indeksy
+    pochodzą z migracji (MIGRATIONS_DIR), nie są tworzone przy starcie.
+    Zapytania są parametryzowane, więc sqlite3 przechowuje je skompilowane
+    w cache instrukcji połączenia.
+
+    Tryb dziennika (wal / SQLITE_WAL=1):
+    - domyślnie plik bazy nie jest modyfikowany przy starcie (dziennik
+      DELETE) - zatwierdzanie zapisu dostępności na chwilę wstrzymuje odczyty
+    - WAL - odczyty nie czekają na zapisy, ale tryb zostaje zapisany w pliku
+      bazy, a obok niego powstają pliki -wal i -shm; przeznaczony dla kopii
+      bazy roboczej (SQLITE_DB_PATH), nie dla hotable.db z repozytorium
+    """
+
+    def __init__(self, path: Optional[str] = None, aliases: Optional[Dict[str, str]] = None,
+                 wal: Optional[bool] = None):
+        self.path = path or os.getenv('SQLITE_DB_PATH', 'hotable.db')
+        if not os.path.exists(self.path):
+            raise ValueError(f"❌ Brak pliku bazy SQLite: {self.path}")
+        self._local = threading.local()
+
+        self.wal = wal if wal is not None else os.getenv('SQLITE_WAL', '0') == '1'
+        if self.wal:
+            self._write_connection().execute("PRAGMA journal_mode=WAL")
+
+        connection = self._connection()
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        missing = [name for name in REQUIRED_INDEXES if name not in indexes]
+        if missing:
+            print(f"⚠️ Brak indeksów w {self.path}: {', '.join(missing)} "
+                  f"(python sqlite_db_handler.py --migrate)")
+        self.table_columns = tuple(row[1] for row in connection.execute("PRAGMA table_info(restaurants)"))
+
+        # Aliasy nazw restauracji (np. "porto" -> "Porto Azzurro")
+        self.set_aliases(aliases if aliases is not None else KW_RESTAURANTS)
+
+        count = connection.execute("SELECT COUNT(*) FROM restaurants").fetchone()[0]
+        print(f"✅ Połączono z bazą SQLite {self.path} (restauracje: {count})")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Połączenie bieżącego wątku tylko do odczytu"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            uri = f"{Path(self.path).resolve().as_uri()}?mode=ro"
+            connection = sqlite3.connect(uri, uri=True, timeout=5.0)
+            connection.row_factory = sqlite3.Row
+            # Małe litery jak w Pythonie (także polskie znaki) - LIKE/NOCASE obsługują tylko ASCII
+            connection.create_function("py_lower", 1, lambda value: value.lower() if value else value,
+                                       deterministic=True)
+            # Klucz kuchni - ta sama reguła co w katalogu Supabase (catalog_cache.cuisine_key)
+            connection.create_function("cuisine_key", 1, lambda value: value if value is None else cuisine_key(value),
+                                       deterministic=True)
+            self._local.connection = connection
+        return connection
+
+    def _write_connection(self) -> sqlite3.Connection:
+        """Połączenie bieżącego wątku do zapisu (tworzone przy pierwszej zmianie)"""
+        connection = getattr(self._local, "write_connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            self._local.write_connection = connection
+        return connection
+
+    def check_connection(self) -> bool:
+        """Test połączenia z bazą (odczyt tabeli restaurants)"""
+        try:
+            self._connection().execute("SELECT 1 FROM restaurants LIMIT 1").fetchall()
+            return True
+        except sqlite3.Error as e:
+            print(f"❌ Błąd połączenia z bazą SQLite: {e}")
+            return False
+
+    def close(self) -> None:
+        """Zamknięcie połączeń bieżącego wątku"""
+        for attribute in ("connection", "write_connection"):
+            connection = getattr(self._local, attribute, None)
+            if connection is not None:
+                connection.close()
+                setattr(self._local, attribute, None)
+
+    def check_schema(self, columns: Iterable[str]) -> Set[str]:
+        """Kolumny z `columns`, których brakuje w tabeli (pomijane w projekcji)"""
+        missing = {column for column in columns if COLUMN_ALIASES.get(column, column) not in self.table_columns}
+        if missing:
+            print(f"⚠️ Brak kolumn w tabeli restaurants: {', '.join(sorted(missing))} - pomijane w zapytaniach")
+        return missing
+
+    def _select_clause(self, columns: Optional[Sequence[str]]) -> str:
+        """Lista kolumn SELECT (id i name zawsze dołączane, nieznane pomijane)"""
+        if not columns:
+            return "*"
+        selected = dict.fromkeys(["id", "name", *(COLUMN_ALIASES.get(c, c) for c in columns)])
+        return ", ".join(column for column in selected if column in self.table_columns)
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        """Wiersz w kształcie Supabase (kuchnia jako lista cuisine_type)"""
+        data = dict(row)
+        if "cuisine" in data:
+            cuisine = data.pop("cuisine")
+            data["cuisine_type"] = [cuisine] if cuisine else []
+        return data
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[Dict]:
+        return [self._to_dict(row) for row in self._connection().execute(sql, params)]
+
+    @staticmethod
+    def _case_variants(value: str) -> List[str]:
+        """Warianty wielkości liter (NOCASE nie obejmuje polskich znaków)"""
+        value = value.strip()
+        return list(dict.fromkeys([value, value.lower(), value.capitalize(), value.title(), value.upper()]))
+
+    def get_all_restaurants(self) -> List[Dict]:
+        """Wszystkie restauracje"""
+        try:
+            return self._query("SELECT * FROM restaurants ORDER BY name")
+        except sqlite3.Error as e:
+            print(f"❌ DB Error w get_all_restaurants: {e}")
+            return []
+
+    def get_restaurants_by_cuisine(self, cuisine_name: str, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Restauracje danej kuchni - ta sama reguła co w DatabaseHandler: nazwa
+        kuchni równa zapytaniu (cuisine_key, bez rozróżniania wielkości liter).
+        Puste zapytanie - wszystkie restauracje z kuchnią.
+        """
+        try:
+            target = cuisine_key(cuisine_name)
+            select = self._select_clause(columns)
+            if not target:
+                return self._query(f"SELECT {select} FROM restaurants WHERE cuisine_key(cuisine) != '' ORDER BY name")
+            return self._query(
+                f"SELECT {select} FROM restaurants WHERE cuisine_key(cuisine) = ? ORDER BY name",
+                (target,)
+            )
+        except sqlite3.Error as e:
+            print(f"❌ DB Error w get_restaurants_by_cuisine: {e}")
+            return []
+
+    def check_availability(self, restaurant_name: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """Sprawdzanie dostępności stolików w konkretnej restauracji"""
+        return self.resolve_restaurants([restaurant_name], columns).get(restaurant_name)
+
+    def get_restaurant_details(self, restaurant_name: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """Pobieranie szczegółowych informacji o restauracji"""
+        return self.check_availability(restaurant_name, columns)
+
+    def get_restaurants_by_names(self, restaurant_names: List[str],
+                                 columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Pobieranie wielu restauracji naraz (bez powtórzeń, w kolejności
+        `restaurant_names`; nierozpoznane nazwy są pomijane).
+        """
+        rows = []
+        seen = set()
+        for row in self.resolve_restaurants(restaurant_names, columns).values():
+            if row is not None and row["id"] not in seen:
+                seen.add(row["id"])
+                rows.append(row)
+        return rows
+
+    def set_aliases(self, aliases: Dict[str, str]) -> None:
+        """Podmiana słownika aliasów {alias: nazwa restauracji}"""
+        self._aliases = {alias.lower(): name for alias, name in aliases.items()}
+
+    def resolve_restaurants(self, restaurant_names: List[str],
+                            columns: Optional[Sequence[str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Rozpoznanie nazw restauracji: dokładna nazwa (bez rozróżniania
+        wielkości liter), potem alias z entities.py, na końcu fragment nazwy.
+        Zwraca {nazwa: wiersz lub None}.
+        """
+        resolved: Dict[str, Optional[Dict]] = dict.fromkeys(restaurant_names)
+        select = self._select_clause(columns)
+        try:
+            for name in resolved:
+                if name and name.strip():
+                    resolved[name] = self._match_name(name, select)
+        except sqlite3.Error as e:
+            print(f"❌ DB Error w resolve_restaurants: {e}")
+        return resolved
+
+    def _match_name(self, name: str, select: str) -> Optional[Dict]:
+        """Dopasowanie jednej nazwy: dokładne -> alias -> fragment nazwy"""
+        target = name.strip().lower()
+        canonical = self._aliases.get(target)
+        for candidate in dict.fromkeys(filter(None, [name, canonical])):
+            variants = self._case_variants(candidate)
+            rows = self._query(
+                f"SELECT {select} FROM restaurants WHERE name COLLATE NOCASE IN "
+                f"({', '.join('?' * len(variants))}) ORDER BY name LIMIT 1",
+                variants
+            )
+            if rows:
+                return rows[0]
+        rows = self._query(
+            f"SELECT {select} FROM restaurants WHERE instr(py_lower(name), ?) > 0 ORDER BY name LIMIT 1",
+            (target,)
+        )
+        return rows[0] if rows else None
+
+    def get_restaurant_description(self, restaurant_name: str) -> Optional[str]:
+        """Pobieranie opisu restauracji"""
+        row = self.get_restaurant_details(restaurant_name, columns=("description",))
+        return row.get('description') if row else None
+
+    def update_availability(self, restaurant_name: str, available_tables: int) -> bool:
+        """Aktualizacja liczby dostępnych stolików"""
+        connection = self._write_connection()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    "UPDATE restaurants SET available_tables = ?, updated_at = CURRENT_TIMESTAMP "
+                    "WHERE name = ? COLLATE NOCASE",
+                    (available_tables, restaurant_name.strip())
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"❌ DB Error w update_availability: {e}")
+            return False
+
+    def get_availability(self, restaurant_ids: Sequence[Any]) -> Optional[Dict[Any, int]]:
+        """Bieżąca liczba wolnych stolików: {id: liczba}; None przy błędzie"""
+        try:
+            rows = self._connection().execute(
+                f"SELECT id, available_tables FROM restaurants WHERE id IN ({', '.join('?' * len(restaurant_ids))})",
+                list(restaurant_ids)
+            )
+            return {row['id']: row['available_tables'] for row in rows}
+        except sqlite3.Error as e:
+            print(f"❌ DB Error w get_availability: {e}")
+            return None
+
+    def compare_and_set_availability(self, restaurant_id: Any, expected: int, value: int) -> Optional[List[Dict]]:
+        """
+        Zapis `value` tylko wtedy, gdy w bazie jest nadal `expected`
+        (compare-and-swap). Zwraca zmienione wiersze: [] przy konflikcie,
+        None przy błędzie.
+        """
+        connection = self._write_connection()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    "UPDATE restaurants SET available_tables = ?, updated_at = CURRENT_TIMESTAMP "
+                    "WHERE id = ? AND available_tables = ?",
+                    (value, restaurant_id, expected)
+                )
+            if not cursor.rowcount:
+                return []
+            return self._query("SELECT id, name, available_tables FROM restaurants WHERE id = ?", (restaurant_id,))
+        except sqlite3.Error as e:
+            print(f"❌ DB Error w compare_and_set_availability: {e}")
+            return None
+
+
+# =============================================================================
+# TEST LOKALNEJ BAZY
+# =============================================================================
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if "--migrate" in sys.argv:
+        path = os.getenv('SQLITE_DB_PATH', 'hotable.db')
+        applied = migrate(path)
+        print(f"✅ Migracje {path}: {', '.join(applied) if applied else 'brak nowych'}")
+        sys.exit(0)
+
+    db = SQLiteDatabaseHandler()
+
+    print("\n📋 Wszystkie restauracje:")
+    for r in db.get_all_restaurants():
+        print(f"  - {r.get('name')}: {r.get('available_tables')}/{r.get('max_tables')} stolików, {r.get('cuisine_type')}")
+
+    print("\n🍕 Kuchnia polska:", [r.get('name') for r in db.get_restaurants_by_cuisine("polska")])
+
+    # Ta sama reguła kuchni co w katalogu Supabase (DatabaseHandler)
+    from db_handler import DatabaseHandler
+    rows = db.get_all_restaurants()
+    cuisine_index = DatabaseHandler._build_cuisine_index(rows)
+    queries = ("polska", "POLSKA", " Polska ", "pol", "streetfood", "Śródziemnomorska",
+               "śródziemnomorska", "ŚRÓDZIEMNOMORSKA", "włoska", "")
+    passed = 0
+    for query in queries:
+        expected = [rows[p]['name'] for p in DatabaseHandler._cuisine_positions(cuisine_index, cuisine_key(query))]
+        got = [r.get('name') for r in db.get_restaurants_by_cuisine(query)]
+        if got == expected:
+            passed += 1
+        else:
+            print(f"  ❌ kuchnia {query!r}: SQLite {got}, katalog {expected}")
+    print(f"✅ Kuchnie zgodne z katalogiem: {passed}/{len(queries)}")
+    print("🔍 Alias 'porto':", db.check_availability("porto", columns=("available_tables",)))
+    print("🔍 Fragment 'zieln':", (db.get_restaurant_details("zieln") or {}).get('name'))
+
+    started = time.perf_counter()
+    for _ in range(10000):
+        db.check_availability("Neon", columns=("available_tables",))
+    print(f"\n⏱️ check_availability: {(time.perf_counter() - started) / 10000 * 1e6:.1f} µs / zapytanie")